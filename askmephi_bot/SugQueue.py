@@ -1,10 +1,14 @@
 import asyncio
+import heapq
+import logging
 from aiogram import Bot, Dispatcher
 import time
 import os
 import datetime
 from datetime import timezone, timedelta
-from db.wapi import get_recent_posts, mark_post_as_posted, update_post_channel_info, get_user_info, process_post_payment, recalculate_queue_after_immediate_publication, rebuild_post_queue
+from db.wapi import mark_post_as_posted, update_post_channel_info, get_user_info, process_post_payment, rebuild_post_queue, get_queue_info, get_post_info
+from services.sender import sender, PRIORITY_NOTIFICATION, PRIORITY_PUBLICATION
+from services.events import events, EVENT_RECONNECT
 
 
 async def send_publication_notification(bot: Bot, post: dict, channel_message_id: int):
@@ -12,19 +16,19 @@ async def send_publication_notification(bot: Bot, post: dict, channel_message_id
     try:
         author_id = post.get('author')
         if not author_id:
-            print(f"[send_publication_notification] No author_id in post {post.get('id')}")
+            logging.warning(f"[send_publication_notification] No author_id in post {post.get('id')}")
             return
         
         # Получаем информацию о пользователе
         user_info = await get_user_info(author_id)
         if 'error' in user_info:
-            print(f"[send_publication_notification] Error getting user info: {user_info['error']}")
+            logging.error(f"[send_publication_notification] Error getting user info: {user_info['error']}")
             return
         
         # Формируем ссылку на пост в канале
         channel_id = os.getenv("ORACLE_CHANNEL_ID")
         if not channel_id:
-            print(f"[send_publication_notification] CHANNEL_ID not set")
+            logging.warning(f"[send_publication_notification] CHANNEL_ID not set")
             return
             
         if channel_id.startswith('-100'):
@@ -42,16 +46,17 @@ async def send_publication_notification(bot: Bot, post: dict, channel_message_id
         notification_text += f"<b>Награда:</b> После проверки вы получите 50-500 токенов за пост (зависит от уровня)"
         
         # Отправляем уведомление
-        await bot.send_message(
+        await sender.send(
+            bot.send_message, PRIORITY_NOTIFICATION,
             chat_id=author_id,
             text=notification_text,
             parse_mode="HTML",
             disable_web_page_preview=True
         )
-        print(f"[send_publication_notification] Notification sent to user {author_id}")
+        logging.info(f"[send_publication_notification] Notification sent to user {author_id}")
         
     except Exception as e:
-        print(f"[send_publication_notification] Error sending notification: {e}")
+        logging.error(f"[send_publication_notification] Error sending notification: {e}")
 
 
 async def send_publication_and_payment_notification(bot: Bot, post: dict, channel_message_id: int, tokens_added: int, new_balance: str):
@@ -59,13 +64,13 @@ async def send_publication_and_payment_notification(bot: Bot, post: dict, channe
     try:
         author_id = post.get('author')
         if not author_id:
-            print(f"[send_publication_and_payment_notification] No author_id in post {post.get('id')}")
+            logging.warning(f"[send_publication_and_payment_notification] No author_id in post {post.get('id')}")
             return
         
         # Формируем ссылку на пост в канале
         channel_id = os.getenv("ORACLE_CHANNEL_ID")
         if not channel_id:
-            print(f"[send_publication_and_payment_notification] CHANNEL_ID not set")
+            logging.warning(f"[send_publication_and_payment_notification] CHANNEL_ID not set")
             return
             
         if channel_id.startswith('-100'):
@@ -87,16 +92,17 @@ async def send_publication_and_payment_notification(bot: Bot, post: dict, channe
         notification_text += f"<b>Совет:</b> Используйте токены для покупки псевдонимов в магазине /market"
         
         # Отправляем уведомление
-        await bot.send_message(
+        await sender.send(
+            bot.send_message, PRIORITY_NOTIFICATION,
             chat_id=author_id,
             text=notification_text,
             parse_mode="HTML",
             disable_web_page_preview=True
         )
-        print(f"[send_publication_and_payment_notification] Combined notification sent to user {author_id}")
+        logging.info(f"[send_publication_and_payment_notification] Combined notification sent to user {author_id}")
         
     except Exception as e:
-        print(f"[send_publication_and_payment_notification] Error sending combined notification: {e}")
+        logging.error(f"[send_publication_and_payment_notification] Error sending combined notification: {e}")
 
 
 async def publish_to_channel(telegram_id, bot) -> tuple[bool, int]:
@@ -107,170 +113,238 @@ async def publish_to_channel(telegram_id, bot) -> tuple[bool, int]:
         ci = os.getenv("ORACLE_CHANNEL_ID")
          
         # Копируем сообщение в канал и получаем ID нового сообщения
-        channel_message = await bot.copy_message(
+        channel_message = await sender.send(
+            bot.copy_message, PRIORITY_PUBLICATION,
             from_chat_id=os.getenv("ORACLE_OFFERS_CHAT_ID"),
             message_id=telegram_id,
             chat_id=os.getenv("ORACLE_CHANNEL_ID")
         )
         
-        print(f"Post published successfully! Channel message ID: {channel_message.message_id}")
-        print(f"Channel message object type: {type(channel_message)}")
-        print(f"Channel message ID: {channel_message.message_id}")
+        logging.info(f"[publish_to_channel] Post published, channel message ID: {channel_message.message_id}")
         
         return True, channel_message.message_id
     except Exception as e:
-        print(f"Ошибка публикации: {e}")
+        logging.error(f"[publish_to_channel] Ошибка публикации: {e}")
         return False, 0
 
 
 async def mark_as_posted(post_id: int) -> None:
     """Помечает пост как опубликованный в БД (заглушка)"""
     await mark_post_as_posted(post_id)
-    print(f"Помечаю пост {post_id} как опубликованный")
+    logging.info(f"[mark_as_posted] Пост {post_id} помечен как опубликованный")
 
-async def post_checker(bot):
-    """Основной цикл проверки постов"""
-    print(f"Starting post checker...")
-    print(f"OFFERS_CHAT_ID: {os.getenv('ORACLE_OFFERS_CHAT_ID')}")
-    print(f"CHANNEL_ID: {os.getenv('ORACLE_CHANNEL_ID')}")
-    
-    # Счетчик для пересчета очереди (каждые 10 циклов = 200 секунд)
-    queue_recalc_counter = 0
-    
-    while True:
+def _parse_post_time(value) -> datetime.datetime:
+    """Парсит posted_at из API и приводит к UTC"""
+    posted_at = datetime.datetime.fromisoformat(value)
+    # Если время из БД без пояса - добавляем UTC
+    if posted_at.tzinfo is None:
+        return posted_at.replace(tzinfo=datetime.timezone.utc)
+    return posted_at.astimezone(datetime.timezone.utc)
+
+
+# Результаты publish_scheduled_post
+PUBLISH_DONE = 'published'
+PUBLISH_SKIPPED = 'skipped'  # уже опубликован или отклонен — повторять не нужно
+PUBLISH_FAILED = 'failed'    # backend или Telegram недоступны — пост нужно опубликовать позже
+
+
+async def publish_scheduled_post(bot, post: dict) -> str:
+    """Публикует пост из очереди в канал, отмечает его опубликованным и оплачивает"""
+    # Пост могли отклонить или опубликовать вручную после загрузки очереди (в том числе в другом воркере)
+    current = await get_post_info(post['id'])
+    if 'error' in current:
+        logging.error(f"[publish_scheduled_post] Failed to re-check post {post['id']}: {current['error']}")
+        return PUBLISH_FAILED
+    if current.get('is_posted') or current.get('is_rejected'):
+        logging.info(f"[publish_scheduled_post] Post {post['id']} is already posted or rejected, skipping")
+        return PUBLISH_SKIPPED
+    logging.info(f"[publish_scheduled_post] Publishing post {post['id']} to channel...")
+    success, channel_message_id = await publish_to_channel(post['telegram_id'], bot)
+    if not success:
+        logging.error(f"[publish_scheduled_post] Failed to publish post {post['id']}")
+        return PUBLISH_FAILED
+    # Сохраняем ID сообщения в канале
+    update_result = await update_post_channel_info(post['id'], channel_message_id)
+    logging.info(f"[publish_scheduled_post] Post {post['id']} channel_message_id={channel_message_id}: {update_result}")
+    await mark_as_posted(post['id'])
+
+    # Обрабатываем оплату и отправляем объединенное уведомление
+    payment_result = await process_post_payment(post['id'])
+    if 'error' not in payment_result:
+        tokens_added = payment_result.get('tokens_added', 0)
+        author_balance = payment_result.get('author_balance', 'N/A')
+        await send_publication_and_payment_notification(bot, post, channel_message_id, tokens_added, author_balance)
+    else:
+        logging.error(f"[publish_scheduled_post] Error processing payment for post {post['id']}: {payment_result['error']}")
+        # Отправляем только уведомление о публикации если оплата не прошла
+        await send_publication_notification(bot, post, channel_message_id)
+    return PUBLISH_DONE
+
+
+class PostScheduler:
+    """
+    Планировщик публикаций из очереди.
+
+    Держит в памяти min-heap постов по posted_at и спит ровно до ближайшей публикации.
+    Обработчики (approve/reject/publish_now) будят его через schedule/cancel/request_resync,
+    поэтому обращения к backend происходят только при реальных событиях очереди.
+    Раз в resync_interval очередь на всякий случай перечитывается целиком.
+
+    Цикл run работает только в воркере 0, а обработчики — в любом воркере вебхука. При нескольких
+    воркерах события schedule/cancel/resync расходятся через services.events, и воркер 0
+    применяет их к своей куче (subscribe_events).
+    """
+
+    # Посты, просроченные больше чем на 60 часов, не публикуются автоматически
+    MAX_OVERDUE_SECONDS = 60 * 60 * 60
+    # Пауза перед повторной попыткой, если публикация не удалась
+    PUBLISH_RETRY_SECONDS = 20
+
+    def __init__(self, resync_interval: float = 600):
+        self.resync_interval = resync_interval
+        self._heap = []        # (posted_at timestamp, post_id)
+        self._posts = {}       # post_id -> (posted_at timestamp, post)
+        self._wakeup = asyncio.Event()
+        self._resync_needed = True
+        self._last_resync = 0.0
+
+    def subscribe_events(self):
+        """Воркер 0: применяет к своей куче события очереди из других воркеров вебхука"""
+        events.subscribe('schedule', lambda event: self._schedule(event['post']))
+        events.subscribe('cancel', lambda event: self._posts.pop(event['post_id'], None))
+        events.subscribe('cancel_by_telegram_id', lambda event: self._cancel_by_telegram_id(event['telegram_id']))
+        events.subscribe('resync', lambda event: self.request_resync(notify=False))
+        # Пока подписки не было, события могли потеряться
+        events.subscribe(EVENT_RECONNECT, lambda event: self.request_resync(notify=False))
+
+    def __len__(self):
+        return len(self._posts)
+
+    def schedule(self, post: dict):
+        """Добавляет пост в очередь или обновляет время его публикации"""
+        self._schedule(post)
+        events.publish('schedule', post=post)
+
+    def _schedule(self, post: dict):
+        if not post.get('id') or not post.get('posted_at') or post.get('is_posted') or post.get('is_rejected'):
+            return
         try:
-            # Пересчитываем очередь в начале каждого цикла для максимальной актуальности
-            print(f"[post_checker] Performing queue rebuild at cycle start...")
+            due = _parse_post_time(post['posted_at']).timestamp()
+        except (TypeError, ValueError) as e:
+            logging.error(f"[PostScheduler] Bad posted_at for post {post.get('id')}: {e}")
+            return
+        self._push(post, due)
+
+    def _push(self, post: dict, due: float):
+        self._posts[post['id']] = (due, post)
+        # Старые записи этого поста в куче остаются и отбрасываются при извлечении
+        heapq.heappush(self._heap, (due, post['id']))
+        self._wakeup.set()
+
+    def cancel(self, post_id: int):
+        """Убирает пост из очереди (опубликован вручную или отклонен)"""
+        self._posts.pop(post_id, None)
+        events.publish('cancel', post_id=post_id)
+
+    def cancel_by_telegram_id(self, telegram_id: int):
+        self._cancel_by_telegram_id(telegram_id)
+        events.publish('cancel_by_telegram_id', telegram_id=telegram_id)
+
+    def _cancel_by_telegram_id(self, telegram_id: int):
+        for post_id, (_, post) in list(self._posts.items()):
+            if post.get('telegram_id') == telegram_id:
+                self._posts.pop(post_id, None)
+
+    def request_resync(self, notify: bool = True):
+        """Просит перестроить очередь на backend и перечитать ее (после изменений вне планировщика)"""
+        self._resync_needed = True
+        self._wakeup.set()
+        if notify:
+            events.publish('resync')
+
+    def _is_current(self, due: float, post_id: int) -> bool:
+        entry = self._posts.get(post_id)
+        return entry is not None and entry[0] == due
+
+    def _next_due(self):
+        while self._heap and not self._is_current(*self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now: float) -> list:
+        due_posts = []
+        while True:
+            due = self._next_due()
+            if due is None or due > now:
+                return due_posts
+            _, post_id = heapq.heappop(self._heap)
+            _, post = self._posts.pop(post_id)
+            if now - due >= self.MAX_OVERDUE_SECONDS:
+                logging.warning(f"[PostScheduler] Post {post_id} is overdue by {now - due:.0f}s, skipping")
+                continue
+            due_posts.append(post)
+
+    async def resync(self):
+        """Пересобирает очередь на backend и загружает ее в кучу"""
+        self._resync_needed = False
+        self._last_resync = time.monotonic()
+        recalc_result = await rebuild_post_queue()
+        if 'error' in recalc_result:
+            logging.error(f"[PostScheduler] Queue rebuild failed: {recalc_result['error']}")
+        else:
+            logging.info(f"[PostScheduler] Queue rebuilt: {int(recalc_result.get('updated_count', 0))} posts updated")
+        queue_info = await get_queue_info()
+        if 'error' in queue_info:
+            logging.error(f"[PostScheduler] Failed to load queue: {queue_info['error']}")
+            self._resync_needed = True
+            return
+        self._heap = []
+        self._posts = {}
+        for post in queue_info.get('results', []):
+            self._schedule(post)
+        logging.info(f"[PostScheduler] Queue loaded: {len(self._posts)} posts, next at {self._next_due()}")
+
+    async def run(self, bot):
+        """Основной цикл: публикует наступившие посты и спит до следующего события"""
+        while True:
+            self._wakeup.clear()
             try:
-                recalc_result = await rebuild_post_queue()
-                if 'error' in recalc_result:
-                    print(f"[post_checker] Queue rebuild failed: {recalc_result['error']}")
-                else:
-                    updated_count = int(recalc_result.get('updated_count', 0))
-                    if updated_count > 0:
-                        print(f"[post_checker] Queue rebuilt at cycle start: {updated_count} posts updated")
-                    else:
-                        print(f"[post_checker] Queue rebuild at cycle start completed: no posts to update")
-            except Exception as e:
-                print(f"[post_checker] Exception during queue rebuild at cycle start: {e}")
-            
-            # Создаем текущее время с часовым поясом UTC
-            now = datetime.datetime.now(datetime.timezone.utc)
-            posts_response = await get_recent_posts()
-            
-            # Проверяем, что получили корректный ответ от API
-            if 'error' in posts_response:
-                print(f"Error getting posts: {posts_response['error']}")
+                if self._resync_needed or time.monotonic() - self._last_resync >= self.resync_interval:
+                    await self.resync()
+                published = False
+                for post in self._pop_due(time.time()):
+                    result = await publish_scheduled_post(bot, post)
+                    if result == PUBLISH_DONE:
+                        published = True
+                    elif result == PUBLISH_FAILED and post['id'] not in self._posts:
+                        # Пост уже снят с очереди: возвращаем его с паузой, не дожидаясь полной пересинхронизации
+                        logging.warning(f"[PostScheduler] Post {post['id']} will be retried in {self.PUBLISH_RETRY_SECONDS}s")
+                        self._push(post, time.time() + self.PUBLISH_RETRY_SECONDS)
+                if published:
+                    # Пересчитываем очередь после публикации поста
+                    self.request_resync(notify=False)
+                    continue
+            except Exception:
+                logging.exception("[PostScheduler] Error in scheduler loop")
                 await asyncio.sleep(20)
+                self._resync_needed = True
                 continue
-            
-            # Извлекаем список постов из ответа API
-            posts = posts_response.get('results', []) if isinstance(posts_response, dict) else posts_response
-            
-            # Пересчитываем очередь каждые 10 циклов (200 секунд) - дополнительная проверка
-            queue_recalc_counter += 1
-            if queue_recalc_counter >= 10:
-                print(f"[post_checker] Performing periodic queue rebuild...")
+
+            timeout = self.resync_interval - (time.monotonic() - self._last_resync)
+            next_due = self._next_due()
+            if next_due is not None:
+                timeout = min(timeout, next_due - time.time())
+            if timeout > 0:
                 try:
-                    recalc_result = await rebuild_post_queue()
-                    if 'error' in recalc_result:
-                        print(f"[post_checker] Periodic queue rebuild failed: {recalc_result['error']}")
-                    else:
-                        updated_count = int(recalc_result.get('updated_count', 0))
-                        if updated_count > 0:
-                            print(f"[post_checker] Periodic queue rebuilt: {updated_count} posts updated")
-                        else:
-                            print(f"[post_checker] Periodic queue rebuild completed: no posts to update")
-                except Exception as e:
-                    print(f"[post_checker] Exception during periodic queue rebuild: {e}")
-                
-                queue_recalc_counter = 0  # Сбрасываем счетчик
-            
-            for post in posts:
-                if post.get('is_posted', False):
-                    continue
-                    
-                posted_at = datetime.datetime.fromisoformat(post['posted_at'])
-                # Если время из БД без пояса - добавляем UTC
-                if posted_at.tzinfo is None:
-                    posted_at = posted_at.replace(tzinfo=datetime.timezone.utc)
-                # Если с поясом - конвертируем в UTC
-                else:
-                    posted_at = posted_at.astimezone(datetime.timezone.utc)
-                
-                time_diff = (now - posted_at).total_seconds()
-                print(f"Post {post['id']} (telegram_id={post['telegram_id']}): scheduled={posted_at}, now={now}, time_diff={time_diff}")
-                
-                # Проверяем, что текущее время больше или равно запланированному времени
-                # И что разница не превышает 60 часов (для тестов)
-                # Также публикуем посты, которые были созданы более 30 минут назад, даже если время публикации в будущем
-                should_publish = False
-                
-                if time_diff >= 0 and time_diff < 60 * 60 * 60:
-                    # Обычная проверка - время публикации наступило
-                    should_publish = True
-                    print(f"Post {post['id']} scheduled time has arrived")
-                elif time_diff < 0:
-                    # Время публикации в будущем, но проверяем, не был ли пост создан давно
-                    # Получаем время создания поста (если есть) или используем текущее время
-                    post_created_time = post.get('created_at') or post.get('posted_at')
-                    if post_created_time:
-                        try:
-                            created_at = datetime.datetime.fromisoformat(post_created_time)
-                            if created_at.tzinfo is None:
-                                created_at = created_at.replace(tzinfo=datetime.timezone.utc)
-                            else:
-                                created_at = created_at.astimezone(datetime.timezone.utc)
-                            
-                            time_since_creation = (now - created_at).total_seconds() / 60  # в минутах
-                            if time_since_creation >= 30:  # Пост создан более 30 минут назад
-                                should_publish = True
-                                print(f"Post {post['id']} created {time_since_creation:.1f} minutes ago, publishing despite future schedule")
-                        except Exception as e:
-                            print(f"Error parsing post creation time for post {post['id']}: {e}")
-                
-                if should_publish:
-                    print(f"Publishing post {post['id']} to channel...")
-                    success, channel_message_id = await publish_to_channel(post['telegram_id'], bot)
-                    if success:
-                        print(f"Updating post {post['id']} with channel_message_id={channel_message_id}")
-                        # Сохраняем ID сообщения в канале
-                        update_result = await update_post_channel_info(post['id'], channel_message_id)
-                        print(f"Update result: {update_result}")
-                        await mark_as_posted(post['id'])
-                        print(f"Post {post['id']} marked as posted")
-                        
-                        # Обрабатываем оплату и отправляем объединенное уведомление
-                        payment_result = await process_post_payment(post['id'])
-                        if 'error' not in payment_result:
-                            tokens_added = payment_result.get('tokens_added', 0)
-                            author_balance = payment_result.get('author_balance', 'N/A')
-                            author_level = payment_result.get('author_level', 'N/A')
-                            await send_publication_and_payment_notification(bot, post, channel_message_id, tokens_added, author_balance)
-                        else:
-                            print(f"Error processing payment for post {post['id']}: {payment_result['error']}")
-                            # Отправляем только уведомление о публикации если оплата не прошла
-                            await send_publication_notification(bot, post, channel_message_id)
-                        
-                        # Пересчитываем очередь после публикации поста
-                        print(f"[post_checker] Rebuilding queue after post publication...")
-                        try:
-                            recalc_result = await rebuild_post_queue()
-                            if 'error' in recalc_result:
-                                print(f"[post_checker] Queue rebuild after publication failed: {recalc_result['error']}")
-                            else:
-                                updated_count = int(recalc_result.get('updated_count', 0))
-                                print(f"[post_checker] Queue rebuilt after publication: {updated_count} posts updated")
-                        except Exception as e:
-                            print(f"[post_checker] Exception during queue rebuild after publication: {e}")
-                    else:
-                        print(f"Failed to publish post {post['id']}")
-                else:
-                    print(f"Post {post['id']} scheduled for future: {abs(time_diff)} seconds remaining")
-        
-        except Exception as e:
-            print(f"Ошибка в цикле проверки: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        await asyncio.sleep(20)
\ No newline at end of file
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+
+post_scheduler = PostScheduler(resync_interval=float(os.getenv('QUEUE_RESYNC_INTERVAL', 600)))
+
+
+async def post_checker(bot):
+    """Фоновая задача публикации постов из очереди"""
+    logging.info(f"[post_checker] Starting post scheduler, resync every {post_scheduler.resync_interval}s")
+    await post_scheduler.run(bot)
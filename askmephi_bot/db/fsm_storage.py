@@ -0,0 +1,129 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseEventIsolation, BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey,
+)
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+
+# Время жизни состояния диалога: брошенные диалоги (предложка, комментарий) забываются через сутки
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', 86400))
+# Потолок числа записей в SQLite-хранилище: при превышении удаляются самые давно обновленные
+FSM_MAX_ROWS = int(os.getenv('FSM_MAX_ROWS', 100000))
+FSM_SQLITE_PATH = os.getenv('FSM_SQLITE_PATH', 'fsm.sqlite3')
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в локальном файле SQLite: состояния диалогов переживают перезапуск бота.
+
+    Запись живет ttl секунд с последнего изменения, устаревшие записи не отдаются и периодически удаляются;
+    число записей ограничено max_rows. Подходит для одного процесса — для нескольких воркеров нужен Redis.
+    Запросы к SQLite выполняются в отдельном потоке (один на хранилище, поэтому запросы идут по очереди
+    и соединение не используется из двух потоков сразу): запись на диск и чистка не блокируют event loop.
+    """
+
+    CLEANUP_EVERY = 500  # записей между чистками устаревших строк
+
+    def __init__(self, path: str = FSM_SQLITE_PATH, ttl: int = FSM_STATE_TTL, max_rows: int = FSM_MAX_ROWS,
+                 key_builder: Optional[KeyBuilder] = None):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True)
+        self._writes = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fsm-sqlite')
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fsm_expires_idx ON fsm (expires_at)")
+        self.cleanup()
+
+    def _row(self, key: StorageKey):
+        return self._conn.execute(
+            "SELECT state, data FROM fsm WHERE key = ? AND expires_at > ?",
+            (self.key_builder.build(key), time.time()),
+        ).fetchone()
+
+    def _write(self, key: StorageKey, column: str, value) -> None:
+        self._conn.execute(
+            f"INSERT INTO fsm (key, {column}, expires_at) VALUES (?, ?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}, expires_at = excluded.expires_at",
+            (self.key_builder.build(key), value, time.time() + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.CLEANUP_EVERY == 0:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        """Удаляет устаревшие и пустые записи, затем самые старые сверх max_rows"""
+        self._conn.execute("DELETE FROM fsm WHERE expires_at <= ? OR (state IS NULL AND data = '{}')", (time.time(),))
+        self._conn.execute(
+            "DELETE FROM fsm WHERE key IN (SELECT key FROM fsm ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._run(self._write, key, 'state', state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._run(self._row, key)
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._run(self._write, key, 'data', json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._run(self._row, key)
+        return json.loads(row[1]) if row else {}
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=False)
+
+
+def create_fsm_storage(prefix: str) -> BaseStorage:
+    """
+    Хранилище FSM по окружению:
+    REDIS_URL — RedisStorage (общий для нескольких воркеров, TTL средствами Redis);
+    FSM_STORAGE=memory — MemoryStorage (тесты, отладка); иначе — SQLiteStorage в FSM_SQLITE_PATH.
+    prefix разделяет ключи ботов, работающих с одним Redis.
+    """
+    key_builder = DefaultKeyBuilder(prefix=prefix, with_bot_id=True)
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        logging.info(f"[create_fsm_storage] Using RedisStorage, ttl={FSM_STATE_TTL}s")
+        return RedisStorage.from_url(redis_url, key_builder=key_builder, state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL)
+    if os.getenv('FSM_STORAGE', 'sqlite') == 'memory':
+        logging.info("[create_fsm_storage] Using MemoryStorage")
+        return MemoryStorage()
+    logging.info(f"[create_fsm_storage] Using SQLiteStorage at {FSM_SQLITE_PATH}, ttl={FSM_STATE_TTL}s, max_rows={FSM_MAX_ROWS}")
+    return SQLiteStorage(key_builder=key_builder)
+
+
+def create_events_isolation(storage: BaseStorage) -> BaseEventIsolation:
+    """
+    Изоляция апдейтов одного чата/пользователя: следующий апдейт ждет, пока предыдущий обработан,
+    и читает уже сохраненное им состояние FSM. С RedisStorage блокировка общая для всех воркеров вебхука,
+    иначе — asyncio.Lock в пределах процесса.
+    """
+    if os.getenv('REDIS_URL'):
+        # RedisStorage из create_fsm_storage: RedisEventIsolation на том же соединении
+        return storage.create_isolation()
+    return SimpleEventIsolation()
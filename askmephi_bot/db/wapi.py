@@ -1,15 +1,57 @@
-import aiohttp
 import logging
 import asyncio
 import json
 from datetime import datetime, timezone, timedelta
 from typing import Union
 import os
+import aiohttp
 import pytz
+from db.api_client import api_client
+from db.cache import TTLCache
+from services.sender import sender, PRIORITY_NOTIFICATION
+from services.events import events, EVENT_RECONNECT
+
+logger = logging.getLogger(__name__)
 
 API_BASE = 'http://backend:8000/api/'
 ACCESS_TOKEN = os.getenv('ACCESS_TOKEN')
 
+# Кэш известных backend пользователей: telegram id -> отпечаток профиля (username/имя/фамилия)
+known_users = TTLCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('USER_CACHE_TTL', 3600)),
+)
+# Рассылка отметила пользователя заблокировавшим бота (в другом воркере): следующее его обращение
+# должно дойти до try_create_user и снять отметку. Пропущенные при обрыве связи события — сбрасываем весь кэш
+events.subscribe('user_blocked', lambda event: known_users.pop(event['user_id']))
+events.subscribe(EVENT_RECONNECT, lambda event: known_users.clear())
+
+PSEUDO_CACHE_TTL = float(os.getenv('PSEUDO_CACHE_TTL', 300))
+
+# Каталог псевдонимов: 'all' -> {"etag", "items"}; сбрасывается при добавлении и деактивации псевдонима
+pseudo_catalogue = TTLCache(maxsize=1, ttl=PSEUDO_CACHE_TTL)
+
+# Псевдонимы пользователя: telegram id -> [(id, pseudo), ...]; обновляется при покупке и выдаче псевдонимов
+owned_pseudos = TTLCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', 10000)),
+    ttl=PSEUDO_CACHE_TTL,
+)
+
+def _user_fingerprint(username, firstname, lastname) -> tuple:
+    return (username or "", firstname or "", lastname or "")
+
+async def ensure_user(user_id, username, firstname, lastname):
+    """
+    Гарантирует, что пользователь есть в backend, обращаясь к API только при первом
+    появлении пользователя или при изменении его профиля.
+
+    Возвращает:
+        None, если пользователь уже известен с тем же профилем, иначе результат try_create_user
+    """
+    if known_users.get(user_id) == _user_fingerprint(username, firstname, lastname):
+        return None
+    return await try_create_user(user_id, username, firstname, lastname)
+
 async def try_create_user(user_id, username, firstname, lastname) -> dict:
     """
     Проверяет существование пользователя по ID и если его не существует, то создает его
@@ -24,15 +66,20 @@ async def try_create_user(user_id, username, firstname, lastname) -> dict:
         "firstname": firstname or "N/A",
         "lastname": lastname or "N/A",
         "balance": 100.50,
-        "level": 1
+        "level": 1,
+        # Пользователь снова пишет боту — снимаем отметку, выставленную рассылкой
+        "askmephi_bot_blocked": False
     }
     API_URL = API_BASE + 'users/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
-                return await response.json()
+                result = await response.json()
+                if response.status in (200, 201):
+                    known_users.set(user_id, _user_fingerprint(username, firstname, lastname))
+                return result
     except Exception as e:
-        logging.exception("Error in create_or_skip_user")
+        logger.exception("Error in create_or_skip_user")
         return {"error": f"Request failed: {str(e)}"}
 
 async def get_last_post() -> dict:
@@ -43,30 +90,30 @@ async def get_last_post() -> dict:
         dict: Данные последнего поста или словарь с ошибкой
     """
     headers = {'Accept': 'application/json'}
-    API_URL = API_BASE + 'ask-posts/?is_rejected=false&ordering=-posted_at&page=1&page_size=1'
+    API_URL = API_BASE + 'ask-posts/?is_rejected=false&ordering=-posted_at&page=1&page_size=1&exclude=content,author_details'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     data = await response.json()
-                    logging.info(f"[get_last_post] Raw response type: {type(data)}")
+                    logger.debug(f"[get_last_post] Raw response type: {type(data)}")
                     
                     # Обрабатываем разные форматы ответа
                     if isinstance(data, list) and len(data) > 0:
-                        logging.info(f"[get_last_post] API returned list, returning first post")
+                        logger.debug(f"[get_last_post] API returned list, returning first post")
                         return data[0]
                     elif isinstance(data, dict) and 'results' in data and data['results']:
-                        logging.info(f"[get_last_post] API returned dict with 'results' key, returning first post")
+                        logger.debug(f"[get_last_post] API returned dict with 'results' key, returning first post")
                         return data['results'][0]
                     else:
-                        logging.warning(f"[get_last_post] No posts found or unexpected format")
+                        logger.warning(f"[get_last_post] No posts found or unexpected format")
                     return {}
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_last_post] API error {response.status}: {error_text}")
+                    logger.error(f"[get_last_post] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in get_last_post")
+        logger.exception("Error in get_last_post")
         return {"error": f"Request failed: {str(e)}"}
     
 def format_posted_at(dt):
@@ -96,14 +143,14 @@ async def try_create_post(author_id, content, post_time, telegram_id) -> dict:
     }
     API_URL = API_BASE + 'ask-posts/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
                 if response.status >= 400:
                     text = await response.text()
-                    logging.error(f"[try_create_post] API error {response.status}: {text}")
+                    logger.error(f"[try_create_post] API error {response.status}: {text}")
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in try_create_post")
+        logger.exception("Error in try_create_post")
         return {"error": f"Request failed: {str(e)}"}
     
 async def get_recent_posts() -> dict:
@@ -116,55 +163,55 @@ async def get_recent_posts() -> dict:
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + 'ask-posts/?is_rejected=false&ordering=-posted_at&page=1&page_size=50'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     data = await response.json()
-                    logging.info(f"[get_recent_posts] Raw response type: {type(data)}")
-                    logging.info(f"[get_recent_posts] Raw response: {str(data)[:200]}...")
+                    logger.debug(f"[get_recent_posts] Raw response type: {type(data)}")
+                    logger.debug(f"[get_recent_posts] Raw response: {str(data)[:200]}...")
                     
                     # Обрабатываем разные форматы ответа
                     if isinstance(data, list):
-                        logging.info(f"[get_recent_posts] API returned list with {len(data)} posts")
+                        logger.debug(f"[get_recent_posts] API returned list with {len(data)} posts")
                         return {"results": data}
                     elif isinstance(data, dict):
                         if 'results' in data:
-                            logging.info(f"[get_recent_posts] API returned dict with 'results' key, {len(data['results'])} posts")
+                            logger.debug(f"[get_recent_posts] API returned dict with 'results' key, {len(data['results'])} posts")
                             return data
                         else:
-                            logging.warning(f"[get_recent_posts] API returned dict without 'results' key: {list(data.keys())}")
+                            logger.warning(f"[get_recent_posts] API returned dict without 'results' key: {list(data.keys())}")
                             return {"results": []}
                     else:
-                        logging.warning(f"[get_recent_posts] Unexpected data format: {type(data)}")
+                        logger.warning(f"[get_recent_posts] Unexpected data format: {type(data)}")
                         return {"results": []}
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_recent_posts] API error {response.status}: {error_text}")
+                    logger.error(f"[get_recent_posts] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in get_recent_posts")
+        logger.exception("Error in get_recent_posts")
         return {"error": f"Request failed: {str(e)}"}
 
 async def mark_post_as_posted(post_id):
     headers = {'Content-Type': 'application/json'}
     API_URL = API_BASE + f'ask-posts/{post_id}/mark_as_posted/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, headers=headers) as response:
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in mark_post_as_posted")
+        logger.exception("Error in mark_post_as_posted")
         return {"error": f"Request failed: {str(e)}"}
 
 async def mark_post_as_rejected(post_id):
     headers = {'Content-Type': 'application/json'}
     API_URL = API_BASE + f'ask-posts/{post_id}/mark_as_rejected/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, headers=headers) as response:
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in mark_post_as_rejected")
+        logger.exception("Error in mark_post_as_rejected")
         return {"error": f"Request failed: {str(e)}"}
 
 async def mark_post_as_rejected_by_telegram_id(telegram_id: int):
@@ -192,157 +239,84 @@ async def leave_anon_comment(telegram_id, reply_to, user_id, content):
     }
     API_URL = API_BASE + 'ask-comments/'
     
-    logging.info(f"[leave_anon_comment] Creating comment with payload: {payload}")
-    logging.info(f"[leave_anon_comment] API URL: {API_URL}")
+    logger.debug(f"[leave_anon_comment] Creating comment with payload: {payload}")
+    logger.debug(f"[leave_anon_comment] API URL: {API_URL}")
     
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
-                logging.info(f"[leave_anon_comment] Response status: {response.status}")
+                logger.debug(f"[leave_anon_comment] Response status: {response.status}")
                 result = await response.json()
-                logging.info(f"[leave_anon_comment] Response: {result}")
+                logger.debug(f"[leave_anon_comment] Response: {result}")
                 return result
     except Exception as e:
-        logging.exception("Error in leave_anon_comment")
+        logger.exception("Error in leave_anon_comment")
         return {"error": f"Request failed: {str(e)}"}
 
 async def get_user_pseudo_names(user_id):
-    headers = {'Accept': 'application/json'}
-    API_URL = API_BASE + f'users/{user_id}/pseudo_names/'
-    logging.info(f"[get_user_pseudo_names] Requesting URL: {API_URL}")
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(API_URL, headers=headers) as response:
-                logging.info(f"[get_user_pseudo_names] Response status: {response.status}")
-                logging.info(f"[get_user_pseudo_names] Response headers: {dict(response.headers)}")
-                
-                if response.status == 200:
-                    data = await response.json()
-                    logging.info(f"[get_user_pseudo_names] Raw data: {data}")
-                    logging.info(f"[get_user_pseudo_names] Data type: {type(data)}")
-                    
-                    # Проверяем, есть ли пагинация
-                    if isinstance(data, dict) and 'results' in data:
-                        results = data['results']
-                        logging.info(f"[get_user_pseudo_names] Found pagination, results: {results}")
-                    elif isinstance(data, list):
-                        results = data
-                        logging.info(f"[get_user_pseudo_names] Direct list response: {results}")
-                    else:
-                        logging.error(f"[get_user_pseudo_names] Unexpected data format: {type(data)}")
-                        return []
-                    
-                    logging.info(f"[get_user_pseudo_names] Results length: {len(results)}")
-                    
-                    pseudo_ids = []
-                    for i, item in enumerate(results):
-                        logging.info(f"[get_user_pseudo_names] Processing item {i}: {item} (type: {type(item)})")
-                        if isinstance(item, dict) and 'pseudo_name' in item:
-                            pseudo_name = item['pseudo_name']
-                            if isinstance(pseudo_name, dict) and 'id' in pseudo_name:
-                                pseudo_ids.append(pseudo_name['id'])
-                                logging.info(f"[get_user_pseudo_names] Added ID from dict: {pseudo_name['id']}")
-                            elif isinstance(pseudo_name, int):
-                                pseudo_ids.append(pseudo_name)
-                                logging.info(f"[get_user_pseudo_names] Added ID from int: {pseudo_name}")
-                            else:
-                                logging.warning(f"[get_user_pseudo_names] Unknown pseudo_name format: {pseudo_name}")
-                        elif isinstance(item, int):
-                            pseudo_ids.append(item)
-                            logging.info(f"[get_user_pseudo_names] Added ID from int: {item}")
-                        else:
-                            logging.warning(f"[get_user_pseudo_names] Unknown item format: {item}")
-                    
-                    logging.info(f"[get_user_pseudo_names] Final extracted pseudo_ids: {pseudo_ids}")
-                    return pseudo_ids
-                elif response.status == 404:
-                    logging.warning(f"[get_user_pseudo_names] User {user_id} has no pseudo names endpoint")
-                    return []
-                else:
-                    error_text = await response.text()
-                    logging.error(f"[get_user_pseudo_names] API error {response.status}: {error_text}")
-                    return []
-    except Exception as e:
-        logging.warning(f"[get_user_pseudo_names] Error for user {user_id}: {e}")
-        return []
+    """
+    Возвращает ID купленных пользователем псевдонимов (из кэша owned_pseudos, см. get_user_pseudo_names_full).
+    """
+    return [pseudo_id for pseudo_id, _ in await get_user_pseudo_names_full(user_id)]
 
 async def get_user_pseudo_names_full(user_id):
     """
-    Возвращает полную информацию о купленных никах пользователя (ID и название)
+    Возвращает полную информацию о купленных никах пользователя (ID и название).
+    Результат кэшируется в owned_pseudos, поэтому листание клавиатуры ников не ходит в API.
     """
+    cached = owned_pseudos.get(user_id)
+    if cached is not None:
+        return list(cached)
+
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'users/{user_id}/pseudo_names/'
-    logging.info(f"[get_user_pseudo_names_full] Requesting URL: {API_URL}")
+    logger.debug(f"[get_user_pseudo_names_full] Requesting URL: {API_URL}")
     
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
-                logging.info(f"[get_user_pseudo_names_full] Response status: {response.status}")
-                logging.info(f"[get_user_pseudo_names_full] Response headers: {dict(response.headers)}")
+                logger.debug(f"[get_user_pseudo_names_full] Response status: {response.status}")
                 
                 if response.status == 200:
                     data = await response.json()
-                    logging.info(f"[get_user_pseudo_names_full] Raw data: {data}")
-                    logging.info(f"[get_user_pseudo_names_full] Data type: {type(data)}")
                     
                     # Проверяем, есть ли пагинация
                     if isinstance(data, dict) and 'results' in data:
                         results = data['results']
-                        logging.info(f"[get_user_pseudo_names_full] Found pagination, results: {results}")
                     elif isinstance(data, list):
                         results = data
-                        logging.info(f"[get_user_pseudo_names_full] Direct list response: {results}")
                     else:
-                        logging.error(f"[get_user_pseudo_names_full] Unexpected data format: {type(data)}")
+                        logger.error(f"[get_user_pseudo_names_full] Unexpected data format: {type(data)}")
                         return []
                     
-                    logging.info(f"[get_user_pseudo_names_full] Results length: {len(results)}")
-                    
                     pseudo_names = []
-                    for i, item in enumerate(results):
-                        logging.info(f"[get_user_pseudo_names_full] Processing item {i}: {item} (type: {type(item)})")
-                        if isinstance(item, dict) and 'pseudo_name' in item:
-                            pseudo_name = item['pseudo_name']
-                            if isinstance(pseudo_name, dict) and 'id' in pseudo_name and 'pseudo' in pseudo_name:
-                                pseudo_names.append((pseudo_name['id'], pseudo_name['pseudo']))
-                                logging.info(f"[get_user_pseudo_names_full] Added from dict: ({pseudo_name['id']}, {pseudo_name['pseudo']})")
-                            elif isinstance(pseudo_name, int):
-                                # Получаем полную информацию о нике по ID
-                                full_info = await get_pseudo_name_by_id(pseudo_name)
-                                if full_info and isinstance(full_info, dict) and 'pseudo' in full_info:
-                                    pseudo_names.append((pseudo_name, full_info['pseudo']))
-                                    logging.info(f"[get_user_pseudo_names_full] Added from API: ({pseudo_name}, {full_info['pseudo']})")
-                                else:
-                                    # Если не удалось получить информацию, используем заглушку
-                                    pseudo_names.append((pseudo_name, f"Nick_{pseudo_name}"))
-                                    logging.warning(f"[get_user_pseudo_names_full] Failed to get info for {pseudo_name}, using placeholder")
-                            else:
-                                logging.warning(f"[get_user_pseudo_names_full] Unknown pseudo_name format: {pseudo_name}")
-                        elif isinstance(item, int):
-                            # Получаем полную информацию о нике по ID
-                            full_info = await get_pseudo_name_by_id(item)
+                    for item in results:
+                        if isinstance(item, dict) and item.get('pseudo'):
+                            # Бэкенд отдает название псевдонима вместе с привязкой
+                            pseudo_names.append((item['pseudo_name'], item['pseudo']))
+                        elif isinstance(item, dict) and isinstance(item.get('pseudo_name'), int):
+                            full_info = await get_pseudo_name_by_id(item['pseudo_name'])
                             if full_info and isinstance(full_info, dict) and 'pseudo' in full_info:
-                                pseudo_names.append((item, full_info['pseudo']))
-                                logging.info(f"[get_user_pseudo_names_full] Added from API: ({item}, {full_info['pseudo']})")
+                                pseudo_names.append((item['pseudo_name'], full_info['pseudo']))
                             else:
                                 # Если не удалось получить информацию, используем заглушку
-                                pseudo_names.append((item, f"Nick_{item}"))
-                                logging.warning(f"[get_user_pseudo_names_full] Failed to get info for {item}, using placeholder")
+                                pseudo_names.append((item['pseudo_name'], f"Nick_{item['pseudo_name']}"))
+                                logger.warning(f"[get_user_pseudo_names_full] Failed to get info for {item['pseudo_name']}, using placeholder")
                         else:
-                            logging.warning(f"[get_user_pseudo_names_full] Unknown item format: {item}")
+                            logger.warning(f"[get_user_pseudo_names_full] Unknown item format: {item}")
                     
-                    logging.info(f"[get_user_pseudo_names_full] Final extracted pseudo_names: {pseudo_names}")
-                    return pseudo_names
+                    logger.debug(f"[get_user_pseudo_names_full] User {user_id} pseudo_names: {pseudo_names}")
+                    owned_pseudos.set(user_id, pseudo_names)
+                    return list(pseudo_names)
                 elif response.status == 404:
-                    logging.warning(f"[get_user_pseudo_names_full] User {user_id} has no pseudo names endpoint")
+                    logger.warning(f"[get_user_pseudo_names_full] User {user_id} has no pseudo names endpoint")
                     return []
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_user_pseudo_names_full] API error {response.status}: {error_text}")
+                    logger.error(f"[get_user_pseudo_names_full] API error {response.status}: {error_text}")
                     return []
     except Exception as e:
-        logging.warning(f"[get_user_pseudo_names_full] Error for user {user_id}: {e}")
+        logger.warning(f"[get_user_pseudo_names_full] Error for user {user_id}: {e}")
         return []
 
 async def get_pseudo_name_by_id(pseudo_id):
@@ -351,30 +325,30 @@ async def get_pseudo_name_by_id(pseudo_id):
     """
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'pseudo-names/{pseudo_id}/'
-    logging.info(f"[get_pseudo_name_by_id] Requesting URL: {API_URL}")
+    logger.debug(f"[get_pseudo_name_by_id] Requesting URL: {API_URL}")
     
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
-                logging.info(f"[get_pseudo_name_by_id] Response status: {response.status}")
+                logger.debug(f"[get_pseudo_name_by_id] Response status: {response.status}")
                 
                 if response.status == 200:
                     result = await response.json()
-                    logging.info(f"[get_pseudo_name_by_id] Result: {result}")
+                    logger.debug(f"[get_pseudo_name_by_id] Result: {result}")
                     return result
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_pseudo_name_by_id] API error {response.status}: {error_text}")
+                    logger.error(f"[get_pseudo_name_by_id] API error {response.status}: {error_text}")
                     return None
     except Exception as e:
-        logging.warning(f"[get_pseudo_name_by_id] Error for pseudo_id {pseudo_id}: {e}")
+        logger.warning(f"[get_pseudo_name_by_id] Error for pseudo_id {pseudo_id}: {e}")
         return None
 
 async def is_user_banned(user_id):
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'users/{user_id}/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     result = await response.json()
@@ -382,18 +356,18 @@ async def is_user_banned(user_id):
                 else:
                     return {"error": f"API request failed with status {response.status}", "details": await response.text()}
     except Exception as e:
-        logging.exception("Error in is_user_banned")
+        logger.exception("Error in is_user_banned")
         return {"error": f"Request failed: {str(e)}"}
 
 async def ban_user(user_id):
     headers = {'Content-Type': 'application/json'}
     API_URL = API_BASE + f'users/{user_id}/ban/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, headers=headers) as response:
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in ban_user")
+        logger.exception("Error in ban_user")
         return {"error": f"Request failed: {str(e)}"}
 
 async def unban_user(user_id):
@@ -412,11 +386,12 @@ async def add_pseudo_name(pseudo: str, price: float, is_available: bool = True)
     }
     API_URL = API_BASE + 'pseudo-names/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
+                pseudo_catalogue.clear()
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in add_pseudo_name")
+        logger.exception("Error in add_pseudo_name")
         return {"error": f"Request failed: {str(e)}"}
 
 async def add_balance(user_id: int, amount: float) -> dict:
@@ -429,11 +404,11 @@ async def add_balance(user_id: int, amount: float) -> dict:
     }
     API_URL = API_BASE + f'users/{user_id}/addbalance/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in add_balance")
+        logger.exception("Error in add_balance")
         return {"error": f"Request failed: {str(e)}"}
 
 async def set_balance(user_id: int, amount: float) -> dict:
@@ -446,57 +421,65 @@ async def set_balance(user_id: int, amount: float) -> dict:
     }
     API_URL = API_BASE + f'users/{user_id}/setbalance/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in set_balance")
+        logger.exception("Error in set_balance")
         return {"error": f"Request failed: {str(e)}"}
 
 async def get_all_pseudo_names() -> Union[list, dict]:
     """
     Получает список всех доступных псевдонимов.
+    Каталог кэшируется на PSEUDO_CACHE_TTL секунд; после истечения копия перепроверяется по ETag
+    (If-None-Match), и при ответе 304 тело заново не загружается.
     """
+    cached = pseudo_catalogue.get('all')
+    if cached is not None:
+        return list(cached['items'])
+
+    stale = pseudo_catalogue.peek('all')
     headers = {'Accept': 'application/json'}
+    if stale is not None and stale.get('etag'):
+        headers['If-None-Match'] = stale['etag']
     API_URL = API_BASE + 'pseudo-names/'
-    logging.info(f"[get_all_pseudo_names] Requesting URL: {API_URL}")
     
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
-                logging.info(f"[get_all_pseudo_names] Response status: {response.status}")
-                logging.info(f"[get_all_pseudo_names] Response headers: {dict(response.headers)}")
+                if response.status == 304 and stale is not None:
+                    pseudo_catalogue.set('all', stale)
+                    return list(stale['items'])
                 
                 if response.status == 200:
                     # Проверяем content-type
                     content_type = response.headers.get('content-type', '')
-                    logging.info(f"[get_all_pseudo_names] Content-Type: {content_type}")
                     
                     if 'application/json' in content_type:
                         data = await response.json()
-                        logging.info(f"[get_all_pseudo_names] Success with endpoint pseudo-names/")
-                        logging.info(f"[get_all_pseudo_names] Response type: {type(data)}")
-                        logging.info(f"[get_all_pseudo_names] Response: {str(data)[:200]}...")
                         
                         # Проверяем, что получили список или объект с results
                         if isinstance(data, list):
-                            return data
+                            items = data
                         elif isinstance(data, dict) and 'results' in data:
-                            return data['results']
+                            items = data['results']
                         else:
-                            logging.error(f"[get_all_pseudo_names] Unexpected response format: {type(data)}")
+                            logger.error(f"[get_all_pseudo_names] Unexpected response format: {type(data)}")
                             return {"error": f"Unexpected response format: {type(data)}"}
+                        pseudo_catalogue.set('all', {"etag": response.headers.get('ETag'), "items": items})
+                        logger.info(f"[get_all_pseudo_names] Catalogue refreshed: {len(items)} pseudos")
+                        return list(items)
                     else:
                         # Получаем текст ответа для отладки
                         text_response = await response.text()
-                        logging.error(f"[get_all_pseudo_names] Non-JSON response: {text_response[:500]}...")
+                        logger.error(f"[get_all_pseudo_names] Non-JSON response: {text_response[:500]}...")
                         return {"error": f"Non-JSON response: {content_type}"}
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_all_pseudo_names] API error {response.status}: {error_text}")
+                    logger.error(f"[get_all_pseudo_names] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in get_all_pseudo_names")
+        logger.exception("Error in get_all_pseudo_names")
         return {"error": f"Request failed: {str(e)}"}
 
 async def deactivate_pseudo_name(pseudo_id: int) -> dict:
@@ -506,11 +489,12 @@ async def deactivate_pseudo_name(pseudo_id: int) -> dict:
     headers = {'Content-Type': 'application/json'}
     API_URL = API_BASE + f'pseudo-names/{pseudo_id}/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.patch(API_URL, json={"is_available": False}, headers=headers) as response:
+                pseudo_catalogue.clear()
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in deactivate_pseudo_name")
+        logger.exception("Error in deactivate_pseudo_name")
         return {"error": f"Request failed: {str(e)}"}
 
 async def purchase_pseudo_name(user_id: int, pseudo_id: int) -> dict:
@@ -524,24 +508,25 @@ async def purchase_pseudo_name(user_id: int, pseudo_id: int) -> dict:
     }
     API_URL = API_BASE + 'user-pseudo-names/'
     
-    logging.info(f"[purchase_pseudo_name] Requesting URL: {API_URL}")
-    logging.info(f"[purchase_pseudo_name] Payload: {payload}")
+    logger.debug(f"[purchase_pseudo_name] Requesting URL: {API_URL}")
+    logger.debug(f"[purchase_pseudo_name] Payload: {payload}")
     
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
-                logging.info(f"[purchase_pseudo_name] Response status: {response.status}")
+                logger.debug(f"[purchase_pseudo_name] Response status: {response.status}")
+                owned_pseudos.pop(user_id)
                 
                 if response.status == 200 or response.status == 201:
                     data = await response.json()
-                    logging.info(f"[purchase_pseudo_name] Success: {data}")
+                    logger.debug(f"[purchase_pseudo_name] Success: {data}")
                     return data
                 else:
                     error_text = await response.text()
-                    logging.error(f"[purchase_pseudo_name] API error {response.status}: {error_text}")
+                    logger.error(f"[purchase_pseudo_name] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in purchase_pseudo_name")
+        logger.exception("Error in purchase_pseudo_name")
         return {"error": f"Request failed: {str(e)}"}
 
 async def get_user_info(user_id):
@@ -551,14 +536,14 @@ async def get_user_info(user_id):
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'users/{user_id}/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     return await response.json()
                 else:
                     return {"error": f"API request failed with status {response.status}", "details": await response.text()}
     except Exception as e:
-        logging.exception("Error in get_user_info")
+        logger.exception("Error in get_user_info")
         return {"error": f"Request failed: {str(e)}"}
 
 async def update_user_info(user_id, username, firstname, lastname) -> dict:
@@ -573,11 +558,17 @@ async def update_user_info(user_id, username, firstname, lastname) -> dict:
     }
     API_URL = API_BASE + f'users/{user_id}/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.patch(API_URL, json=payload, headers=headers) as response:
-                return await response.json()
+                result = await response.json()
+                if response.status == 200:
+                    known_users.set(user_id, _user_fingerprint(username, firstname, lastname))
+                else:
+                    known_users.pop(user_id)
+                return result
     except Exception as e:
-        logging.exception("Error in update_user_info")
+        known_users.pop(user_id)
+        logger.exception("Error in update_user_info")
         return {"error": f"Request failed: {str(e)}"}
 
 async def update_post_channel_info(post_id: int, channel_message_id: int) -> dict:
@@ -594,18 +585,18 @@ async def update_post_channel_info(post_id: int, channel_message_id: int) -> dic
     }
     API_URL = API_BASE + f'ask-posts/{post_id}/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.patch(API_URL, json=payload, headers=headers) as response:
                 if response.status == 200:
                     result = await response.json()
-                    logging.info(f"[update_post_channel_info] Successfully updated post {post_id} with channel_message_id={channel_message_id}")
+                    logger.info(f"[update_post_channel_info] Successfully updated post {post_id} with channel_message_id={channel_message_id}")
                     return result
                 else:
                     error_text = await response.text()
-                    logging.error(f"[update_post_channel_info] API error {response.status}: {error_text}")
+                    logger.error(f"[update_post_channel_info] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception(f"[update_post_channel_info] Exception for post_id={post_id}")
+        logger.exception(f"[update_post_channel_info] Exception for post_id={post_id}")
         return {"error": f"Request failed: {str(e)}"}
 
 async def get_post_info(post_id: int) -> dict:
@@ -615,14 +606,14 @@ async def get_post_info(post_id: int) -> dict:
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'ask-posts/{post_id}/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     return await response.json()
                 else:
                     return {"error": f"API request failed with status {response.status}", "details": await response.text()}
     except Exception as e:
-        logging.exception("Error in get_post_info")
+        logger.exception("Error in get_post_info")
         return {"error": f"Request failed: {str(e)}"}
 
 async def get_post_by_telegram_id(telegram_id: int) -> dict:
@@ -631,15 +622,15 @@ async def get_post_by_telegram_id(telegram_id: int) -> dict:
     """
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'ask-posts/?telegram_id={telegram_id}'
-    logging.info(f"[get_post_by_telegram_id] Searching for telegram_id={telegram_id}, URL={API_URL}")
+    logger.debug(f"[get_post_by_telegram_id] Searching for telegram_id={telegram_id}, URL={API_URL}")
     
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
-                logging.info(f"[get_post_by_telegram_id] Response status: {response.status}")
+                logger.debug(f"[get_post_by_telegram_id] Response status: {response.status}")
                 if response.status == 200:
                     data = await response.json()
-                    logging.info(f"[get_post_by_telegram_id] Response data: {data}")
+                    logger.debug(f"[get_post_by_telegram_id] Response data: {data}")
                     
                     # Проверяем разные форматы ответа
                     results = None
@@ -651,17 +642,17 @@ async def get_post_by_telegram_id(telegram_id: int) -> dict:
                         results = data['results']
                     
                     if results and len(results) > 0:
-                        logging.info(f"[get_post_by_telegram_id] Found post: {results[0]}")
+                        logger.debug(f"[get_post_by_telegram_id] Found post: {results[0]}")
                         return results[0]  # Возвращаем первый найденный пост
                     else:
-                        logging.warning(f"[get_post_by_telegram_id] No posts found for telegram_id={telegram_id}")
+                        logger.warning(f"[get_post_by_telegram_id] No posts found for telegram_id={telegram_id}")
                         return {"error": "Post not found"}
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_post_by_telegram_id] API error {response.status}: {error_text}")
+                    logger.error(f"[get_post_by_telegram_id] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception(f"[get_post_by_telegram_id] Exception for telegram_id={telegram_id}")
+        logger.exception(f"[get_post_by_telegram_id] Exception for telegram_id={telegram_id}")
         return {"error": f"Request failed: {str(e)}"}
 
 async def process_post_payment(post_id: int) -> dict:
@@ -671,11 +662,11 @@ async def process_post_payment(post_id: int) -> dict:
     headers = {'Content-Type': 'application/json'}
     API_URL = API_BASE + f'ask-posts/{post_id}/process_payment/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, headers=headers) as response:
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in process_post_payment")
+        logger.exception("Error in process_post_payment")
         return {"error": f"Request failed: {str(e)}"}
 
 async def publish_post_now(post_id: int) -> dict:
@@ -685,11 +676,11 @@ async def publish_post_now(post_id: int) -> dict:
     headers = {'Content-Type': 'application/json'}
     API_URL = API_BASE + f'ask-posts/{post_id}/publish_now/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, headers=headers) as response:
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in publish_post_now")
+        logger.exception("Error in publish_post_now")
         return {"error": f"Request failed: {str(e)}"}
 
 async def set_user_level(user_id: int, level: int) -> dict:
@@ -702,46 +693,48 @@ async def set_user_level(user_id: int, level: int) -> dict:
     }
     API_URL = API_BASE + f'users/{user_id}/setlevel/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
                 return await response.json()
     except Exception as e:
-        logging.exception("Error in set_user_level")
+        logger.exception("Error in set_user_level")
         return {"error": f"Request failed: {str(e)}"}
 
-async def get_active_posts_count() -> int:
+async def get_posts_stats(author_id: int = None) -> dict:
     """
-    Получает количество активных постов в очереди (не отклоненных и не опубликованных)
-    
+    Получает количество постов по статусам (агрегат на backend, без выгрузки самих постов).
+
     Возвращает:
-        int: Количество активных постов
+        dict: {'total', 'posted', 'rejected', 'queued'} (+ 'comments' при author_id) или словарь с ошибкой
     """
     headers = {'Accept': 'application/json'}
-    API_URL = API_BASE + 'ask-posts/?is_posted=false&is_rejected=false&page=1&page_size=1000'
+    API_URL = API_BASE + 'ask-posts/stats/'
+    params = {'author': author_id} if author_id is not None else None
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(API_URL, headers=headers) as response:
+        async with api_client.session() as session:
+            async with session.get(API_URL, headers=headers, params=params) as response:
                 if response.status == 200:
-                    data = await response.json()
-                    
-                    # Обрабатываем разные форматы ответа
-                    posts = []
-                    if isinstance(data, list):
-                        posts = data
-                    elif isinstance(data, dict) and 'results' in data:
-                        posts = data['results']
-                    
-                    # Теперь все посты уже отфильтрованы API запросом
-                    active_count = len(posts)
-                    
-                    logging.info(f"[get_active_posts_count] Found {active_count} active posts")
-                    return active_count
-                else:
-                    logging.error(f"[get_active_posts_count] API error {response.status}")
-                    return 0
+                    return await response.json()
+                error_text = await response.text()
+                logger.error(f"[get_posts_stats] API error {response.status}: {error_text}")
+                return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in get_active_posts_count")
+        logger.exception("Error in get_posts_stats")
+        return {"error": f"Request failed: {str(e)}"}
+
+async def get_active_posts_count() -> int:
+    """
+    Получает количество активных постов в очереди (не отклоненных и не опубликованных)
+    
+    Возвращает:
+        int: Количество активных постов
+    """
+    stats = await get_posts_stats()
+    if 'error' in stats:
         return 0
+    active_count = int(stats.get('queued', 0))
+    logger.info(f"[get_active_posts_count] Found {active_count} active posts")
+    return active_count
 
 async def create_user_pseudo_name(user_id: int, pseudo_id: int) -> dict:
     """
@@ -754,222 +747,147 @@ async def create_user_pseudo_name(user_id: int, pseudo_id: int) -> dict:
     }
     API_URL = API_BASE + 'user-pseudo-names/'
     
-    logging.info(f"[create_user_pseudo_name] Requesting URL: {API_URL}")
-    logging.info(f"[create_user_pseudo_name] Payload: {payload}")
+    logger.debug(f"[create_user_pseudo_name] Requesting URL: {API_URL}")
+    logger.debug(f"[create_user_pseudo_name] Payload: {payload}")
     
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
-                logging.info(f"[create_user_pseudo_name] Response status: {response.status}")
+                logger.debug(f"[create_user_pseudo_name] Response status: {response.status}")
+                owned_pseudos.pop(user_id)
                 
                 if response.status == 200 or response.status == 201:
                     data = await response.json()
-                    logging.info(f"[create_user_pseudo_name] Success: {data}")
+                    logger.debug(f"[create_user_pseudo_name] Success: {data}")
                     return data
                 else:
                     error_text = await response.text()
-                    logging.error(f"[create_user_pseudo_name] API error {response.status}: {error_text}")
+                    logger.error(f"[create_user_pseudo_name] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in create_user_pseudo_name")
+        logger.exception("Error in create_user_pseudo_name")
         return {"error": f"Request failed: {str(e)}"}
 
-async def ensure_user_has_default_pseudos(user_id: int) -> bool:
+async def ensure_user_has_default_pseudos(user_id: int) -> list:
     """
-    Убеждается, что у пользователя есть как минимум 3 псевдонима.
-    Если нет - создает встроенные псевдонимы.
+    Выдает пользователю встроенные псевдонимы, если у него их меньше трех (на стороне бэкенда, одной транзакцией).
+    Возвращает список псевдонимов пользователя [(id, pseudo), ...] в формате get_user_pseudo_names_full;
+    при ошибке — пустой список.
     """
-    logging.info(f"[ensure_user_has_default_pseudos] Checking user {user_id}")
-    
-    # Получаем текущие псевдонимы пользователя
-    user_pseudos = await get_user_pseudo_names(user_id)
-    logging.info(f"[ensure_user_has_default_pseudos] User {user_id} has {len(user_pseudos)} pseudos: {user_pseudos}")
-    
-    if len(user_pseudos) >= 3:
-        logging.info(f"[ensure_user_has_default_pseudos] User {user_id} already has enough pseudos")
-        return True
-    
-    # Встроенные псевдонимы по умолчанию
-    default_pseudos = [
-        {"pseudo": "Потный щитпостер", "price": 0.0},
-        {"pseudo": "Секси имошница", "price": 0.0},
-        {"pseudo": "Призрак Т-корпуса", "price": 0.0}
-    ]
-    
-    # Получаем все существующие псевдонимы
-    all_pseudos = await get_all_pseudo_names()
-    if isinstance(all_pseudos, dict) and all_pseudos.get("error"):
-        logging.error(f"[ensure_user_has_default_pseudos] Error getting all pseudos: {all_pseudos.get('error')}")
-        return False
-    
-    if not isinstance(all_pseudos, list):
-        logging.error(f"[ensure_user_has_default_pseudos] Unexpected all_pseudos format: {type(all_pseudos)}")
-        return False
-    
-    # Проверяем, какие псевдонимы уже существуют
-    existing_pseudo_names = [p['pseudo'] for p in all_pseudos]
-    logging.info(f"[ensure_user_has_default_pseudos] Existing pseudo names: {existing_pseudo_names}")
-    
-    # Создаем недостающие псевдонимы
-    pseudos_to_create = 3 - len(user_pseudos)
-    created_count = 0
-    
-    for i in range(pseudos_to_create):
-        pseudo_data = default_pseudos[i]
-        
-        # Проверяем, существует ли уже такой псевдоним
-        if pseudo_data['pseudo'] in existing_pseudo_names:
-            # Находим существующий псевдоним
-            existing_pseudo = next(p for p in all_pseudos if p['pseudo'] == pseudo_data['pseudo'])
-            pseudo_id = existing_pseudo['id']
-            logging.info(f"[ensure_user_has_default_pseudos] Found existing pseudo '{pseudo_data['pseudo']}' with ID {pseudo_id}")
-        else:
-            # Создаем новый псевдоним в базе данных
-            add_result = await add_pseudo_name(
-                pseudo=pseudo_data['pseudo'],
-                price=pseudo_data['price'],
-                is_available=True
-            )
-            
-            if 'id' in add_result:
-                pseudo_id = add_result['id']
-                logging.info(f"[ensure_user_has_default_pseudos] Created pseudo '{pseudo_data['pseudo']}' with ID {pseudo_id}")
-            else:
-                logging.error(f"[ensure_user_has_default_pseudos] Failed to create pseudo '{pseudo_data['pseudo']}': {add_result}")
-                continue
-        
-        # Проверяем, не связан ли уже псевдоним с пользователем
-        if pseudo_id in user_pseudos:
-            logging.info(f"[ensure_user_has_default_pseudos] Pseudo {pseudo_id} already linked to user {user_id}")
-            created_count += 1
-            continue
-        
-        # Связываем псевдоним с пользователем
-        create_result = await create_user_pseudo_name(user_id, pseudo_id)
-        
-        if 'id' in create_result and 'pseudo_name' in create_result:
-            logging.info(f"[ensure_user_has_default_pseudos] Successfully linked pseudo {pseudo_id} to user {user_id}")
-            created_count += 1
-        else:
-            logging.error(f"[ensure_user_has_default_pseudos] Failed to link pseudo {pseudo_id} to user {user_id}: {create_result}")
-    
-    logging.info(f"[ensure_user_has_default_pseudos] Created/linked {created_count} pseudos for user {user_id}")
-    return created_count > 0
+    cached = owned_pseudos.get(user_id)
+    if cached is not None and len(cached) >= 3:
+        return list(cached)
+
+    headers = {'Accept': 'application/json'}
+    API_URL = API_BASE + f'users/{user_id}/ensure_default_pseudos/'
+    try:
+        async with api_client.session() as session:
+            async with session.post(API_URL, headers=headers) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"[ensure_user_has_default_pseudos] API error {response.status}: {error_text}")
+                    return []
+                data = await response.json()
+    except Exception as e:
+        logger.exception("Error in ensure_user_has_default_pseudos")
+        return []
+    logger.info(f"[ensure_user_has_default_pseudos] User {user_id}: linked {data.get('created')} default pseudos")
+    pseudo_names = [(item['id'], item['pseudo']) for item in data.get('pseudo_names', [])]
+    owned_pseudos.set(user_id, pseudo_names)
+    return list(pseudo_names)
+
+# Коды ошибок бэкенда (api/ledger.py) -> сообщения для пользователя
+PURCHASE_ERRORS = {
+    "insufficient_funds": "Недостаточно средств на балансе",
+    "pseudo_unavailable": "Псевдоним недоступен для покупки",
+    "already_owned": "Этот псевдоним у вас уже есть",
+    "user_not_found": "Не удалось получить информацию о пользователе",
+}
 
 async def purchase_pseudo_name_with_payment(user_id: int, pseudo_id: int) -> dict:
     """
     Покупает псевдоним для пользователя с проверкой баланса и списанием денег.
+    Проверка, списание и привязка псевдонима выполняются бэкендом в одной транзакции (users/{id}/purchase_pseudo/).
     """
-    logging.info(f"[purchase_pseudo_name_with_payment] User {user_id} trying to purchase pseudo {pseudo_id}")
-    
-    # Получаем информацию о пользователе
-    user_info = await get_user_info(user_id)
-    if isinstance(user_info, dict) and user_info.get("error"):
-        logging.error(f"[purchase_pseudo_name_with_payment] Error getting user info: {user_info.get('error')}")
-        return {"error": "Не удалось получить информацию о пользователе"}
-    
-    user_balance = float(user_info.get('balance', 0))
-    logging.info(f"[purchase_pseudo_name_with_payment] User {user_id} balance: {user_balance}")
-    
-    # Получаем информацию о псевдониме
-    pseudo_info = await get_pseudo_name_by_id(pseudo_id)
-    if not pseudo_info or isinstance(pseudo_info, dict) and pseudo_info.get("error"):
-        logging.error(f"[purchase_pseudo_name_with_payment] Error getting pseudo info: {pseudo_info}")
-        return {"error": "Не удалось получить информацию о псевдониме"}
-    
-    pseudo_price = float(pseudo_info.get('price', 0))
-    logging.info(f"[purchase_pseudo_name_with_payment] Pseudo {pseudo_id} price: {pseudo_price}")
-    
-    # Проверяем, достаточно ли средств
-    if user_balance < pseudo_price:
-        logging.warning(f"[purchase_pseudo_name_with_payment] Insufficient balance: {user_balance} < {pseudo_price}")
-        return {"error": "Недостаточно средств на балансе"}
-    
-    # Проверяем, доступен ли псевдоним
-    if not pseudo_info.get('is_available', True):
-        logging.warning(f"[purchase_pseudo_name_with_payment] Pseudo {pseudo_id} is not available")
-        return {"error": "Псевдоним недоступен для покупки"}
-    
-    # Списываем деньги с баланса
-    new_balance = user_balance - pseudo_price
-    balance_result = await set_balance(user_id, new_balance)
-    if isinstance(balance_result, dict) and balance_result.get("error"):
-        logging.error(f"[purchase_pseudo_name_with_payment] Error updating balance: {balance_result.get('error')}")
-        return {"error": "Не удалось обновить баланс"}
-    
-    logging.info(f"[purchase_pseudo_name_with_payment] Updated balance: {user_balance} -> {new_balance}")
-    
-    # Создаем связь между пользователем и псевдонимом
-    purchase_result = await purchase_pseudo_name(user_id, pseudo_id)
-    if isinstance(purchase_result, dict) and purchase_result.get("error"):
-        logging.error(f"[purchase_pseudo_name_with_payment] Error creating purchase: {purchase_result.get('error')}")
-        # Возвращаем деньги, если покупка не удалась
-        await set_balance(user_id, user_balance)
-        return {"error": "Не удалось создать покупку"}
-    
-    logging.info(f"[purchase_pseudo_name_with_payment] Successfully purchased pseudo {pseudo_id} for user {user_id}")
+    logger.info(f"[purchase_pseudo_name_with_payment] User {user_id} trying to purchase pseudo {pseudo_id}")
+    headers = {'Content-Type': 'application/json'}
+    payload = {"pseudo_name": pseudo_id}
+    API_URL = API_BASE + f'users/{user_id}/purchase_pseudo/'
+    try:
+        async with api_client.session() as session:
+            async with session.post(API_URL, json=payload, headers=headers) as response:
+                result = await response.json()
+                if response.status >= 400:
+                    logger.warning(f"[purchase_pseudo_name_with_payment] API error {response.status}: {result}")
+                    return {"error": PURCHASE_ERRORS.get(result.get("code"), "Не удалось создать покупку")}
+    except Exception as e:
+        logger.exception("Error in purchase_pseudo_name_with_payment")
+        return {"error": f"Request failed: {str(e)}"}
+
+    logger.info(f"[purchase_pseudo_name_with_payment] Successfully purchased pseudo {pseudo_id} for user {user_id}, balance: {result.get('new_balance')}")
+    owned_pseudos.set(user_id, [(item['id'], item['pseudo']) for item in result.get('pseudo_names', [])])
     return {
         "success": True,
-        "pseudo_name": pseudo_info.get('pseudo'),
-        "price": pseudo_price,
-        "new_balance": new_balance
+        "pseudo_name": result.get('pseudo_name'),
+        "price": float(result.get('price', 0)),
+        "new_balance": float(result.get('new_balance', 0)),
+        "pseudo_names": [(item['id'], item['pseudo']) for item in result.get('pseudo_names', [])]
     }
 
 async def get_comment_by_telegram_id(telegram_id: int) -> dict:
     """
     Получает информацию о комментарии по его telegram_id
     """
-    logging.info(f"[get_comment_by_telegram_id] Starting search for telegram_id: {telegram_id}")
+    logger.debug(f"[get_comment_by_telegram_id] Starting search for telegram_id: {telegram_id}")
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'ask-comments/telegram/{telegram_id}/'
-    logging.info(f"[get_comment_by_telegram_id] Requesting URL: {API_URL}")
+    logger.debug(f"[get_comment_by_telegram_id] Requesting URL: {API_URL}")
     
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
-                logging.info(f"[get_comment_by_telegram_id] Response status: {response.status}")
-                logging.info(f"[get_comment_by_telegram_id] Response headers: {dict(response.headers)}")
+                logger.debug(f"[get_comment_by_telegram_id] Response status: {response.status}")
                 
                 if response.status == 200:
                     result = await response.json()
-                    logging.info(f"[get_comment_by_telegram_id] Success! Result: {result}")
+                    logger.debug(f"[get_comment_by_telegram_id] Success! Result: {result}")
                     return result
                 elif response.status == 404:
-                    logging.warning(f"[get_comment_by_telegram_id] Comment with telegram_id {telegram_id} not found")
+                    logger.warning(f"[get_comment_by_telegram_id] Comment with telegram_id {telegram_id} not found")
                     return {"error": "Comment not found"}
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_comment_by_telegram_id] API error {response.status}: {error_text}")
+                    logger.error(f"[get_comment_by_telegram_id] API error {response.status}: {error_text}")
                     return {"error": f"API error {response.status}: {error_text}"}
     except Exception as e:
-        logging.exception(f"[get_comment_by_telegram_id] Exception for telegram_id {telegram_id}: {e}")
+        logger.exception(f"[get_comment_by_telegram_id] Exception for telegram_id {telegram_id}: {e}")
         return {"error": f"Request failed: {str(e)}"}
 
 async def send_comment_reply_notification(bot, original_comment_author_id: int, original_comment_content: str, reply_telegram_id: int, reply_content: str):
     """
     Отправляет уведомление автору оригинального комментария о том, что на него ответили
     """
-    logging.info(f"[send_comment_reply_notification] Starting notification process")
-    logging.info(f"[send_comment_reply_notification] original_comment_author_id: {original_comment_author_id}")
-    logging.info(f"[send_comment_reply_notification] reply_telegram_id: {reply_telegram_id}")
-    logging.info(f"[send_comment_reply_notification] original_comment_content: {original_comment_content[:50]}...")
-    logging.info(f"[send_comment_reply_notification] reply_content: {reply_content[:50]}...")
+    logger.debug(f"[send_comment_reply_notification] Starting notification process")
+    logger.debug(f"[send_comment_reply_notification] original_comment_author_id: {original_comment_author_id}")
+    logger.debug(f"[send_comment_reply_notification] reply_telegram_id: {reply_telegram_id}")
+    logger.debug(f"[send_comment_reply_notification] original_comment_content: {original_comment_content[:50]}...")
+    logger.debug(f"[send_comment_reply_notification] reply_content: {reply_content[:50]}...")
     
     try:
         # Формируем ссылку на ответ - используем CHAT_ID для ссылок
         channel_id = os.getenv("ORACLE_TARGET_CHAT_ID")
         if not channel_id:
-            logging.error(f"[send_comment_reply_notification] CHAT_ID not set")
+            logger.error(f"[send_comment_reply_notification] CHAT_ID not set")
             return
             
-        logging.info(f"[send_comment_reply_notification] CHAT_ID: {channel_id}")
+        logger.debug(f"[send_comment_reply_notification] CHAT_ID: {channel_id}")
         
         if channel_id.startswith('-100'):
             channel_id = channel_id[4:]  # Убираем префикс -100 для ссылки
-            logging.info(f"[send_comment_reply_notification] Removed -100 prefix, channel_id: {channel_id}")
+            logger.debug(f"[send_comment_reply_notification] Removed -100 prefix, channel_id: {channel_id}")
         
         reply_link = f"https://t.me/c/{channel_id}/{reply_telegram_id}"
-        logging.info(f"[send_comment_reply_notification] Generated reply_link: {reply_link}")
+        logger.debug(f"[send_comment_reply_notification] Generated reply_link: {reply_link}")
         
         # Формируем уведомление
         notification_text = f"<b>Вам ответили на комментарий</b>\n\n"
@@ -984,49 +902,110 @@ async def send_comment_reply_notification(bot, original_comment_author_id: int,
         notification_text += f"• Перейдите по ссылке выше\n"
         notification_text += f"• Нажмите кнопку 'Ответить' под комментарием"
         
-        logging.info(f"[send_comment_reply_notification] Prepared notification text (length: {len(notification_text)})")
+        logger.debug(f"[send_comment_reply_notification] Prepared notification text (length: {len(notification_text)})")
         
         # Отправляем уведомление
-        logging.info(f"[send_comment_reply_notification] Sending message to user {original_comment_author_id}")
-        await bot.send_message(
+        logger.debug(f"[send_comment_reply_notification] Sending message to user {original_comment_author_id}")
+        await sender.send(
+            bot.send_message, PRIORITY_NOTIFICATION,
             chat_id=original_comment_author_id,
             text=notification_text,
             parse_mode="HTML",
             disable_web_page_preview=True
         )
-        logging.info(f"[send_comment_reply_notification] Reply notification sent to user {original_comment_author_id}")
+        logger.info(f"[send_comment_reply_notification] Reply notification sent to user {original_comment_author_id}")
         
     except Exception as e:
-        logging.error(f"[send_comment_reply_notification] Exception details: {type(e).__name__}: {str(e)}")
+        logger.error(f"[send_comment_reply_notification] Exception details: {type(e).__name__}: {str(e)}")
         if "chat not found" in str(e).lower():
-            logging.warning(f"[send_comment_reply_notification] User {original_comment_author_id} not found or blocked bot")
+            logger.warning(f"[send_comment_reply_notification] User {original_comment_author_id} not found or blocked bot")
         else:
-            logging.error(f"[send_comment_reply_notification] Error sending reply notification: {e}")
+            logger.error(f"[send_comment_reply_notification] Error sending reply notification: {e}")
             import traceback
-            logging.error(f"[send_comment_reply_notification] Traceback: {traceback.format_exc()}")
+            logger.error(f"[send_comment_reply_notification] Traceback: {traceback.format_exc()}")
 
-async def get_all_users(page_size=1000):
+async def iter_api_results(path, params=None, page_size=1000):
     """
-    Получает список всех пользователей (до 1000 за раз).
+    Асинхронный генератор по всем записям списочного эндпоинта с keyset-пагинацией (?cursor=).
+    Каждая следующая страница запрашивается по ссылке next из предыдущей, поэтому полный проход
+    линейный и не пропускает записи, добавленные во время обхода.
+    При ошибке запроса страницы генератор пишет в лог и выбрасывает aiohttp.ClientResponseError,
+    чтобы вызывающий не принял частичный список за полный.
     """
     headers = {'Accept': 'application/json'}
-    API_URL = API_BASE + f'users/?page_size={page_size}'
+    url = API_BASE + path
+    query = {**(params or {}), 'cursor': '', 'page_size': page_size}
+    async with api_client.session() as session:
+        while url:
+            async with session.get(url, headers=headers, params=query) as response:
+                if response.status != 200:
+                    text = await response.text()
+                    logger.error(f"[iter_api_results] {path}: HTTP {response.status}: {text}")
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history, status=response.status, message=text,
+                    )
+                data = await response.json()
+            for item in data.get('results', []):
+                yield item
+            # В ссылке next уже есть все параметры запроса и курсор
+            url, query = data.get('next'), None
+
+async def iter_users(page_size=1000):
+    """Асинхронный генератор по всем пользователям (keyset-пагинация по id)"""
+    async for user in iter_api_results('users/', {'ordering': 'id'}, page_size=page_size):
+        yield user
+
+async def get_broadcast_user_ids(after_id: int = 0, page_size: int = 500):
+    """
+    Следующая страница id пользователей для рассылки: id > after_id по возрастанию, без заблокировавших бота.
+    Каждая страница — отдельный запрос, поэтому рассылку можно продолжить с последнего обработанного id.
+
+    Возвращает:
+        list[int] | None: id пользователей (пустой список — обход закончен) или None при ошибке запроса
+    """
+    headers = {'Accept': 'application/json'}
+    params = {
+        'cursor': '', 'page_size': page_size, 'fields': 'id',
+        'id_after': after_id, 'askmephi_bot_blocked': 'false',
+    }
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(API_URL, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    # Поддержка пагинации и разных форматов
-                    if isinstance(data, dict) and 'results' in data:
-                        return data['results']
-                    elif isinstance(data, list):
-                        return data
-                    else:
-                        return []
-                else:
-                    return []
+        async with api_client.session() as session:
+            async with session.get(API_BASE + 'users/', headers=headers, params=params) as response:
+                if response.status != 200:
+                    logger.error(f"[get_broadcast_user_ids] HTTP {response.status}: {await response.text()}")
+                    return None
+                data = await response.json()
+                return [user['id'] for user in data.get('results', [])]
+    except Exception as e:
+        logger.exception("Error in get_broadcast_user_ids")
+        return None
+
+async def set_bot_blocked(user_id: int, blocked: bool = True) -> dict:
+    """
+    Отмечает, что пользователь заблокировал бота или удалил аккаунт: рассылки его пропускают.
+    Отметка снимается в try_create_user при следующем обращении пользователя к боту (в любом воркере).
+    """
+    headers = {'Content-Type': 'application/json'}
+    API_URL = API_BASE + f'users/{user_id}/'
+    try:
+        async with api_client.session() as session:
+            async with session.patch(API_URL, json={"askmephi_bot_blocked": blocked}, headers=headers) as response:
+                # Сбрасываем кэш, чтобы EnsureUserMiddleware снова вызвал try_create_user
+                known_users.pop(user_id)
+                events.publish('user_blocked', user_id=user_id)
+                return await response.json()
+    except Exception as e:
+        logger.exception("Error in set_bot_blocked")
+        return {"error": f"Request failed: {str(e)}"}
+
+async def get_all_users(page_size=1000):
+    """
+    Получает список всех пользователей (обходит все страницы курсором).
+    """
+    try:
+        return [user async for user in iter_users(page_size=page_size)]
     except Exception as e:
-        logging.exception("Error in get_all_users")
+        logger.exception("Error in get_all_users")
         return []
 
 async def get_last_published_post_time() -> dict:
@@ -1039,9 +1018,9 @@ async def get_last_published_post_time() -> dict:
     """
     headers = {'Accept': 'application/json'}
     # Получаем последний опубликованный пост, отсортированный по channel_posted_at
-    API_URL = API_BASE + 'ask-posts/?is_posted=true&ordering=-channel_posted_at&page=1&page_size=1'
+    API_URL = API_BASE + 'ask-posts/?is_posted=true&ordering=-channel_posted_at&page=1&page_size=1&fields=id,channel_posted_at,posted_at,author,content'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     data = await response.json()
@@ -1059,111 +1038,63 @@ async def get_last_published_post_time() -> dict:
                 else:
                     return {'error': f'API request failed with status {response.status}'}
     except Exception as e:
-        logging.error(f"[get_last_published_post_time] Exception: {e}")
+        logger.error(f"[get_last_published_post_time] Exception: {e}")
         return {'error': str(e)}
 
-async def recalculate_queue_after_immediate_publication():
+async def reschedule_queue(interval_minutes: int = 30) -> dict:
     """
-    Пересчитывает время для всех постов в очереди после моментальной публикации.
-    Вызывается после публикации поста через 'publish_now'.
+    Пересобирает очередь постов на backend одним запросом: посты получают 30-минутные слоты
+    после последней публикации, время в неактивный период (01:00-10:00 по Москве) переносится на 10:00.
+    Все изменения применяются в одной транзакции.
+
+    Возвращает:
+        dict: {'status', 'updated_count', 'queued_count', 'message', 'schedule'} или словарь с ошибкой
     """
     headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-    
-    # Получаем все неопубликованные и неотклоненные посты, отсортированные по posted_at
-    # Получаем все посты (и опубликованные, и нет), отсортированные по posted_at
-    API_URL_ALL = API_BASE + 'ask-posts/?is_rejected=false&ordering=posted_at&page_size=1000'
-    all_posts = []
+    API_URL = API_BASE + 'ask-posts/reschedule_queue/'
     try:
-        async with aiohttp.ClientSession() as session_all:
-            async with session_all.get(API_URL_ALL, headers=headers) as resp_all:
-                if resp_all.status == 200:
-                    data_all = await resp_all.json()
-                    all_posts = data_all['results'] if isinstance(data_all, dict) and 'results' in data_all else data_all if isinstance(data_all, list) else []
+        async with api_client.session() as session:
+            async with session.post(API_URL, json={'interval_minutes': interval_minutes}, headers=headers) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    logger.info(f"[reschedule_queue] {result.get('message')}")
+                    return result
+                error_text = await response.text()
+                logger.error(f"[reschedule_queue] API error {response.status}: {error_text}")
+                return {'error': f'API request failed with status {response.status}', 'details': error_text}
     except Exception as e:
-        logging.error(f"[recalculate_queue] Error fetching all posts for chain: {e}")
-
-    # Найти последний опубликованный пост
-    last_published = None
-    for post in reversed(all_posts):
-        if post.get('is_posted') and post.get('channel_posted_at'):
-            last_published = post
-            break
-
-    def parse_dt(dtstr):
-        try:
-            if dtstr:
-                if '+' in dtstr or 'Z' in dtstr:
-                    return datetime.strptime(dtstr.replace('Z', '+0000'), "%Y-%m-%dT%H:%M:%S%z")
-                else:
-                    return datetime.strptime(dtstr, "%Y-%m-%d %H:%M:%S")
-        except Exception:
-            return None
-
-    queued_posts = [p for p in all_posts if not p.get('is_posted')]
-    if not queued_posts:
-        logging.info("[recalculate_queue] No posts in queue to recalculate")
-        return {'status': 'success', 'message': 'No posts in queue', 'updated_count': 0}
-
-    # Стартовое время — channel_posted_at последнего опубликованного, иначе posted_at первого в очереди
-    if last_published:
-        prev_time = parse_dt(last_published.get('channel_posted_at'))
-    else:
-        prev_time = parse_dt(queued_posts[0].get('posted_at')) or datetime.now(timezone.utc)
-
-    moscow_tz = pytz.timezone('Europe/Moscow')
-    updated_count = 0
-
-    for post in queued_posts:
-        next_time = prev_time + timedelta(minutes=30)
-        # Проверяем неактивные часы
-        next_time_moscow = next_time.astimezone(moscow_tz)
-        if 1 <= next_time_moscow.hour < 10:
-            new_time_moscow = next_time_moscow.replace(hour=10, minute=0, second=0, microsecond=0)
-            next_time = new_time_moscow.astimezone(timezone.utc)
-            logging.info(f"[recalculate_queue] Post {post['id']} moved from {next_time_moscow.strftime('%H:%M')} to 10:00 due to inactive hours")
-        # Обновляем время поста
-        new_post_time = next_time.strftime("%Y-%m-%dT%H:%M:%S%z")
-        update_url = API_BASE + f'ask-posts/{str(post['id'])}/'
-        update_data = {'posted_at': new_post_time}
-        try:
-            async with aiohttp.ClientSession() as session_upd:
-                async with session_upd.patch(update_url, json=update_data, headers=headers) as resp_upd:
-                    if resp_upd.status == 200:
-                        updated_count += 1
-        except Exception as e:
-            logging.error(f"[recalculate_queue] Exception updating post {post['id']}: {e}")
-        prev_time = next_time
-
-    logging.info(f"[recalculate_queue] Successfully updated {updated_count} posts")
-    return {
-        'status': 'success',
-        'updated_count': updated_count,
-        'message': f'Updated {updated_count} posts in queue'
-    }
+        logger.error(f"[reschedule_queue] Exception: {e}")
+        return {'error': str(e)}
+
+async def recalculate_queue_after_immediate_publication():
+    """
+    Пересчитывает время для всех постов в очереди после моментальной публикации.
+    Вызывается после публикации поста через 'publish_now'.
+    """
+    return await reschedule_queue()
 
 async def get_queue_info():
     """
-    Получает информацию о текущей очереди постов
+    Получает информацию о текущей очереди постов (компактное представление очереди:
+    id, author, author_username, telegram_id, posted_at, media_type, content)
     """
     headers = {'Accept': 'application/json'}
-    API_URL = API_BASE + 'ask-posts/?is_rejected=false&is_posted=false&ordering=posted_at'
+    API_URL = API_BASE + 'ask-posts/queue/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     data = await response.json()
-                    if isinstance(data, list):
-                        return {"results": data, "count": len(data)}
-                    elif isinstance(data, dict) and 'results' in data:
+                    if isinstance(data, dict) and 'results' in data:
                         return data
                     else:
                         return {"results": [], "count": 0}
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_queue_info] API error {response.status}: {error_text}")
+                    logger.error(f"[get_queue_info] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in get_queue_info")
+        logger.exception("Error in get_queue_info")
         return {"error": f"Request failed: {str(e)}"}
 
 # ==================== PROMO CODE FUNCTIONS ====================
@@ -1178,7 +1109,7 @@ async def get_all_promo_codes() -> Union[list, dict]:
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + 'promo-codes/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     data = await response.json()
@@ -1190,10 +1121,10 @@ async def get_all_promo_codes() -> Union[list, dict]:
                         return []
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_all_promo_codes] API error {response.status}: {error_text}")
+                    logger.error(f"[get_all_promo_codes] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in get_all_promo_codes")
+        logger.exception("Error in get_all_promo_codes")
         return {"error": f"Request failed: {str(e)}"}
 
 async def get_promo_code_by_code(code: str) -> dict:
@@ -1209,7 +1140,7 @@ async def get_promo_code_by_code(code: str) -> dict:
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'promo-codes/?code={code}'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     data = await response.json()
@@ -1221,10 +1152,10 @@ async def get_promo_code_by_code(code: str) -> dict:
                         return {"error": "Promo code not found"}
                 else:
                     error_text = await response.text()
-                    logging.error(f"[get_promo_code_by_code] API error {response.status}: {error_text}")
+                    logger.error(f"[get_promo_code_by_code] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in get_promo_code_by_code")
+        logger.exception("Error in get_promo_code_by_code")
         return {"error": f"Request failed: {str(e)}"}
 
 async def check_user_promo_code_activation(user_id: int, promo_code_id: int) -> dict:
@@ -1241,11 +1172,11 @@ async def check_user_promo_code_activation(user_id: int, promo_code_id: int) ->
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'promo-code-activations/?user={user_id}&promo_code={promo_code_id}'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     data = await response.json()
-                    logging.info(f"[check_user_promo_code_activation] Raw response: {data}")
+                    logger.debug(f"[check_user_promo_code_activation] Raw response: {data}")
                     
                     # Проверяем, есть ли активация для конкретного пользователя и промокода
                     if isinstance(data, list) and len(data) > 0:
@@ -1264,10 +1195,10 @@ async def check_user_promo_code_activation(user_id: int, promo_code_id: int) ->
                         return {"error": "Activation not found"}
                 else:
                     error_text = await response.text()
-                    logging.error(f"[check_user_promo_code_activation] API error {response.status}: {error_text}")
+                    logger.error(f"[check_user_promo_code_activation] API error {response.status}: {error_text}")
                     return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in check_user_promo_code_activation")
+        logger.exception("Error in check_user_promo_code_activation")
         return {"error": f"Request failed: {str(e)}"}
 
 async def activate_promo_code(user_id: int, promo_code_id: int) -> dict:
@@ -1288,14 +1219,14 @@ async def activate_promo_code(user_id: int, promo_code_id: int) -> dict:
     }
     API_URL = API_BASE + 'promo-code-activations/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
                 result = await response.json()
                 if response.status >= 400:
-                    logging.error(f"[activate_promo_code] API error {response.status}: {result}")
+                    logger.error(f"[activate_promo_code] API error {response.status}: {result}")
                 return result
     except Exception as e:
-        logging.exception("Error in activate_promo_code")
+        logger.exception("Error in activate_promo_code")
         return {"error": f"Request failed: {str(e)}"}
 
 async def create_promo_code(code: str, reward_amount: float, description: str = "", max_uses: int = 1, expires_at: str = None, created_by: int = None) -> dict:
@@ -1330,14 +1261,14 @@ async def create_promo_code(code: str, reward_amount: float, description: str =
     
     API_URL = API_BASE + 'promo-codes/'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.post(API_URL, json=payload, headers=headers) as response:
                 result = await response.json()
                 if response.status >= 400:
-                    logging.error(f"[create_promo_code] API error {response.status}: {result}")
+                    logger.error(f"[create_promo_code] API error {response.status}: {result}")
                 return result
     except Exception as e:
-        logging.exception("Error in create_promo_code")
+        logger.exception("Error in create_promo_code")
         return {"error": f"Request failed: {str(e)}"}
 
 async def get_comments_for_post(post_id: int) -> list:
@@ -1348,7 +1279,7 @@ async def get_comments_for_post(post_id: int) -> list:
     headers = {'Accept': 'application/json'}
     API_URL = API_BASE + f'ask-comments/?post={post_id}&page_size=1000'
     try:
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             async with session.get(API_URL, headers=headers) as response:
                 if response.status == 200:
                     data = await response.json()
@@ -1361,147 +1292,44 @@ async def get_comments_for_post(post_id: int) -> list:
                 else:
                     return []
     except Exception as e:
-        logging.exception("Error in get_comments_for_post")
+        logger.exception("Error in get_comments_for_post")
         return []
 
-async def get_comments_count() -> int:
+async def get_comments_stats(post_ids: list = None) -> dict:
     """
-    Получает общее количество комментариев в системе через API (использует поле count).
+    Получает общее количество комментариев и, если передан post_ids, количество комментариев по каждому посту.
+
+    Возвращает:
+        dict: {'total': int, 'per_post': {'<post_id>': int}} или словарь с ошибкой
     """
     headers = {'Accept': 'application/json'}
-    API_URL = API_BASE + 'ask-comments/?page_size=1'
+    API_URL = API_BASE + 'ask-comments/stats/'
+    params = {'post': ','.join(str(post_id) for post_id in post_ids)} if post_ids else None
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(API_URL, headers=headers) as response:
+        async with api_client.session() as session:
+            async with session.get(API_URL, headers=headers, params=params) as response:
                 if response.status == 200:
-                    data = await response.json()
-                    if isinstance(data, dict) and 'count' in data:
-                        return int(data['count'])
-                    elif isinstance(data, list):
-                        return len(data)
-                    else:
-                        return 0
-                else:
-                    return 0
+                    return await response.json()
+                error_text = await response.text()
+                logger.error(f"[get_comments_stats] API error {response.status}: {error_text}")
+                return {"error": f"API request failed with status {response.status}", "details": error_text}
     except Exception as e:
-        logging.exception("Error in get_comments_count")
-        return 0
+        logger.exception("Error in get_comments_stats")
+        return {"error": f"Request failed: {str(e)}"}
 
-async def get_comments_for_user_posts(user_id: int) -> list:
+async def get_comments_count() -> int:
     """
-    Получает все комментарии ко всем постам пользователя (автора).
-    Возвращает список комментариев.
+    Получает общее количество комментариев в системе через API (агрегат на backend).
     """
-    headers = {'Accept': 'application/json'}
-    # ALL POST TILL 1000
-    API_URL_POSTS = API_BASE + f'ask-posts/?author={user_id}&page_size=1000'
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(API_URL_POSTS, headers=headers) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    posts = data['results'] if isinstance(data, dict) and 'results' in data else data if isinstance(data, list) else []
-                else:
-                    posts = []
-            all_comments = []
-            for post in posts:
-                telegram_id = post.get('telegram_id')
-                if not telegram_id:
-                    continue
-                API_URL_COMMENTS = API_BASE + f'ask-comments/?post={telegram_id}&page_size=1000'
-                async with session.get(API_URL_COMMENTS, headers=headers) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        comments = data['results'] if isinstance(data, dict) and 'results' in data else data if isinstance(data, list) else []
-                        all_comments.extend(comments)
-            return all_comments
-    except Exception as e:
-        logging.exception("Error in get_comments_for_user_posts")
-        return []
+    stats = await get_comments_stats()
+    if 'error' in stats:
+        return 0
+    return int(stats.get('total', 0))
 
 async def rebuild_post_queue(interval_minutes: int = 30):
     """
     Пересобирает очередь постов без дыр: первый пост в очереди получает время last_published_time + interval,
     каждый следующий — +interval к предыдущему. Если время попадает в неактивный период (01:00-10:00 по Москве),
-    оно переносится на 10:00. Обновляет posted_at для каждого поста через PATCH.
-    Сортировка очереди идёт по created_at (или id, если нет created_at), чтобы rejected посты не влияли на индексацию.
+    оно переносится на 10:00. Пересчет выполняется на backend в одной транзакции.
     """
-    headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-    # Получаем все неопубликованные и неотклонённые посты, сортируем по created_at (или id)
-    API_URL = API_BASE + 'ask-posts/?is_posted=false&is_rejected=false&ordering=created_at'
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(API_URL, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if isinstance(data, dict) and 'results' in data:
-                        queued_posts = data['results']
-                    elif isinstance(data, list):
-                        queued_posts = data
-                    else:
-                        queued_posts = []
-                    if not queued_posts:
-                        logging.info("[rebuild_post_queue] No posts in queue to rebuild")
-                        return {'status': 'success', 'message': 'No posts in queue'}
-                    # Сортируем по created_at, если есть, иначе по id
-                    queued_posts.sort(key=lambda p: (p.get('created_at') or '', p.get('id', 0)))
-                    # Получаем время последнего опубликованного поста
-                    last_published_data = await get_last_published_post_time()
-                    if 'error' in last_published_data:
-                        logging.error(f"[rebuild_post_queue] Error getting last published post: {last_published_data['error']}")
-                        return {'error': 'Failed to get last published post'}
-                    last_published_time_str = last_published_data.get('channel_posted_at')
-                    if not last_published_time_str:
-                        logging.error("[rebuild_post_queue] No channel_posted_at in last published post")
-                        return {'error': 'No channel_posted_at in last published post'}
-                    # Парсим время последней публикации
-                    try:
-                        if '+' in last_published_time_str or 'Z' in last_published_time_str:
-                            last_published_dt = datetime.strptime(last_published_time_str.replace('Z', '+0000'), "%Y-%m-%dT%H:%M:%S%z")
-                        else:
-                            last_published_dt = datetime.strptime(last_published_time_str, "%Y-%m-%d %H:%M:%S")
-                    except ValueError as e:
-                        logging.error(f"[rebuild_post_queue] Error parsing last published time: {e}")
-                        return {'error': f'Error parsing last published time: {e}'}
-                    # Пересчитываем время для каждого поста в очереди
-                    updated_count = 0
-                    moscow_tz = pytz.timezone('Europe/Moscow')
-                    for i, post in enumerate(queued_posts):
-                        post_id = post.get('id')
-                        if not post_id:
-                            continue
-                        # Новое время: last_published_dt + (i+1)*interval
-                        new_time = last_published_dt + timedelta(minutes=interval_minutes * (i + 1))
-                        # Проверяем, не попадает ли время в неактивный период (01:00-10:00)
-                        new_time_moscow = new_time.astimezone(moscow_tz)
-                        current_hour = new_time_moscow.hour
-                        if 1 <= current_hour < 10:
-                            # Устанавливаем время на 10:00 того же дня
-                            new_time_moscow = new_time_moscow.replace(hour=10, minute=0, second=0, microsecond=0)
-                            new_time = new_time_moscow.astimezone(timezone.utc)
-                            logging.info(f"[rebuild_post_queue] Post {post_id} moved from {current_hour}:00 to 10:00 due to inactive hours")
-                        # Форматируем время для API
-                        new_post_time = format_posted_at(new_time)
-                        # Обновляем время поста
-                        update_url = API_BASE + f'ask-posts/{post_id}/'
-                        update_data = {'posted_at': new_post_time}
-                        try:
-                            async with session.patch(update_url, headers=headers, json=update_data) as update_response:
-                                if update_response.status == 200:
-                                    updated_count += 1
-                                    logging.info(f"[rebuild_post_queue] Updated post {post_id} to {new_post_time}")
-                                else:
-                                    logging.error(f"[rebuild_post_queue] Failed to update post {post_id}: {update_response.status}")
-                        except Exception as e:
-                            logging.error(f"[rebuild_post_queue] Exception updating post {post_id}: {e}")
-                    logging.info(f"[rebuild_post_queue] Successfully updated {updated_count} posts")
-                    return {
-                        'status': 'success',
-                        'updated_count': updated_count,
-                        'message': f'Updated {updated_count} posts in queue'
-                    }
-                else:
-                    return {'error': f'API request failed with status {response.status}'}
-    except Exception as e:
-        logging.error(f"[rebuild_post_queue] Exception: {e}")
-        return {'error': str(e)}
+    return await reschedule_queue(interval_minutes)
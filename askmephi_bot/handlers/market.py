@@ -10,7 +10,7 @@ NICKS_PER_PAGE = 5
 # TODO: заменить на реальный API покупки ника
 async def try_purchase_pseudo(user_id: int, pseudo_id: int) -> dict:
     # Заглушка: всегда успех
-    print(f"purchase_pseudo_name: user_id={user_id} ({type(user_id)}), pseudo_id={pseudo_id} ({type(pseudo_id)})")
+    logging.debug(f"[try_purchase_pseudo] user_id={user_id}, pseudo_id={pseudo_id}")
     payload = {"user": str(user_id), "pseudo_name": str(pseudo_id)}
     return {"success": True, "pseudo_id": pseudo_id}
 
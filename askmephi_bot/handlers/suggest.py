@@ -8,14 +8,18 @@ import os
 import pytz
 from datetime import time
 from db.wapi import get_last_post, try_create_post, mark_post_as_posted, mark_post_as_rejected_by_telegram_id, get_post_by_telegram_id, process_post_payment, get_user_info, get_active_posts_count, publish_post_now, get_last_published_post_time, recalculate_queue_after_immediate_publication, try_create_user, get_post_info
-from SugQueue import publish_to_channel, update_post_channel_info, send_publication_notification
+from SugQueue import publish_to_channel, update_post_channel_info, send_publication_notification, post_scheduler
+from db.api_client import api_client
+import aiohttp
 import logging
 import re
 from aiogram.fsm.state import State, StatesGroup
+from services.sender import sender, PRIORITY_ADMIN, PRIORITY_NOTIFICATION
 
 ACTIVE_START_HOUR = 10  # 10:00
 ACTIVE_END_HOUR = 1     # 01:00 следующего дня
 POST_INTERVAL_MINUTES = 30
+SIMILAR_QUESTIONS_LIMIT = 3  # Сколько похожих вопросов показывать перед отправкой в предложку
 BOT_NAME = os.getenv("ORACLE_BOT_NAME")
 
 async def send_submission_notification(bot, user_id: int, post_content: str):
@@ -32,7 +36,8 @@ async def send_submission_notification(bot, user_id: int, post_content: str):
         notification_text += f"Пока ожидаете: изучите /help и /market"
         
         # Отправляем уведомление
-        await bot.send_message(
+        await sender.send(
+            bot.send_message, PRIORITY_NOTIFICATION,
             chat_id=user_id,
             text=notification_text,
             parse_mode="HTML"
@@ -62,7 +67,8 @@ async def send_rejection_notification(bot, user_id: int, post_content: str):
         notification_text += f"<b>Время отклонения:</b> {datetime.now(timezone(timedelta(hours=3))).strftime('%d.%m.%Y в %H:%M')}"
         
         # Отправляем уведомление
-        await bot.send_message(
+        await sender.send(
+            bot.send_message, PRIORITY_NOTIFICATION,
             chat_id=user_id,
             text=notification_text,
             parse_mode="HTML"
@@ -105,7 +111,8 @@ async def send_approval_notification(bot, user_id: int, post_content: str, sched
         notification_text += f"<b>Следующий шаг:</b> Ожидайте уведомления о публикации"
         
         # Отправляем уведомление
-        await bot.send_message(
+        await sender.send(
+            bot.send_message, PRIORITY_NOTIFICATION,
             chat_id=user_id,
             text=notification_text,
             parse_mode="HTML"
@@ -139,7 +146,8 @@ async def send_publication_and_payment_notification(bot, user_id: int, post_cont
         notification_text += f"Используйте токены в /market для покупки псевдонимов"
         
         # Отправляем уведомление
-        await bot.send_message(
+        await sender.send(
+            bot.send_message, PRIORITY_NOTIFICATION,
             chat_id=user_id,
             text=notification_text,
             parse_mode="HTML",
@@ -153,7 +161,7 @@ async def send_publication_and_payment_notification(bot, user_id: int, post_cont
 
 def save_post_to_db(user_id: int, text: str):
     # Заглушка под сохранение в БД
-    print(f"[DB] Saved post from {user_id}: {text[:30]}...")
+    logging.debug(f"[save_post_to_db] Saved post from {user_id}: {text[:30]}...")
 
 
 def get_content_type_and_text(message: types.Message) -> tuple[str, str]:
@@ -216,34 +224,33 @@ def register_suggest_handler(dp: Dispatcher):
             content_type, post_content = get_content_type_and_text(message)
             user_id = message.from_user.id
 
-            found_similar = False
-            similar_link = None
-            similar_content = None
+            similar = []
             try:
-                import aiohttp
-                async with aiohttp.ClientSession() as session:
+                async with api_client.session() as session:
                     async with session.get(
                         "http://askmephi_search:8001/search/",
-                        params={"question": post_content},
+                        params={"question": post_content, "k": SIMILAR_QUESTIONS_LIMIT},
                         timeout=aiohttp.ClientTimeout(total=5)
                     ) as resp:
                         data = await resp.json()
                 if data.get("found"):
-                    found_similar = True
-                    similar_link = data["link"]
-                    similar_content = data.get("content")
+                    similar = data.get("matches") or [{"link": data["link"], "content": data.get("content")}]
             except Exception as e:
                 logging.warning(f"[suggest_handler] tf-idf search error: {e}")
             
-            if found_similar:
-                preview = ""
-                if isinstance(similar_content, str) and similar_content.strip():
-                    words = similar_content.split()
-                    preview = ' '.join(words[:15]) + ("..." if len(words) > 1 else "")
+            if similar:
+                similar_text = ""
+                for match in similar:
+                    similar_content = match.get("content")
+                    if isinstance(similar_content, str) and similar_content.strip():
+                        words = similar_content.split()
+                        preview = ' '.join(words[:15]) + ("..." if len(words) > 15 else "")
+                        similar_text += f"<blockquote>{preview}</blockquote>\n"
+                    similar_text += f"<a href='{match['link']}'>Открыть в канале</a>\n\n"
                 text = (
-                        "<b>Похожий анонимный вопрос уже был опубликован!</b>\n\n"
-                    + (f"<blockquote>{preview}</blockquote>\n" if preview else "")
-                    + f"<a href='{similar_link}'>Открыть в канале</a>\n\n"
+                        ("<b>Похожий анонимный вопрос уже был опубликован!</b>\n\n" if len(similar) == 1
+                         else "<b>Похожие анонимные вопросы уже были опубликованы!</b>\n\n")
+                    + similar_text
                     + "<b>Ваш вопрос:</b>\n"
                     + f"<blockquote>{post_content}</blockquote>\n\n"
                     + "Все равно отправить этот вопрос в предложку?"
@@ -297,7 +304,8 @@ def register_suggest_handler(dp: Dispatcher):
         if not hasattr(original_msg, 'message_id') or original_msg.message_id is None:
             await callback.answer("Ошибка: не удалось получить message_id пользователя")
             return
-        msg = await callback.bot.copy_message(
+        msg = await sender.send(
+            callback.bot.copy_message, PRIORITY_ADMIN,
             chat_id=offers_chat_id,
             from_chat_id=callback.message.chat.id if hasattr(callback.message, 'chat') and callback.message.chat else offers_chat_id,
             message_id=original_msg.message_id
@@ -330,7 +338,8 @@ def register_suggest_handler(dp: Dispatcher):
         if not hasattr(msg_obj, 'bot') or msg_obj.bot is None:
             logging.error('message.bot is None')
             return
-        await msg_obj.bot.send_message(
+        await sender.send(
+            msg_obj.bot.send_message, PRIORITY_ADMIN,
             chat_id=offers_chat_id,
             text=admin_message,
             reply_to_message_id=msg.message_id if msg and hasattr(msg, 'message_id') else None,
@@ -396,6 +405,9 @@ def register_suggest_handler(dp: Dispatcher):
         # Отклоняем пост
         result = await mark_post_as_rejected_by_telegram_id(telegram_id)
         logging.info(f"[reject_callback] Post removed from queue: {result}")
+        if 'error' not in result:
+            post_scheduler.cancel_by_telegram_id(telegram_id)
+            post_scheduler.request_resync()
         # Формируем сообщение об отклонении для админ чата
         admin_message_text = f"❌ <b>Вопрос отклонен!</b>\n\n"
         admin_message_text += f"<b>Автор:</b> <code>{user_id}</code> @{author_username}\n"
@@ -548,6 +560,7 @@ def register_suggest_handler(dp: Dispatcher):
                 return
             await update_post_channel_info(post_info['id'], channel_message_id)
             await recalculate_queue_after_immediate_publication()
+            post_scheduler.request_resync()
             # Уведомление пользователю
             await send_publication_and_payment_notification(callback.bot, user_id, post_info.get('content', ''), tokens_added, publish_result.get('author_balance', 'N/A'), channel_message_id)
             # Получаем подробную инфу об авторе
@@ -577,6 +590,7 @@ def register_suggest_handler(dp: Dispatcher):
             # Время публикации ещё не пришло — ставим в очередь
             scheduled_time_str = scheduled_time.strftime("%d.%m.%Y в %H:%M")
             queue_position = active_posts_count + 1 if active_posts_count > 0 else 1
+            post_scheduler.schedule(post_info)
             await send_approval_notification(callback.bot, user_id, post_content, scheduled_time, queue_position)
             # Получаем подробную инфу об авторе
             author_info = await get_user_info(user_id)
@@ -630,6 +644,8 @@ def register_suggest_handler(dp: Dispatcher):
             logging.info(f"[publish_now_callback] Processing immediate publication for user_id={user_id}, telegram_id={telegram_id}")
             # Проверяем, что пост еще не опубликован
             # Немедленно публикуем пост и обрабатываем оплату
+            # Убираем пост из планировщика, чтобы он не опубликовал его повторно
+            post_scheduler.cancel(post_id)
             publish_result = await publish_post_now(post_id)
             if 'error' in publish_result:
                 logging.error(f"[publish_now_callback] Publication failed: {publish_result['error']}")
@@ -648,6 +664,7 @@ def register_suggest_handler(dp: Dispatcher):
             await update_post_channel_info(post_id, channel_message_id)
             # Пересчитываем очередь после моментальной публикации
             queue_recalc_result = await recalculate_queue_after_immediate_publication()
+            post_scheduler.request_resync()
             post_info = await get_post_by_telegram_id(telegram_id)
             if 'error' in queue_recalc_result:
                 logging.warning(f"[publish_now_callback] Queue recalculation failed: {queue_recalc_result['error']}")
@@ -842,7 +859,8 @@ async def handle_suggest_message(message: Message):
             ]
         ]
     )
-    await message.bot.send_message(
+    await sender.send(
+        message.bot.send_message, PRIORITY_ADMIN,
         chat_id=ADMIN_CHAT_ID,
         text=admin_text,
         reply_markup=keyboard,
@@ -1,10 +1,20 @@
 import logging
 import os
 import asyncio
+import multiprocessing
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from middlewares.logging import LoggingMiddleware
-from SugQueue import post_checker
+from middlewares.concurrency import ConcurrencyMiddleware
+from SugQueue import post_checker, post_scheduler
+from db.api_client import api_client
+from db.fsm_storage import create_fsm_storage, create_events_isolation
+from services.sender import sender
+from services.broadcast import broadcast
+from services.events import events
+from services.logs import setup_logging
+from db.wapi import known_users, pseudo_catalogue, owned_pseudos
 from middlewares.ensure_user import EnsureUserMiddleware
 
 # Импортируем хендлеры для регистрации
@@ -18,6 +28,26 @@ from handlers.help import register_help_handlers
 from handlers.promo import register_promo_handlers
 
 
+# Режим получения апдейтов: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Апдейты, накопившиеся пока бот был остановлен: по умолчанию отбрасываются, DROP_PENDING_UPDATES=false — обработать
+DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', 'true').lower() in ('1', 'true', 'yes')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # публичный https-адрес, например https://example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook/askmephi')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8081))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 1))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+# Канал Redis для событий между воркерами вебхука (очередь публикаций, кэш пользователей)
+EVENTS_CHANNEL = os.getenv('EVENTS_CHANNEL', 'askmephi:events')
+# Период записи метрик очереди апдейтов в лог, секунды (0 — не писать)
+METRICS_LOG_INTERVAL = int(os.getenv('METRICS_LOG_INTERVAL', 300))
+
+# Общий лимит параллельных апдейтов (свой экземпляр в каждом процессе-воркере)
+concurrency = ConcurrencyMiddleware()
+
+
 def register_handlers(dp: Dispatcher):
     # Регистрация всех хендлеров
     pass  # Хендлеры регистрируются через декораторы
@@ -28,30 +58,77 @@ async def queue_worker(bot: Bot):
     await post_checker(bot)
 
 
-async def on_startup(bot):
-    """Действия при запуске бота"""
+async def log_metrics():
+    """Периодически пишет в лог глубину очереди апдейтов и число обрабатываемых"""
+    while True:
+        await asyncio.sleep(METRICS_LOG_INTERVAL)
+        logging.info(f"[metrics] updates: {concurrency.stats()}")
+        logging.info(f"[metrics] sender: {sender.stats()}")
+
+
+async def on_startup(bot, dispatcher: Dispatcher, worker_index: int = 0):
+    """
+    Действия при запуске бота.
+    Вебхук и очередь публикаций настраивает только воркер 0 — остальные воркеры лишь принимают апдейты.
+    """
+    await api_client.start()
+    if METRICS_LOG_INTERVAL > 0:
+        asyncio.create_task(log_metrics())
+    if BOT_MODE == 'webhook' and WEBHOOK_WORKERS > 1:
+        # Планировщик работает только в воркере 0 (approve/reject/publish_now из других воркеров приходят
+        # через Redis), кэш пользователей — в каждом воркере
+        events.use_redis(os.getenv('REDIS_URL'), EVENTS_CHANNEL)
+        if worker_index == 0:
+            post_scheduler.subscribe_events()
+        asyncio.create_task(events.listen())
+    if worker_index != 0:
+        return
+    if BOT_MODE == 'webhook':
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            drop_pending_updates=DROP_PENDING_UPDATES,
+        )
+        logging.info(f"[on_startup] Webhook set: {WEBHOOK_PATH}, workers={WEBHOOK_WORKERS}, drop_pending_updates={DROP_PENDING_UPDATES}")
+    else:
+        # Снимает вебхук, если бот раньше работал в режиме webhook, иначе polling не получит апдейтов
+        await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+        logging.info(f"[on_startup] Polling, drop_pending_updates={DROP_PENDING_UPDATES}")
     logging.info("Starting queue worker...")
     asyncio.create_task(queue_worker(bot))
+    # Рассылка, прерванная перезапуском, продолжается с последней сохраненной страницы
+    broadcast.resume(bot)
 
 
+async def on_shutdown(bot, dispatcher: Dispatcher):
+    """Действия при остановке бота"""
+    logging.info(f"[on_shutdown] updates stats: {concurrency.stats()}")
+    logging.info(f"[on_shutdown] sender stats: {sender.stats()}")
+    logging.info(f"[on_shutdown] known_users cache stats: {known_users.stats()}")
+    logging.info(f"[on_shutdown] pseudo_catalogue cache stats: {pseudo_catalogue.stats()}")
+    logging.info(f"[on_shutdown] owned_pseudos cache stats: {owned_pseudos.stats()}")
+    await broadcast.close()
+    await sender.close()
+    await events.close()
+    await api_client.close()
+    # FSM-хранилище закрывает сам Dispatcher (fsm.close зарегистрирован на shutdown)
 
 
-def main():
-  
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler('app.log', mode='a')
-        ]
-    )
+
+
+def create_bot() -> tuple[Bot, Dispatcher]:
+    """Создает бота и диспетчер с middleware и хендлерами (в каждом процессе-воркере — свои)"""
     BOT_TOKEN = os.getenv('ORACLE_BOT_TOKEN')
     if not BOT_TOKEN:
         raise ValueError("ORACLE_BOT_TOKEN environment variable is not set")
     bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    storage = create_fsm_storage(prefix='fsm_askmephi')
+    # Апдейты одного чата обрабатываются по очереди: блокировка берется до чтения состояния FSM
+    dp = Dispatcher(storage=storage, events_isolation=create_events_isolation(storage))
+    # Первой: общий лимит охватывает остальные middleware (в т.ч. запросы EnsureUserMiddleware к API)
+    dp.update.middleware(concurrency)
     dp.update.middleware(EnsureUserMiddleware())
     dp.message.middleware(EnsureUserMiddleware())
     dp.callback_query.middleware(EnsureUserMiddleware())
@@ -68,10 +145,56 @@ def main():
     register_account_handlers(dp)
     register_suggest_handler(dp)
     
-    
-    print("Bot started!")
     dp.startup.register(on_startup)
-    dp.run_polling(bot, skip_updates=True)
+    dp.shutdown.register(on_shutdown)
+    return bot, dp
+
+
+def run_webhook_worker(worker_index: int):
+    """
+    Один процесс-воркер вебхука: aiohttp-сервер на общем порту (SO_REUSEPORT — ядро распределяет соединения
+    между воркерами). Запросы без правильного X-Telegram-Bot-Api-Secret-Token отклоняются.
+    """
+    if worker_index:
+        setup_logging(worker_index)
+    bot, dp = create_bot()
+    dp['worker_index'] = worker_index
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    web.run_app(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT, reuse_port=True, print=None)
+
+
+def run_webhook():
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL environment variable is not set")
+    if not WEBHOOK_SECRET:
+        logging.warning("[run_webhook] WEBHOOK_SECRET is not set, webhook requests are not verified")
+    if WEBHOOK_WORKERS > 1 and not os.getenv('REDIS_URL'):
+        # Без Redis у воркеров нет общего FSM и очередь публикаций не узнает об approve/reject из других воркеров
+        raise ValueError("WEBHOOK_WORKERS > 1 requires REDIS_URL")
+    workers = [
+        multiprocessing.Process(target=run_webhook_worker, args=(i,), daemon=True, name=f'webhook-worker-{i}')
+        for i in range(1, WEBHOOK_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        run_webhook_worker(0)
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+def main():
+    setup_logging()
+    logging.info(f"[main] Bot started in {BOT_MODE} mode")
+    if BOT_MODE == 'webhook':
+        run_webhook()
+    else:
+        bot, dp = create_bot()
+        dp.run_polling(bot)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
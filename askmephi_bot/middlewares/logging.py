@@ -1,6 +1,20 @@
 import logging
- 
+
+logger = logging.getLogger(__name__)
+
+
 class LoggingMiddleware:
+    """
+    Пишет краткое описание апдейта (тип, чат, пользователь) на уровне DEBUG — запись попадает в лог
+    выборочно (LOG_DEBUG_SAMPLE_RATE). Полный repr апдейта не строится: это дорого на каждом апдейте.
+    """
+
     async def __call__(self, handler, event, data):
-        logging.info(f"Update: {event}")
-        return await handler(event, data)
\ No newline at end of file
+        if logger.isEnabledFor(logging.DEBUG):
+            chat = data.get('event_chat')
+            user = data.get('event_from_user')
+            logger.debug(
+                f"Update {event.update_id}: {event.event_type}",
+                extra={'chat_id': chat.id if chat else None, 'user_id': user.id if user else None},
+            )
+        return await handler(event, data)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from db.wapi import get_broadcast_user_ids, set_bot_blocked
+from services.sender import sender, PRIORITY_ADMIN, PRIORITY_BULK
+
+# Файл с прогрессом рассылки: после перезапуска бот продолжает с последнего обработанного пользователя
+BROADCAST_STATE_PATH = os.getenv('BROADCAST_STATE_PATH', 'broadcast.json')
+# Пользователей на страницу: страница отправляется целиком, затем прогресс сохраняется
+BROADCAST_PAGE_SIZE = int(os.getenv('BROADCAST_PAGE_SIZE', 500))
+# Период обновления отчета в чате администратора, секунды
+BROADCAST_REPORT_INTERVAL = int(os.getenv('BROADCAST_REPORT_INTERVAL', 60))
+# Пауза перед повторным запросом страницы, если backend недоступен
+BROADCAST_API_RETRY_DELAY = 30
+
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_CANCELLED = 'cancelled'
+
+
+class Broadcast:
+    """
+    Рассылка сообщения всем пользователям бота.
+
+    Пользователи читаются из API страницами по id (в памяти одна страница), сообщение копируется
+    каждому через общий sender с низшим приоритетом, поэтому публикации и ответы пользователям не ждут рассылку.
+    После каждой страницы прогресс пишется в файл: при перезапуске рассылка продолжается со следующей страницы
+    (сообщение повторно получат не больше page_size пользователей прерванной страницы).
+    Заблокировавшие бота и удаленные аккаунты отмечаются в API и в следующих рассылках пропускаются.
+    Файл состояния общий для воркеров вебхука, поэтому /broadcast_cancel работает из любого воркера.
+    """
+
+    def __init__(self, path: str = BROADCAST_STATE_PATH, page_size: int = BROADCAST_PAGE_SIZE,
+                 report_interval: int = BROADCAST_REPORT_INTERVAL):
+        self.path = path
+        self.page_size = page_size
+        self.report_interval = report_interval
+        self._task = None
+
+    def load(self):
+        """Состояние последней рассылки или None"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.error(f"[Broadcast] Failed to read {self.path}: {e}")
+            return None
+
+    def _save(self, state: dict):
+        # Запись через временный файл: при падении посреди записи остается предыдущее состояние
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def is_running(self) -> bool:
+        state = self.load()
+        return bool(state) and state.get('status') == STATUS_RUNNING
+
+    def start(self, bot, from_chat_id: int, message_id: int, report_chat_id: int):
+        """Запускает рассылку копии сообщения; None, если другая рассылка еще идет"""
+        if self.is_running():
+            return None
+        state = {
+            'status': STATUS_RUNNING,
+            'from_chat_id': from_chat_id,
+            'message_id': message_id,
+            'report_chat_id': report_chat_id,
+            'report_message_id': None,
+            'last_id': 0,
+            'sent': 0,
+            'blocked': 0,
+            'failed': 0,
+            'elapsed': 0.0,
+            'started_at': time.time(),
+            'finished_at': None,
+        }
+        self._save(state)
+        self._task = asyncio.create_task(self._run(bot, state))
+        return state
+
+    def resume(self, bot) -> bool:
+        """Продолжает прерванную перезапуском рассылку (вызывается при старте бота)"""
+        state = self.load()
+        if not state or state.get('status') != STATUS_RUNNING or self._task is not None:
+            return False
+        logging.info(f"[Broadcast] Resuming after user {state['last_id']}: sent={state['sent']}, blocked={state['blocked']}, failed={state['failed']}")
+        self._task = asyncio.create_task(self._run(bot, state))
+        return True
+
+    def cancel(self) -> bool:
+        """Останавливает рассылку после текущей страницы"""
+        state = self.load()
+        if not state or state.get('status') != STATUS_RUNNING:
+            return False
+        state['status'] = STATUS_CANCELLED
+        self._save(state)
+        return True
+
+    async def _deliver(self, bot, state: dict, user_id: int):
+        try:
+            await sender.send(
+                bot.copy_message, PRIORITY_BULK,
+                chat_id=user_id, from_chat_id=state['from_chat_id'], message_id=state['message_id'],
+            )
+            state['sent'] += 1
+            return
+        except TelegramForbiddenError as e:
+            # Бот заблокирован пользователем или аккаунт удален
+            reason = str(e)
+        except TelegramBadRequest as e:
+            if 'chat not found' not in str(e).lower():
+                state['failed'] += 1
+                logging.warning(f"[Broadcast] Failed to send to {user_id}: {e}")
+                return
+            reason = str(e)
+        except Exception as e:
+            state['failed'] += 1
+            logging.warning(f"[Broadcast] Failed to send to {user_id}: {type(e).__name__}: {e}")
+            return
+        state['blocked'] += 1
+        logging.info(f"[Broadcast] User {user_id} is unreachable ({reason}), flagging")
+        await set_bot_blocked(user_id, True)
+
+    def _checkpoint(self, state: dict):
+        # Сохраняет состояние, не затирая отмену, пришедшую из другого воркера
+        saved = self.load()
+        if saved and saved.get('status') == STATUS_CANCELLED and state['status'] == STATUS_RUNNING:
+            state['status'] = STATUS_CANCELLED
+        self._save(state)
+
+    async def _run(self, bot, state: dict):
+        resumed_at = time.monotonic()
+        elapsed_before = state['elapsed']
+        last_report = resumed_at
+        try:
+            while state['status'] == STATUS_RUNNING:
+                user_ids = await get_broadcast_user_ids(state['last_id'], self.page_size)
+                if user_ids is None:
+                    logging.warning(f"[Broadcast] API unavailable, retry in {BROADCAST_API_RETRY_DELAY}s")
+                    await asyncio.sleep(BROADCAST_API_RETRY_DELAY)
+                    self._checkpoint(state)
+                    continue
+                if not user_ids:
+                    state['status'] = STATUS_DONE
+                    break
+                await asyncio.gather(*(self._deliver(bot, state, user_id) for user_id in user_ids))
+                state['last_id'] = user_ids[-1]
+                state['elapsed'] = elapsed_before + time.monotonic() - resumed_at
+                self._checkpoint(state)
+                if time.monotonic() - last_report >= self.report_interval:
+                    last_report = time.monotonic()
+                    await self._report(bot, state)
+        except asyncio.CancelledError:
+            # Остановка бота: состояние running остается в файле, рассылка продолжится при запуске
+            logging.info(f"[Broadcast] Interrupted after user {state['last_id']}")
+            raise
+        except Exception:
+            logging.exception("[Broadcast] Broadcast failed")
+            state['status'] = STATUS_CANCELLED
+        finally:
+            self._task = None
+        state['elapsed'] = elapsed_before + time.monotonic() - resumed_at
+        state['finished_at'] = time.time()
+        self._save(state)
+        logging.info(f"[Broadcast] Finished: {self.format_report(state)}")
+        await self._report(bot, state)
+
+    @staticmethod
+    def format_report(state: dict) -> str:
+        processed = state['sent'] + state['blocked'] + state['failed']
+        rate = processed / state['elapsed'] if state['elapsed'] else 0.0
+        status = {
+            STATUS_RUNNING: 'идет', STATUS_DONE: 'завершена', STATUS_CANCELLED: 'остановлена',
+        }.get(state['status'], state['status'])
+        return (
+            f"Рассылка {status}\n"
+            f"Обработано: {processed} (последний id {state['last_id']})\n"
+            f"Доставлено: {state['sent']}\n"
+            f"Заблокировали бота / удалены: {state['blocked']}\n"
+            f"Ошибок: {state['failed']}\n"
+            f"Скорость: {rate:.1f} сообщ./с, время: {int(state['elapsed'])} с"
+        )
+
+    async def _report(self, bot, state: dict):
+        """Обновляет сообщение с отчетом в чате администратора (при первой отправке — создает)"""
+        text = self.format_report(state)
+        if state.get('report_message_id'):
+            try:
+                await sender.send(
+                    bot.edit_message_text, PRIORITY_ADMIN,
+                    chat_id=state['report_chat_id'], message_id=state['report_message_id'], text=text,
+                )
+                return
+            except TelegramBadRequest as e:
+                # Текст не изменился; иначе сообщение удалено — отправим новое
+                if 'not modified' in str(e):
+                    return
+                logging.warning(f"[Broadcast] Failed to edit report: {e}")
+            except Exception as e:
+                logging.warning(f"[Broadcast] Failed to edit report: {e}")
+                return
+        try:
+            msg = await sender.send(bot.send_message, PRIORITY_ADMIN, chat_id=state['report_chat_id'], text=text)
+            state['report_message_id'] = msg.message_id
+            # Пока отправлялся отчет, рассылку могли отменить из другого воркера
+            self._checkpoint(state)
+        except Exception as e:
+            logging.warning(f"[Broadcast] Failed to send report: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+broadcast = Broadcast()
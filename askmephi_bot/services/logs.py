@@ -0,0 +1,139 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime, timezone
+
+# Уровень корневого логгера и уровни отдельных модулей: LOG_LEVELS="aiogram.event=WARNING,db.wapi=DEBUG"
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', 'aiogram.event=WARNING')
+# json — по записи JSON на строку (для сборщиков логов), text — читаемый формат для локальной отладки
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_FILE = os.getenv('LOG_FILE', 'app.log')  # пустая строка — только stderr
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+# Доля DEBUG-записей, попадающих в лог (апдейты, запросы к API); записи INFO и выше пишутся всегда
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.1))
+
+# --- Общий код: одинаковый в backend/thewhisper/logs.py, whisper_bot/services/logs.py и askmephi_bot/services/logs.py
+# (сервисы собираются в отдельные образы и не импортируют код друг друга); меняется во всех трех файлах сразу ---
+
+# Стандартные атрибуты LogRecord; все остальные пришли через extra= и попадают в JSON как поля
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON: время, уровень, логгер, сообщение, поля из extra= и traceback"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.processName != 'MainProcess':
+            entry['process'] = record.processName
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает все записи INFO и выше и долю rate записей DEBUG"""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладет запись в очередь, подставив аргументы в сообщение (они могут измениться до записи).
+    В отличие от стандартного prepare, traceback не форматируется здесь, а остается потоку слушателя.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# --- Конец общего кода ---
+
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for item in spec.split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_listener = None
+
+
+def setup_logging(worker_index: int = 0):
+    """
+    Настраивает логирование процесса: обработчики вызываются только из потока QueueListener,
+    поэтому запись в файл и форматирование не блокируют event loop — в обработчике апдейта остается
+    только постановка записи в очередь. Файл ротируется по размеру (LOG_MAX_BYTES, LOG_BACKUP_COUNT);
+    у воркеров вебхука свои файлы (app.worker-N.log), чтобы процессы не ротировали один файл.
+    Повторный вызов (в дочернем процессе после fork) заменяет обработчики и запускает свой поток.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    formatter = JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        path = LOG_FILE
+        if worker_index:
+            root, ext = os.path.splitext(LOG_FILE)
+            path = f"{root}.worker-{worker_index}{ext}"
+        handlers.append(logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8',
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
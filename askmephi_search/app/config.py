@@ -1,4 +1,17 @@
 import os
-API_URL = "http://backend:8000/api/ask-posts/?is_posted=true&ordering=-channel_posted_at"
-CHANNEL_ID = os.getenv("ORACLE_CHANNEL_ID").replace('-100','')  
-UPDATE_INTERVAL_MINUTES = 60  # Период обновления индекса (в минутах) 
\ No newline at end of file
+API_URL = "http://backend:8000/api/ask-posts/?is_posted=true&ordering=channel_posted_at"
+CHANNEL_ID = os.getenv("ORACLE_CHANNEL_ID").replace('-100','')
+UPDATE_INTERVAL_MINUTES = int(os.getenv("SEARCH_FULL_REBUILD_MINUTES", 24 * 60))  # Период полной пересборки индекса (в минутах)
+INCREMENTAL_UPDATE_SECONDS = int(os.getenv("SEARCH_INCREMENTAL_UPDATE_SECONDS", 10))  # Как часто подтягивать новые вопросы
+IDF_REFRESH_MINUTES = int(os.getenv("SEARCH_IDF_REFRESH_MINUTES", 60))  # Как часто пересчитывать IDF по накопленным df
+TAIL_MERGE_ROWS = int(os.getenv("SEARCH_TAIL_MERGE_ROWS", 2000))  # Размер хвоста новых вопросов, после которого он вливается в основной индекс
+HASH_N_FEATURES = int(os.getenv("SEARCH_HASH_N_FEATURES", 2 ** 20))  # Размер пространства признаков HashingVectorizer
+INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", "/data/search_index")  # Каталог версий снимка индекса на диске
+TEXT_PIPELINE = os.getenv("SEARCH_TEXT_PIPELINE", "lower,yo,urls,stopwords,stem")  # Шаги нормализации текста (см. app/text.py)
+ANALYZER = os.getenv("SEARCH_ANALYZER", "word")  # word — слова, char_wb — символьные n-граммы внутри слов
+CHAR_NGRAM_RANGE = tuple(int(n) for n in os.getenv("SEARCH_CHAR_NGRAM_RANGE", "3,5").split(','))  # Длины n-грамм для char_wb
+LOADER_PAGE_SIZE = int(os.getenv("SEARCH_LOADER_PAGE_SIZE", 1000))  # Размер страницы API при загрузке вопросов
+LOADER_RETRIES = int(os.getenv("SEARCH_LOADER_RETRIES", 3))  # Повторы запроса страницы при ошибке
+LOADER_RETRY_BACKOFF = float(os.getenv("SEARCH_LOADER_RETRY_BACKOFF", 1.0))  # Начальная пауза перед повтором (удваивается)
+LOADER_TIMEOUT = float(os.getenv("SEARCH_LOADER_TIMEOUT", 30))  # Таймаут запроса страницы (в секундах)
+LOADER_CHECKPOINT_MAX_AGE_MINUTES = int(os.getenv("SEARCH_LOADER_CHECKPOINT_MAX_AGE_MINUTES", 60))  # Сколько хранить прогресс прерванной полной загрузки
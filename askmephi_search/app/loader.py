@@ -1,37 +1,83 @@
-import requests
-from app.config import API_URL
+import asyncio
+import logging
 
-# Глобальный кэш вопросов
-QUESTIONS = []
+import aiohttp
 
-def fetch_questions():
-    """Загружает все опубликованные вопросы из API."""
+from app.config import API_URL, LOADER_PAGE_SIZE, LOADER_RETRIES, LOADER_RETRY_BACKOFF, LOADER_TIMEOUT
+
+
+class PartialFetchError(Exception):
+    """
+    Загрузка прервана. В questions — непрерывный префикс (все страницы до сбойной),
+    то есть все вопросы, опубликованные до channel_posted_at последнего из них.
+    """
+
+    def __init__(self, message, questions):
+        super().__init__(message)
+        self.questions = questions
+
+
+def _parse_questions(results):
+    questions = []
+    for post in results:
+        if post.get('content') and post.get('channel_message_id'):
+            questions.append({
+                'id': post['id'],
+                'content': post['content'],
+                'tg_id': post['channel_message_id'],
+                'channel_posted_at': post.get('channel_posted_at'),
+            })
+    return questions
+
+
+async def _fetch_page(session, url, params):
+    """Загружает одну страницу с повторами и экспоненциальной паузой; после последней попытки пробрасывает ошибку"""
+    for attempt in range(LOADER_RETRIES + 1):
+        try:
+            async with session.get(url, params=params) as resp:
+                resp.raise_for_status()
+                return await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == LOADER_RETRIES:
+                raise
+            delay = LOADER_RETRY_BACKOFF * 2 ** attempt
+            logging.warning(f"[fetch_page] {url} failed ({type(e).__name__}: {e}), retry {attempt + 1}/{LOADER_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def iter_question_pages(session, since=None):
+    """
+    Асинхронный генератор по страницам опубликованных вопросов в порядке публикации (keyset-пагинация, ?cursor=).
+    Если передан since (channel_posted_at), отдаются только вопросы, опубликованные не раньше этого момента.
+    Следующая страница запрашивается по ссылке next, поэтому полный проход линейный.
+    """
+    url = API_URL
+    params = {'cursor': '', 'page_size': LOADER_PAGE_SIZE}
+    if since:
+        params['channel_posted_after'] = since
+    while url:
+        data = await _fetch_page(session, url, params)
+        yield _parse_questions(data.get('results', []))
+        # В ссылке next уже есть все параметры запроса и курсор
+        url, params = data.get('next'), None
+
+
+async def fetch_questions_async(since=None):
+    """
+    Загружает опубликованные вопросы из API в порядке публикации через одну сессию с пулом соединений.
+    Если какую-то страницу загрузить не удалось, бросает PartialFetchError с уже загруженным префиксом.
+    """
     questions = []
-    page = 1
-    while True:
-        url = f"{API_URL}&page={page}&page_size=1000"
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            break
-        data = resp.json()
-        results = data.get('results', [])
-        if not results:
-            break
-        for post in results:
-            if post.get('content') and post.get('channel_message_id'):
-                questions.append({
-                    'id': post['id'],
-                    'content': post['content'],
-                    'tg_id': post['channel_message_id'],
-                })
-        if not data.get('next'):
-            break
-        page += 1
+    timeout = aiohttp.ClientTimeout(total=LOADER_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        try:
+            async for page in iter_question_pages(session, since):
+                questions.extend(page)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise PartialFetchError(f"Load failed after {len(questions)} questions: {type(e).__name__}: {e}", questions) from e
     return questions
 
-def update_questions():
-    global QUESTIONS
-    QUESTIONS = fetch_questions()
 
-def get_questions():
-    return QUESTIONS 
\ No newline at end of file
+def fetch_questions(since=None):
+    """Синхронная обертка для фонового потока обновления индекса"""
+    return asyncio.run(fetch_questions_async(since))
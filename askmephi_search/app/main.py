@@ -1,35 +1,102 @@
 from fastapi import FastAPI, Query
-from app.search import find_similar_question, build_index
-from app.loader import update_questions, get_questions
-from app.config import CHANNEL_ID, UPDATE_INTERVAL_MINUTES
+from pydantic import BaseModel, Field
+from app import search
+from app.search import find_similar_questions, find_similar_questions_batch, build_index, update_index, refresh_index_idf, get_index, load_persisted_index, index_health, try_become_writer, sync_index, THRESHOLD, MAX_K
+from app.config import CHANNEL_ID, UPDATE_INTERVAL_MINUTES, INCREMENTAL_UPDATE_SECONDS, IDF_REFRESH_MINUTES
+import logging
 import threading
 import time
 
+MAX_BATCH_SIZE = 1000  # Максимум вопросов в одном запросе /search/batch
+
 app = FastAPI()
 
 @app.on_event("startup")
 def startup_event():
+    # Сохраненный снимок отдается сразу, свежие вопросы догружаются в фоне
+    load_persisted_index()
+
     def periodic_update():
+        """
+        Писатель (один процесс, см. search.try_become_writer) загружает вопросы с backend и сохраняет снимки,
+        остальные воркеры раз в INCREMENTAL_UPDATE_SECONDS подхватывают опубликованное с диска.
+        Если писатель завершится, его блокировку на следующей итерации возьмет один из читателей.
+        """
+        last_full_rebuild = time.monotonic()
+        initial = True
         while True:
-            update_questions()
-            build_index()
-            time.sleep(UPDATE_INTERVAL_MINUTES * 60)
-    # Первая загрузка
-    update_questions()
-    build_index()
+            try:
+                if not try_become_writer():
+                    sync_index()
+                elif initial:
+                    # Первая загрузка: без снимка строим индекс целиком, со снимком догоняем инкрементально
+                    initial = False
+                    if get_index().size:
+                        update_index()
+                    else:
+                        build_index()
+                elif time.monotonic() - last_full_rebuild >= UPDATE_INTERVAL_MINUTES * 60:
+                    build_index()
+                    last_full_rebuild = time.monotonic()
+                else:
+                    update_index()
+                    if time.monotonic() - search.LAST_IDF_REFRESH >= IDF_REFRESH_MINUTES * 60:
+                        refresh_index_idf()
+            except Exception:
+                logging.exception("[periodic_update] Index update failed")
+            time.sleep(INCREMENTAL_UPDATE_SECONDS)
     # Запуск фонового потока
     thread = threading.Thread(target=periodic_update, daemon=True)
     thread.start()
 
+@app.get("/health")
+def health():
+    """Состояние поискового индекса: размер, возраст снимка и время последнего обновления."""
+    return index_health()
+
+def format_matches(results):
+    """Кандидаты поиска в формате ответа: id, ссылка на пост в канале, текст и оценка схожести"""
+    return [
+        {
+            "id": result["id"],
+            "link": f"https://t.me/c/{CHANNEL_ID}/{result['tg_id']}",
+            "content": result["content"],
+            "score": round(score, 4),
+        }
+        for result, score in results
+    ]
+
 @app.get("/search/")
-def search(question: str = Query(..., description="Вопрос пользователя")):
-    result = find_similar_question(question)
-    if result:
-        link = f"https://t.me/c/{CHANNEL_ID}/{result['tg_id']}"
-        return {"found": True, "link": link, "id": result["id"]}
-    return {"found": False}
+def search_question(
+    question: str = Query(..., description="Вопрос пользователя"),
+    k: int = Query(1, ge=1, le=MAX_K, description="Сколько похожих вопросов вернуть"),
+    threshold: float = Query(THRESHOLD, ge=0.0, le=1.0, description="Минимальная схожесть"),
+):
+    """
+    Ищет похожие опубликованные вопросы. В matches до k кандидатов по убыванию схожести;
+    found/link/id/content описывают лучший из них (совместимость со старыми клиентами).
+    """
+    matches = format_matches(find_similar_questions(question, k=k, threshold=threshold))
+    if matches:
+        best = matches[0]
+        return {"found": True, "link": best["link"], "id": best["id"], "content": best["content"], "matches": matches}
+    return {"found": False, "matches": []}
+
+class BatchSearchRequest(BaseModel):
+    questions: list[str] = Field(..., max_length=MAX_BATCH_SIZE, description="Вопросы для поиска")
+    k: int = Field(1, ge=1, le=MAX_K, description="Сколько похожих вопросов вернуть на каждый вопрос")
+    threshold: float = Field(THRESHOLD, ge=0.0, le=1.0, description="Минимальная схожесть")
+
+@app.post("/search/batch")
+def search_batch(request: BatchSearchRequest):
+    """
+    Пакетный поиск для админских задач (дедупликация архива, перепроверка предложки):
+    все вопросы обрабатываются одним матричным произведением. results[i] соответствует questions[i].
+    """
+    batch = find_similar_questions_batch(request.questions, k=request.k, threshold=request.threshold)
+    return {"results": [{"found": bool(matches), "matches": format_matches(matches)} for matches in batch]}
 
 @app.get("/all_posts/")
 def all_posts():
     """Возвращает все посты, которые видит микросервис (для теста)."""
-    return get_questions() 
\ No newline at end of file
+    return get_index().questions
@@ -1,33 +1,617 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from app.loader import get_questions
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from app.loader import fetch_questions, PartialFetchError
+from app.config import HASH_N_FEATURES, INDEX_DIR, TAIL_MERGE_ROWS, TEXT_PIPELINE, ANALYZER, CHAR_NGRAM_RANGE, LOADER_CHECKPOINT_MAX_AGE_MINUTES
+from app.text import TextPipeline
+import fcntl
+import json
+import logging
 import numpy as np
-
-# Глобальные переменные для индекса
-VECTORIZER = None
-MATRIX = None
-QUESTIONS_CACHE = []
+import os
+import scipy.sparse as sp
+import shutil
+import threading
+import time
 
 THRESHOLD = 0.6  # Порог схожести
+MAX_K = 20  # Максимальное число кандидатов в ответе /search/
+
+# Нормализация (регистр, ё/е, стоп-слова, стемминг) выполняется до векторизации,
+# поэтому векторизатор получает готовые токены через пробел.
+PIPELINE = TextPipeline(TEXT_PIPELINE)
+
+
+def make_vectorizer(analyzer=ANALYZER):
+    """
+    Словарь фиксирован (хеширование), поэтому новые вопросы векторизуются без переобучения.
+    norm=None: храним сырые счетчики, TF-IDF веса считаем сами по накопленным df.
+    """
+    if analyzer == 'word':
+        return HashingVectorizer(n_features=HASH_N_FEATURES, alternate_sign=False, norm=None, analyzer=str.split)
+    if analyzer == 'char_wb':
+        return HashingVectorizer(n_features=HASH_N_FEATURES, alternate_sign=False, norm=None,
+                                 analyzer='char_wb', ngram_range=CHAR_NGRAM_RANGE, lowercase=False)
+    raise ValueError(f"Unknown analyzer: {analyzer}")
+
+
+VECTORIZER = make_vectorizer()
+# Признаки индекса зависят от нормализации и анализатора; снимок с другими настройками несовместим
+FEATURES_SIGNATURE = f"{PIPELINE.signature}|{ANALYZER}" + (f"|{CHAR_NGRAM_RANGE[0]}-{CHAR_NGRAM_RANGE[1]}" if ANALYZER == 'char_wb' else '')
+
+
+def compute_idf(df, n_docs):
+    """Сглаженный IDF, как у TfidfVectorizer(smooth_idf=True)"""
+    return np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+
+def weigh(counts, idf):
+    """TF-IDF с L2-нормировкой строк для матрицы счетчиков"""
+    return normalize(counts @ sp.diags(idf, format='csr'), copy=False)
+
+
+class SearchIndex:
+    """
+    Снимок поискового индекса: основной сегмент и хвост.
+
+    Основной сегмент (counts, matrix, inverted, df) строится при полной сборке, пересчете idf и слиянии
+    хвоста и дальше не меняется, поэтому его массивы можно держать в mmap. Вопросы, добавленные после этого,
+    лежат в хвосте — небольших матрицах, которые пересобираются при каждом добавлении: стоимость обновления
+    зависит от размера хвоста, а не корпуса. Когда хвост превышает TAIL_MERGE_ROWS, он вливается в основной сегмент.
+
+    После создания снимок не изменяется: обновления строят новый снимок, который подменяет
+    текущий одним присваиванием, поэтому поиск всегда видит согласованные матрицы и списки вопросов.
+    """
+
+    def __init__(self, questions, texts, counts, df, idf, matrix, idf_docs, inverted=None, built_at=None,
+                 tail_questions=(), tail_texts=(), tail_counts=None, tail_matrix=None, snapshot_key=None):
+        self.base_questions = questions  # вопросы основного сегмента, строка i матрицы — base_questions[i]
+        self.base_texts = texts          # нормализованные тексты вопросов (кеш для пересборок)
+        self.counts = counts             # CSR: сырые счетчики слов основного сегмента
+        self.df = df                     # document frequency по вопросам основного сегмента
+        self.idf = idf                   # IDF, которым взвешены строки matrix и tail_matrix (пересчитывается по расписанию)
+        self.matrix = matrix             # CSR: TF-IDF, L2-нормированные строки
+        self.idf_docs = idf_docs         # число вопросов на момент расчета idf
+        # Инвертированный индекс основного сегмента: CSC той же матрицы, столбец признака = список (вопрос, вес)
+        self.inverted = inverted if inverted is not None else matrix.tocsc()
+        # Хвост: вопросы, добавленные после сборки основного сегмента; сравниваются с запросом напрямую
+        self.tail_questions = list(tail_questions)
+        self.tail_texts = list(tail_texts)
+        self.tail_counts = tail_counts
+        self.tail_matrix = tail_matrix
+        # df хвоста в разреженном виде: номера признаков и число вопросов хвоста с ними
+        if tail_counts is not None and tail_counts.nnz:
+            self.tail_df_features, self.tail_df_values = np.unique(tail_counts.indices, return_counts=True)
+        else:
+            self.tail_df_features = self.tail_df_values = np.zeros(0, dtype=np.int64)
+        self.built_at = built_at or time.time()  # время создания снимка (unix time)
+        # Версия снимка на диске, из которой загружен основной сегмент (None — сегмент есть только в памяти)
+        self.snapshot_key = snapshot_key
+        # Высшая отметка: channel_posted_at последнего вопроса и id вопросов с этим временем
+        recent = self._recent(1000)
+        self.high_water_mark = recent[0].get('channel_posted_at') if recent else None
+        self.boundary_ids = frozenset(q['id'] for q in recent if q.get('channel_posted_at') == self.high_water_mark)
+
+    @classmethod
+    def empty(cls):
+        df = np.zeros(HASH_N_FEATURES, dtype=np.int64)
+        counts = sp.csr_matrix((0, HASH_N_FEATURES), dtype=np.float64)
+        return cls([], [], counts, df, compute_idf(df, 0), counts, 0)
+
+    def _recent(self, n):
+        """До n последних вопросов, от последнего к первому"""
+        # Срезы берутся с конца до разворота: копируется не больше n элементов, а не весь корпус
+        recent = self.tail_questions[-n:][::-1]
+        if len(recent) < n:
+            recent += self.base_questions[-(n - len(recent)):][::-1]
+        return recent
+
+    @property
+    def base_size(self):
+        return len(self.base_questions)
+
+    @property
+    def tail_size(self):
+        return len(self.tail_questions)
+
+    @property
+    def size(self):
+        return self.base_size + self.tail_size
+
+    @property
+    def questions(self):
+        """Все вопросы по порядку строк (копия списка — для сохранения и пересборок, не для поиска)"""
+        return self.base_questions + self.tail_questions
+
+    @property
+    def texts(self):
+        return self.base_texts + self.tail_texts
+
+    def question(self, row):
+        """Вопрос по номеру строки в результатах поиска (основной сегмент, затем хвост)"""
+        return self.base_questions[row] if row < self.base_size else self.tail_questions[row - self.base_size]
+
+    def df_at(self, features):
+        """df по всему корпусу для отсортированных или произвольных номеров признаков"""
+        df = self.df[features].astype(np.int64)
+        if len(self.tail_df_features):
+            pos = np.searchsorted(self.tail_df_features, features)
+            pos = np.minimum(pos, len(self.tail_df_features) - 1)
+            hit = self.tail_df_features[pos] == features
+            df[hit] += self.tail_df_values[pos[hit]]
+        return df
+
+    def total_df(self):
+        """Полный вектор df (основной сегмент + хвост)"""
+        df = np.array(self.df, dtype=np.int64)
+        df[self.tail_df_features] += self.tail_df_values
+        return df
+
+
+def normalize_texts(questions, previous=None):
+    """
+    Нормализует тексты вопросов. Для вопросов, которые уже есть в previous с тем же содержимым,
+    берется сохраненный результат, поэтому полная пересборка не нормализует архив заново.
+    """
+    cached = {}
+    if previous is not None:
+        cached = {q['id']: (q['content'], text) for q, text in zip(previous.questions, previous.texts)}
+    texts = []
+    reused = 0
+    for q in questions:
+        content, text = cached.get(q['id'], (None, None))
+        if content == q['content']:
+            reused += 1
+        else:
+            text = PIPELINE(q['content'])
+        texts.append(text)
+    if previous is not None:
+        logging.info(f"[normalize_texts] Reused {reused} of {len(questions)} normalized texts")
+    return texts
+
+
+def build_index_from(questions, previous=None):
+    """Полная сборка индекса по списку вопросов (previous — прежний индекс, кеш нормализованных текстов)"""
+    if not questions:
+        return SearchIndex.empty()
+    texts = normalize_texts(questions, previous)
+    counts = VECTORIZER.transform(texts).tocsr()
+    df = np.bincount(counts.indices, minlength=HASH_N_FEATURES).astype(np.int64)
+    idf = compute_idf(df, len(questions))
+    return SearchIndex(questions, texts, counts, df, idf, weigh(counts, idf), len(questions))
+
+
+def merge_tail(index):
+    """Вливает хвост в основной сегмент и перестраивает инвертированный индекс (O(размер корпуса))"""
+    if index.tail_counts is None:
+        return index
+    counts = sp.vstack([index.counts, index.tail_counts], format='csr')
+    matrix = sp.vstack([index.matrix, index.tail_matrix], format='csr')
+    return SearchIndex(index.questions, index.texts, counts, index.total_df(), index.idf, matrix, index.idf_docs)
+
+
+def append_to_index(index, new_questions, merge=True):
+    """
+    Добавляет новые вопросы в хвост индекса без переобучения: векторизуются только новые тексты,
+    веса считаются по текущему idf снимка. Основной сегмент не копируется; хвост, переросший
+    TAIL_MERGE_ROWS, вливается в него (стоимость слияния амортизируется на TAIL_MERGE_ROWS добавлений).
+    merge=False — не сливать (читатели повторяют хвост писателя, слитый сегмент они загрузят с диска).
+    """
+    new_questions = [q for q in new_questions if q['id'] not in index.boundary_ids]
+    if not new_questions:
+        return index
+    new_texts = normalize_texts(new_questions)
+    new_counts = VECTORIZER.transform(new_texts).tocsr()
+    new_matrix = weigh(new_counts, index.idf)
+    if index.tail_counts is not None:
+        new_counts = sp.vstack([index.tail_counts, new_counts], format='csr')
+        new_matrix = sp.vstack([index.tail_matrix, new_matrix], format='csr')
+    appended = SearchIndex(
+        index.base_questions, index.base_texts, index.counts, index.df, index.idf, index.matrix, index.idf_docs,
+        inverted=index.inverted, built_at=index.built_at,
+        tail_questions=index.tail_questions + new_questions, tail_texts=index.tail_texts + new_texts,
+        tail_counts=new_counts, tail_matrix=new_matrix, snapshot_key=index.snapshot_key,
+    )
+    if merge and appended.tail_size > TAIL_MERGE_ROWS:
+        logging.info(f"[append_to_index] Merging tail of {appended.tail_size} questions into the index")
+        return merge_tail(appended)
+    return appended
+
+
+def refresh_idf(index):
+    """Переоценивает IDF по накопленным df и перевзвешивает матрицу (без повторной векторизации текстов)"""
+    if index.size == 0 or index.idf_docs == index.size:
+        return index
+    index = merge_tail(index)
+    idf = compute_idf(index.df, index.size)
+    return SearchIndex(index.questions, index.texts, index.counts, index.df, idf, weigh(index.counts, idf), index.size)
+
+
+# Формат снимка на диске: каталог версии с .npy массивами (читаются через mmap),
+# questions.json, texts.json и manifest.json; файл CURRENT указывает на активную версию.
+SNAPSHOT_FORMAT_VERSION = 4
+SNAPSHOT_KEEP_VERSIONS = 2
+_SNAPSHOT_ARRAYS = ('df', 'idf')
+_SNAPSHOT_MATRICES = ('counts', 'matrix', 'inverted')
+
+
+def _snapshot_key(index):
+    """Имя каталога версии: высшая отметка корпуса, размер и время сборки"""
+    hwm = (index.high_water_mark or 'empty').replace(':', '').replace('+', 'p').replace('-', '')
+    return f"v{SNAPSHOT_FORMAT_VERSION}-{hwm}-{index.size}-{int(index.built_at * 1000)}-{os.getpid()}"
+
+
+def save_snapshot(index, path=INDEX_DIR):
+    """
+    Сохраняет снимок в новый каталог версии и атомарно переключает на него CURRENT.
+    Старые версии (кроме последних SNAPSHOT_KEEP_VERSIONS) удаляются. Хвост сохраняется влитым в основной сегмент.
+    """
+    index = merge_tail(index)
+    key = _snapshot_key(index)
+    version_dir = os.path.join(path, key)
+    os.makedirs(version_dir, exist_ok=True)
+    files = {}
+    for name in _SNAPSHOT_ARRAYS:
+        files[name] = f"{name}.npy"
+        np.save(os.path.join(version_dir, files[name]), getattr(index, name))
+    for name in _SNAPSHOT_MATRICES:
+        matrix = getattr(index, name)
+        for part in ('data', 'indices', 'indptr'):
+            files[f"{name}_{part}"] = f"{name}_{part}.npy"
+            np.save(os.path.join(version_dir, files[f"{name}_{part}"]), getattr(matrix, part))
+    with open(os.path.join(version_dir, 'questions.json'), 'w', encoding='utf-8') as f:
+        json.dump(index.base_questions, f, ensure_ascii=False)
+    with open(os.path.join(version_dir, 'texts.json'), 'w', encoding='utf-8') as f:
+        json.dump(index.base_texts, f, ensure_ascii=False)
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "n_features": HASH_N_FEATURES,
+        "features": FEATURES_SIGNATURE,
+        "size": index.size,
+        "idf_docs": index.idf_docs,
+        "high_water_mark": index.high_water_mark,
+        "built_at": index.built_at,
+        "files": files,
+    }
+    with open(os.path.join(version_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    # Переключаем указатель атомарно: читатели видят либо старую, либо новую версию целиком
+    tmp_pointer = os.path.join(path, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp_pointer, 'w') as f:
+        f.write(key)
+    os.replace(tmp_pointer, os.path.join(path, 'CURRENT'))
+    _prune_snapshots(path, keep=key)
+    logging.info(f"[save_snapshot] Saved index with {index.size} questions to {version_dir}")
+    return key
+
+
+def _prune_snapshots(path, keep):
+    versions = sorted(
+        (d for d in os.listdir(path) if d.startswith('v') and os.path.isdir(os.path.join(path, d))),
+        key=lambda d: os.path.getmtime(os.path.join(path, d)),
+    )
+    for old in versions[:-SNAPSHOT_KEEP_VERSIONS]:
+        if old != keep:
+            shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+
+
+def load_snapshot(path=INDEX_DIR):
+    """
+    Загружает активную версию снимка. Массивы открываются через mmap (np.load(mmap_mode='r')),
+    поэтому загрузка не читает матрицу целиком, а несколько воркеров делят одну копию в page cache.
+    Возвращает None, если снимка нет или он несовместим.
+    """
+    key = _current_key(path)
+    if key is None:
+        return None
+    try:
+        version_dir = os.path.join(path, key)
+        with open(os.path.join(version_dir, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION or manifest.get('n_features') != HASH_N_FEATURES
+                or manifest.get('features') != FEATURES_SIGNATURE):
+            logging.warning(f"[load_snapshot] Incompatible index in {version_dir}, ignoring")
+            return None
+        files = manifest['files']
+
+        def load_array(name):
+            return np.load(os.path.join(version_dir, files[name]), mmap_mode='r')
+
+        matrices = {}
+        for name in _SNAPSHOT_MATRICES:
+            parts = (load_array(f"{name}_data"), load_array(f"{name}_indices"), load_array(f"{name}_indptr"))
+            if name == 'inverted':
+                matrices[name] = sp.csc_matrix(parts, shape=(manifest['size'], HASH_N_FEATURES), copy=False)
+            else:
+                matrices[name] = sp.csr_matrix(parts, shape=(manifest['size'], HASH_N_FEATURES), copy=False)
+        df, idf = load_array('df'), load_array('idf')
+        with open(os.path.join(version_dir, 'questions.json'), encoding='utf-8') as f:
+            questions = json.load(f)
+        with open(os.path.join(version_dir, 'texts.json'), encoding='utf-8') as f:
+            texts = json.load(f)
+    except Exception:
+        logging.exception(f"[load_snapshot] Failed to load index from {path}")
+        return None
+    return SearchIndex(questions, texts, matrices['counts'], df, idf, matrices['matrix'],
+                       manifest['idf_docs'], inverted=matrices['inverted'], built_at=manifest['built_at'], snapshot_key=key)
+
+
+def _current_key(path=INDEX_DIR):
+    """Имя активной версии снимка из файла CURRENT или None"""
+    try:
+        with open(os.path.join(path, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# Один процесс (писатель) загружает вопросы с backend и сохраняет снимки, остальные воркеры
+# только читают опубликованное: версию снимка (CURRENT) и хвост новых вопросов (TAIL).
+# Писатель определяется блокировкой файла writer.lock, при его падении блокировку берет другой воркер.
+_WRITER_LOCK_FILE = None
+
+
+def try_become_writer(path=INDEX_DIR):
+    """True, если этот процесс — писатель индекса (блокировка берется один раз и держится до выхода)"""
+    global _WRITER_LOCK_FILE
+    if _WRITER_LOCK_FILE is not None:
+        return True
+    os.makedirs(path, exist_ok=True)
+    lock_file = open(os.path.join(path, 'writer.lock'), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _WRITER_LOCK_FILE = lock_file
+    logging.info(f"[try_become_writer] Process {os.getpid()} is the index writer")
+    return True
+
+
+def save_tail(index, path=INDEX_DIR):
+    """Публикует хвост писателя для читателей: версия основного сегмента и вопросы хвоста по порядку"""
+    tail = {"base": index.snapshot_key, "questions": index.tail_questions, "updated_at": LAST_UPDATE_AT}
+    tmp_path = os.path.join(path, f"TAIL.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(tail, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(path, 'TAIL'))
+
+
+def load_tail(path=INDEX_DIR):
+    try:
+        with open(os.path.join(path, 'TAIL'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        logging.exception("[load_tail] Broken TAIL file")
+        return None
+
+
+# Текущий снимок индекса. Читается без блокировок, подменяется целиком одним присваиванием.
+INDEX = SearchIndex.empty()
+# True, пока не загружен ни сохраненный снимок, ни свежий индекс
+LOADING = True
+# Сериализует обновления индекса (фоновый поток и startup)
+_UPDATE_LOCK = threading.Lock()
+LAST_IDF_REFRESH = time.monotonic()
+LAST_UPDATE_AT = None  # время последнего успешного обновления с backend (unix time)
+# Прогресс прерванной полной загрузки: (время начала по time.monotonic(), загруженный префикс корпуса)
+_FULL_LOAD_CHECKPOINT = None
+
+
+def get_index():
+    return INDEX
+
+
+def _publish(index, persist=False, complete=True):
+    """
+    Подменяет текущий снимок (вызывает писатель); complete=False — данные догружены не полностью.
+    При persist=True снимок сохраняется на диск и открывается заново через mmap, поэтому основной сегмент
+    писателя тоже лежит в общем page cache, а не в отдельной копии в памяти процесса.
+    Хвост публикуется для читателей в TAIL.
+    """
+    global INDEX, LOADING, LAST_UPDATE_AT
+    if persist:
+        try:
+            key = save_snapshot(index)
+            reloaded = load_snapshot()
+            if reloaded is not None and reloaded.snapshot_key == key:
+                index = reloaded
+        except Exception:
+            logging.exception("[_publish] Failed to persist index snapshot")
+    previous = INDEX
+    INDEX = index
+    LOADING = False
+    if complete:
+        LAST_UPDATE_AT = time.time()
+    if index.snapshot_key and (index.snapshot_key != previous.snapshot_key or index.tail_size != previous.tail_size):
+        try:
+            save_tail(index)
+        except Exception:
+            logging.exception("[_publish] Failed to publish index tail")
+
+
+def sync_index(path=INDEX_DIR):
+    """
+    Обновление у читателя: загружает новую версию снимка, если писатель ее сохранил, и догоняет его хвост.
+    Основной сегмент открыт через mmap и общий для всех воркеров; у каждого свой только небольшой хвост.
+    """
+    global INDEX, LOADING, LAST_UPDATE_AT
+    with _UPDATE_LOCK:
+        index = INDEX
+        key = _current_key(path)
+        if key is None:
+            return
+        if key != index.snapshot_key:
+            loaded = load_snapshot(path)
+            if loaded is None:
+                return
+            index = loaded
+        tail = load_tail(path)
+        if tail and tail.get('base') == index.snapshot_key and len(tail['questions']) > index.tail_size:
+            index = append_to_index(index, tail['questions'][index.tail_size:], merge=False)
+        if index is not INDEX:
+            INDEX = index
+            LOADING = False
+        if tail and tail.get('updated_at'):
+            LAST_UPDATE_AT = tail['updated_at']
+
+
+def load_persisted_index():
+    """Подхватывает сохраненный снимок при старте, чтобы сразу отвечать на запросы"""
+    global INDEX, LOADING
+    index = load_snapshot()
+    if index is None:
+        return False
+    with _UPDATE_LOCK:
+        INDEX = index
+        LOADING = False
+    logging.info(f"[load_persisted_index] Loaded index with {index.size} questions, high-water mark {index.high_water_mark}")
+    return True
+
+
+def _merge_questions(loaded, fetched):
+    seen = {q['id'] for q in loaded}
+    return loaded + [q for q in fetched if q['id'] not in seen]
+
+
+def load_all_questions():
+    """
+    Полная загрузка корпуса с продолжением: если предыдущая попытка прервалась, догружает вопросы
+    после последнего сохраненного, а не начинает заново. Возвращает полный список или бросает PartialFetchError,
+    поэтому неполный корпус никогда не заменяет рабочий индекс.
+    """
+    global _FULL_LOAD_CHECKPOINT
+    checkpoint = _FULL_LOAD_CHECKPOINT
+    if checkpoint and time.monotonic() - checkpoint[0] > LOADER_CHECKPOINT_MAX_AGE_MINUTES * 60:
+        checkpoint = None
+    started_at, loaded = checkpoint or (time.monotonic(), [])
+    since = loaded[-1]['channel_posted_at'] if loaded else None
+    try:
+        fetched = fetch_questions(since=since)
+    except PartialFetchError as e:
+        questions = _merge_questions(loaded, e.questions)
+        _FULL_LOAD_CHECKPOINT = (started_at, questions)
+        logging.warning(f"[load_all_questions] {e}; {len(questions)} questions loaded so far, next attempt resumes")
+        raise
+    _FULL_LOAD_CHECKPOINT = None
+    return _merge_questions(loaded, fetched)
 
 
 def build_index():
-    global VECTORIZER, MATRIX, QUESTIONS_CACHE
-    questions = get_questions()
-    texts = [q['content'] for q in questions]
-    if not texts:
-        VECTORIZER, MATRIX, QUESTIONS_CACHE = None, None, []
-        return
-    VECTORIZER = TfidfVectorizer().fit(texts)
-    MATRIX = VECTORIZER.transform(texts)
-    QUESTIONS_CACHE = questions
+    """Полная пересборка: загружает все вопросы и строит индекс заново"""
+    global LAST_IDF_REFRESH
+    with _UPDATE_LOCK:
+        _publish(build_index_from(load_all_questions(), previous=INDEX), persist=True)
+        LAST_IDF_REFRESH = time.monotonic()
+
+
+def update_index():
+    """Инкрементальное обновление: загружает вопросы, опубликованные после высшей отметки индекса"""
+    with _UPDATE_LOCK:
+        index = INDEX
+        if index.high_water_mark is None:
+            _publish(build_index_from(load_all_questions()), persist=True)
+            return
+        try:
+            new_questions = fetch_questions(since=index.high_water_mark)
+        except PartialFetchError as e:
+            # Префикс непрерывен по времени публикации: его можно добавить, следующая попытка продолжит с новой отметки
+            if e.questions:
+                appended = append_to_index(index, e.questions)
+                _publish(appended, persist=appended.snapshot_key is None, complete=False)
+            raise
+        appended = append_to_index(index, new_questions)
+        # Хвост влит в основной сегмент — сохраняем новую версию, читатели загрузят ее с диска
+        _publish(appended, persist=appended.snapshot_key is None)
+
+
+def refresh_index_idf():
+    """Пересчет IDF по расписанию (заодно сохраняет снимок на диск)"""
+    global LAST_IDF_REFRESH
+    with _UPDATE_LOCK:
+        index = refresh_idf(INDEX)
+        _publish(index, persist=index is not INDEX)
+        LAST_IDF_REFRESH = time.monotonic()
+
+
+def index_health():
+    """Состояние индекса для /health"""
+    index = INDEX
+    now = time.time()
+    return {
+        "status": "loading" if LOADING else "ok",
+        "size": index.size,
+        "built_at": index.built_at,
+        "age_seconds": round(now - index.built_at, 1),
+        "last_update_at": LAST_UPDATE_AT,
+        "seconds_since_update": round(now - LAST_UPDATE_AT, 1) if LAST_UPDATE_AT else None,
+        "high_water_mark": index.high_water_mark,
+        "role": "writer" if _WRITER_LOCK_FILE is not None else "reader",
+        "snapshot": index.snapshot_key,
+        "tail_size": index.tail_size,
+        "matrix_nnz": int(index.matrix.nnz) + (int(index.tail_matrix.nnz) if index.tail_matrix is not None else 0),
+    }
+
+
+def _query_matrix(index, user_questions):
+    """
+    TF-IDF векторы запросов (len(user_questions) x n_features, CSR) одним вызовом transform.
+    Слова, которых нет в корпусе, не участвуют в сравнении (как у TfidfVectorizer с обученным словарем).
+    Веса считаем только по ненулевым признакам: маска и диагональ по всем n_features стоили бы O(n_features) на запрос.
+    """
+    queries = VECTORIZER.transform([PIPELINE(q) for q in user_questions]).tocsr()
+    features = queries.indices
+    queries.data = np.where(index.df_at(features) > 0, queries.data * index.idf[features], 0.0)
+    queries.eliminate_zeros()
+    return normalize(queries, copy=False)
+
+
+def _similarities(index, queries):
+    """
+    Косинусная близость запросов ко всем вопросам одним разреженным произведением (CSR: запросы x вопросы).
+    Умножение на транспонированный инвертированный индекс читает только списки вопросов для слов запросов,
+    поэтому время не растет линейно с размером архива; хвост недавно добавленных вопросов сравнивается напрямую.
+    """
+    sims = queries @ index.inverted.T
+    if index.tail_matrix is not None:
+        sims = sp.hstack([sims, queries @ index.tail_matrix.T], format='csr')
+    return sims.tocsr()
+
+
+def _top_k(candidates, scores, k, threshold):
+    """Отбирает k лучших кандидатов с оценкой не ниже порога, по убыванию оценки"""
+    mask = scores >= threshold
+    candidates, scores = candidates[mask], scores[mask]
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        candidates, scores = candidates[top], scores[top]
+    order = np.argsort(-scores, kind='stable')
+    return candidates[order], scores[order]
+
+
+def find_similar_questions_batch(user_questions, k=1, threshold=THRESHOLD):
+    """
+    Пакетный поиск: все запросы векторизуются одним transform и сравниваются одним произведением матриц.
+    Возвращает для каждого запроса список до k пар (вопрос, оценка) с оценкой не ниже threshold.
+    """
+    index = INDEX
+    if index.size == 0 or not user_questions:
+        return [[] for _ in user_questions]
+    sims = _similarities(index, _query_matrix(index, user_questions))
+    results = []
+    for i in range(sims.shape[0]):
+        start, end = sims.indptr[i], sims.indptr[i + 1]
+        rows, scores = _top_k(sims.indices[start:end], sims.data[start:end], k, threshold)
+        results.append([(index.question(row), float(score)) for row, score in zip(rows, scores)])
+    return results
+
+
+def find_similar_questions(user_question: str, k=1, threshold=THRESHOLD):
+    """Возвращает до k похожих вопросов с оценкой схожести не ниже threshold: список (вопрос, оценка)"""
+    return find_similar_questions_batch([user_question], k=k, threshold=threshold)[0]
+
 
 def find_similar_question(user_question: str):
-    if VECTORIZER is None or MATRIX is None or MATRIX.shape[0] == 0 or not QUESTIONS_CACHE:
-        return None
-    user_vec = VECTORIZER.transform([user_question])
-    sims = cosine_similarity(user_vec, MATRIX)[0]
-    best_idx = np.argmax(sims)
-    if sims[best_idx] >= THRESHOLD:
-        return QUESTIONS_CACHE[best_idx]
-    return None 
\ No newline at end of file
+    matches = find_similar_questions(user_question)
+    return matches[0][0] if matches else None
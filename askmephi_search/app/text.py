@@ -0,0 +1,90 @@
+import re
+import threading
+from functools import lru_cache
+
+import snowballstemmer
+
+# Стоп-слова те же, что в /stats админки бота (с заменой ё на е)
+RUSSIAN_STOPWORDS = frozenset([
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так', 'его',
+    'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 'вот', 'от',
+    'меня', 'еще', 'нет', 'о', 'из', 'ему', 'теперь', 'когда', 'даже', 'ну', 'вдруг', 'ли', 'если', 'уже',
+    'или', 'ни', 'быть', 'был', 'него', 'до', 'вас', 'нибудь', 'опять', 'уж', 'вам', 'ведь', 'там', 'потом',
+    'себя', 'ничего', 'ей', 'может', 'они', 'тут', 'где', 'есть', 'надо', 'ней', 'для', 'мы', 'тебя', 'их',
+    'чем', 'была', 'сам', 'чтоб', 'без', 'будто', 'чего', 'раз', 'тоже', 'себе', 'под', 'будет', 'ж', 'тогда',
+    'кто', 'этот', 'того', 'потому', 'этого', 'какой', 'совсем', 'ним', 'здесь', 'этом', 'один', 'почти',
+    'мой', 'тем', 'чтобы', 'нее', 'сейчас', 'были', 'куда', 'зачем', 'всех', 'никогда', 'можно', 'при',
+    'наконец', 'два', 'об', 'другой', 'хоть', 'после', 'над', 'больше', 'тот', 'через', 'эти', 'нас', 'про',
+    'всего', 'них', 'какая', 'много', 'разве', 'три', 'эту', 'моя', 'впрочем', 'хорошо', 'свою', 'этой',
+    'перед', 'иногда', 'лучше', 'чуть', 'том', 'нельзя', 'такой', 'им', 'более', 'всегда', 'конечно',
+    'всю', 'между'
+])
+
+URL_RE = re.compile(r'https?://\S+')
+TOKEN_RE = re.compile(r'(?u)\b\w\w+\b')  # как token_pattern по умолчанию у sklearn
+
+
+def lowercase(text):
+    return text.lower()
+
+
+def fold_yo(text):
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def strip_urls(text):
+    return URL_RE.sub(' ', text)
+
+
+def remove_stopwords(tokens):
+    return [t for t in tokens if t not in RUSSIAN_STOPWORDS]
+
+
+# Стеммер snowball хранит состояние разбора в объекте, поэтому у каждого потока свой экземпляр
+_STEMMERS = threading.local()
+
+
+@lru_cache(maxsize=200_000)
+def stem_word(word):
+    """Основа слова (snowball, русский); результат кешируется — словарь корпуса повторяется"""
+    stemmer = getattr(_STEMMERS, 'russian', None)
+    if stemmer is None:
+        stemmer = _STEMMERS.russian = snowballstemmer.stemmer('russian')
+    return stemmer.stemWord(word)
+
+
+def stem(tokens):
+    return [stem_word(t) for t in tokens]
+
+
+# Шаги над строкой выполняются до токенизации, шаги над токенами — после
+TEXT_STEPS = {'lower': lowercase, 'yo': fold_yo, 'urls': strip_urls}
+TOKEN_STEPS = {'stopwords': remove_stopwords, 'stem': stem}
+
+
+class TextPipeline:
+    """
+    Нормализация текста перед векторизацией.
+    Шаги задаются строкой имен через запятую, например "lower,yo,urls,stopwords,stem".
+    Результат — токены через пробел, одинаковый для вопросов корпуса и для запросов.
+    """
+
+    def __init__(self, spec):
+        self.names = [name.strip() for name in spec.split(',') if name.strip()]
+        unknown = [name for name in self.names if name not in TEXT_STEPS and name not in TOKEN_STEPS]
+        if unknown:
+            raise ValueError(f"Unknown text pipeline steps: {', '.join(unknown)}")
+        self.text_steps = [TEXT_STEPS[name] for name in self.names if name in TEXT_STEPS]
+        self.token_steps = [TOKEN_STEPS[name] for name in self.names if name in TOKEN_STEPS]
+
+    @property
+    def signature(self):
+        return ','.join(self.names)
+
+    def __call__(self, text):
+        for step in self.text_steps:
+            text = step(text)
+        tokens = TOKEN_RE.findall(text)
+        for step in self.token_steps:
+            tokens = step(tokens)
+        return ' '.join(tokens)
@@ -0,0 +1,162 @@
+"""
+Операции с балансом пользователей.
+
+Баланс меняется только здесь: выражением UPDATE ... SET balance = balance + amount (F()) внутри transaction.atomic
+с записью в журнал BalanceTransaction. Параллельные начисления и списания не теряют обновлений,
+а операции с ключом идемпотентности не выполняются повторно.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import User, BalanceTransaction, PromoCode, PromoCodeActivation, PseudoNames, UserPseudoName
+
+
+class LedgerError(Exception):
+    """Операция отклонена; code передается клиенту API вместе с текстом ошибки"""
+    code = 'ledger_error'
+
+
+class UserNotFound(LedgerError):
+    code = 'user_not_found'
+
+
+class InsufficientFunds(LedgerError):
+    code = 'insufficient_funds'
+
+
+class PromoCodeUnavailable(LedgerError):
+    code = 'promo_code_unavailable'
+
+
+class AlreadyActivated(LedgerError):
+    code = 'already_activated'
+
+
+class PseudoNameUnavailable(LedgerError):
+    code = 'pseudo_unavailable'
+
+
+class AlreadyOwned(LedgerError):
+    code = 'already_owned'
+
+
+def to_amount(value):
+    """Сумма в Decimal с точностью до копейки; ValueError для нечисловых значений"""
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except ArithmeticError:
+        raise ValueError(f"Invalid amount: {value!r}")
+
+
+def apply_transaction(user_id, amount, kind, reference='', idempotency_key=None):
+    """
+    Изменяет баланс пользователя на amount и записывает операцию в журнал.
+    Списание (amount < 0) выполняется, только если хватает средств: условие balance >= -amount
+    проверяется в том же UPDATE, поэтому баланс не уходит в минус и при параллельных списаниях.
+    Повтор с тем же idempotency_key не меняет баланс и возвращает исходную операцию.
+
+    Возвращает (BalanceTransaction, создана ли операция сейчас).
+    """
+    amount = to_amount(amount)
+    if idempotency_key:
+        existing = BalanceTransaction.objects.filter(idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing, False
+    try:
+        with transaction.atomic():
+            users = User.objects.filter(id=user_id)
+            if amount < 0:
+                users = users.filter(balance__gte=-amount)
+            if not users.update(balance=F('balance') + amount):
+                if not User.objects.filter(id=user_id).exists():
+                    raise UserNotFound(f"User {user_id} not found")
+                raise InsufficientFunds('Insufficient balance')
+            # Строка пользователя заблокирована нашим UPDATE до конца транзакции, поэтому прочитанный баланс точный
+            balance_after = User.objects.filter(id=user_id).values_list('balance', flat=True).get()
+            entry = BalanceTransaction.objects.create(
+                user_id=user_id, amount=amount, balance_after=balance_after,
+                kind=kind, reference=reference, idempotency_key=idempotency_key,
+            )
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел раньше — наша транзакция откатилась целиком
+        if idempotency_key:
+            existing = BalanceTransaction.objects.filter(idempotency_key=idempotency_key).first()
+            if existing is not None:
+                return existing, False
+        raise
+    return entry, True
+
+
+def set_balance(user_id, balance, kind=BalanceTransaction.KIND_ADMIN_SET, reference=''):
+    """Устанавливает баланс (админская операция); в журнал пишется разница со старым значением"""
+    balance = to_amount(balance)
+    with transaction.atomic():
+        try:
+            user = User.objects.select_for_update().get(id=user_id)
+        except User.DoesNotExist:
+            raise UserNotFound(f"User {user_id} not found")
+        delta = balance - user.balance
+        User.objects.filter(id=user_id).update(balance=balance)
+        return BalanceTransaction.objects.create(
+            user_id=user_id, amount=delta, balance_after=balance, kind=kind, reference=reference,
+        )
+
+
+def activate_promo_code(user_id, promo_code_id):
+    """
+    Активирует промокод и начисляет награду в одной транзакции.
+    Строка промокода блокируется (select_for_update), поэтому лимит max_uses не превышается при параллельных активациях.
+
+    Возвращает (PromoCodeActivation, BalanceTransaction).
+    """
+    with transaction.atomic():
+        try:
+            promo_code = PromoCode.objects.select_for_update().get(id=promo_code_id)
+        except PromoCode.DoesNotExist:
+            raise PromoCodeUnavailable('Promo code not found')
+        if not promo_code.can_be_used:
+            raise PromoCodeUnavailable('Promo code is inactive, expired or used up')
+        if PromoCodeActivation.objects.filter(user_id=user_id, promo_code=promo_code).exists():
+            raise AlreadyActivated('Promo code already activated by this user')
+        try:
+            with transaction.atomic():
+                activation = PromoCodeActivation.objects.create(
+                    user_id=user_id, promo_code=promo_code, reward_amount=promo_code.reward_amount,
+                )
+        except IntegrityError:
+            raise AlreadyActivated('Promo code already activated by this user')
+        PromoCode.objects.filter(id=promo_code.id).update(current_uses=F('current_uses') + 1)
+        entry, _ = apply_transaction(
+            user_id, promo_code.reward_amount, BalanceTransaction.KIND_PROMO,
+            reference=f'promo_codes:{promo_code.id}',
+            idempotency_key=f'promo_codes:{promo_code.id}:user:{user_id}',
+        )
+    return activation, entry
+
+
+def purchase_pseudo_name(user_id, pseudo_id):
+    """
+    Покупка псевдонима: списание цены и привязка псевдонима к пользователю в одной транзакции.
+    Если привязка не удалась (в т.ч. параллельная покупка того же псевдонима), списание откатывается вместе с ней.
+
+    Возвращает (UserPseudoName, PseudoNames, BalanceTransaction).
+    """
+    try:
+        pseudo = PseudoNames.objects.get(id=pseudo_id)
+    except PseudoNames.DoesNotExist:
+        raise PseudoNameUnavailable('Pseudo name not found')
+    if not pseudo.is_available:
+        raise PseudoNameUnavailable('Pseudo name is not available')
+    if UserPseudoName.objects.filter(user_id=user_id, pseudo_name=pseudo).exists():
+        raise AlreadyOwned('Pseudo name already owned')
+    try:
+        with transaction.atomic():
+            entry, _ = apply_transaction(
+                user_id, -pseudo.price, BalanceTransaction.KIND_PURCHASE, reference=f'pseudo_names:{pseudo.id}',
+            )
+            owned = UserPseudoName.objects.create(user_id=user_id, pseudo_name=pseudo)
+    except IntegrityError:
+        raise AlreadyOwned('Pseudo name already owned')
+    return owned, pseudo, entry
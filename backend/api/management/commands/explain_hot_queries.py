@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.models import Post, AskPost, Comment, AskComment, User
+
+# Признаки использования индекса в планах PostgreSQL и SQLite
+INDEX_MARKERS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan', 'USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY')
+
+
+def hot_queries():
+    """
+    Запросы, которые боты выполняют чаще всего (см. db/wapi.py и SugQueue.py).
+    Возвращает список (название, queryset).
+    """
+    author_id = User.objects.values_list('id', flat=True).first() or 0
+    queries = []
+    for model, prefix in ((Post, 'posts'), (AskPost, 'ask-posts')):
+        queries += [
+            (f'{prefix}: очередь (is_posted=false, is_rejected=false, ordering=posted_at)',
+             model.objects.filter(is_posted=False, is_rejected=False).order_by('posted_at', 'id')),
+            (f'{prefix}: последний опубликованный (ordering=-channel_posted_at)',
+             model.objects.filter(is_posted=True, channel_posted_at__isnull=False).order_by('-channel_posted_at')[:1]),
+            (f'{prefix}: посты автора (author=...)',
+             model.objects.filter(author_id=author_id).order_by('-posted_at')),
+            (f'{prefix}: пост по telegram_id',
+             model.objects.filter(telegram_id=0)),
+        ]
+    for model, prefix in ((Comment, 'comments'), (AskComment, 'ask-comments')):
+        queries += [
+            (f'{prefix}: комментарии к посту (post=...)',
+             model.objects.filter(reply_to=0).order_by('-created_at')),
+            (f'{prefix}: комментарий по telegram_id',
+             model.objects.filter(telegram_id=0)),
+        ]
+    return queries
+
+
+class Command(BaseCommand):
+    help = 'Выполняет EXPLAIN для горячих запросов ботов и показывает, используют ли они индексы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (только PostgreSQL)')
+        parser.add_argument('--no-seqscan', action='store_true',
+                            help='Запретить seq scan (PostgreSQL), чтобы проверить, что индекс применим даже на маленьких таблицах')
+        parser.add_argument('--plans', action='store_true', help='Печатать полный план каждого запроса')
+
+    def handle(self, *args, **options):
+        is_postgres = connection.vendor == 'postgresql'
+        explain_options = {'analyze': True} if options['analyze'] and is_postgres else {}
+        missing = 0
+
+        with transaction.atomic():
+            if options['no_seqscan'] and is_postgres:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in hot_queries():
+                plan = queryset.explain(**explain_options)
+                uses_index = any(marker in plan for marker in INDEX_MARKERS)
+                if uses_index:
+                    self.stdout.write(self.style.SUCCESS(f'[index]   {name}'))
+                else:
+                    missing += 1
+                    self.stdout.write(self.style.WARNING(f'[no index] {name}'))
+                if options['plans'] or not uses_index:
+                    self.stdout.write(plan)
+                    self.stdout.write('')
+
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{missing} запрос(ов) без индекса. На маленьких таблицах планировщик может '
+                                                 f'предпочесть seq scan — проверьте с --no-seqscan.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Все горячие запросы используют индексы'))
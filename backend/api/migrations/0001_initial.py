@@ -0,0 +1,211 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PseudoNames',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('pseudo', models.CharField(max_length=100, unique=True)),
+                ('is_available', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Pseudo Name',
+                'verbose_name_plural': 'Pseudo Names',
+                'db_table': 'pseudo_names',
+                'ordering': ['pseudo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('username', models.CharField(blank=True, max_length=150, null=True)),
+                ('firstname', models.CharField(blank=True, max_length=100, null=True)),
+                ('lastname', models.CharField(blank=True, max_length=100, null=True)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('level', models.IntegerField(default=1, help_text='Уровень пользователя от 1 до 10')),
+                ('is_admin', models.BooleanField(default=False)),
+                ('is_banned', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'User',
+                'verbose_name_plural': 'Users',
+                'db_table': 'users',
+            },
+        ),
+        migrations.CreateModel(
+            name='PromoCode',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('code', models.CharField(help_text='Код промокода (например: nuke_123)', max_length=50, unique=True)),
+                ('description', models.TextField(blank=True, help_text='Описание промокода')),
+                ('reward_amount', models.DecimalField(decimal_places=2, default=0, help_text='Сумма награды в токенах', max_digits=12)),
+                ('max_uses', models.IntegerField(default=1, help_text='Максимальное количество использований (0 = безлимит)')),
+                ('current_uses', models.IntegerField(default=0, help_text='Текущее количество использований')),
+                ('is_active', models.BooleanField(default=True, help_text='Активен ли промокод')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='Дата истечения промокода (null = бессрочно)', null=True)),
+                ('created_by', models.ForeignKey(blank=True, help_text='Кто создал промокод', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_promo_codes', to='api.user')),
+            ],
+            options={
+                'verbose_name': 'Promo Code',
+                'verbose_name_plural': 'Promo Codes',
+                'db_table': 'promo_codes',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Post',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('media_type', models.CharField(blank=True, max_length=32, null=True)),
+                ('posted_at', models.DateTimeField()),
+                ('is_rejected', models.BooleanField(default=False)),
+                ('is_posted', models.BooleanField(default=False)),
+                ('telegram_id', models.BigIntegerField(blank=True, null=True, unique=True)),
+                ('channel_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('channel_posted_at', models.DateTimeField(blank=True, null=True)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.user')),
+            ],
+            options={
+                'db_table': 'posts',
+                'ordering': ['-posted_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('reply_to', models.BigIntegerField(blank=True, help_text='ID тг-поста или комментария, на который идет ответ', null=True)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('telegram_id', models.BigIntegerField(blank=True, null=True, unique=True)),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='comments', to='api.user')),
+            ],
+            options={
+                'verbose_name': 'Comment',
+                'verbose_name_plural': 'Comments',
+                'db_table': 'comments',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AuthCredential',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('passwd_hash', models.TextField(blank=True, default=None, null=True)),
+                ('last_passwd_change', models.DateTimeField(null=True)),
+                ('auth_method', models.CharField(default='tg-password', max_length=32)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='api.user')),
+            ],
+            options={
+                'verbose_name': 'Authentication Credential',
+                'verbose_name_plural': 'Authentication Credentials',
+                'db_table': 'auth_credentials',
+            },
+        ),
+        migrations.CreateModel(
+            name='AskPost',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('media_type', models.CharField(blank=True, max_length=32, null=True)),
+                ('posted_at', models.DateTimeField()),
+                ('is_rejected', models.BooleanField(default=False)),
+                ('is_posted', models.BooleanField(default=False)),
+                ('telegram_id', models.BigIntegerField(blank=True, null=True, unique=True)),
+                ('channel_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('channel_posted_at', models.DateTimeField(blank=True, null=True)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.user')),
+            ],
+            options={
+                'db_table': 'ask_posts',
+                'ordering': ['-posted_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='AskComment',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('reply_to', models.BigIntegerField(blank=True, help_text='ID тг-поста или комментария, на который идет ответ', null=True)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('telegram_id', models.BigIntegerField(blank=True, null=True, unique=True)),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.user')),
+            ],
+            options={
+                'verbose_name': 'Ask Comment',
+                'verbose_name_plural': 'Ask Comments',
+                'db_table': 'ask_comments',
+                'ordering': ['-created_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PromoCodeActivation',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('activated_at', models.DateTimeField(auto_now_add=True)),
+                ('reward_amount', models.DecimalField(decimal_places=2, default=0, help_text='Сумма награды, полученная при активации', max_digits=12)),
+                ('promo_code', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activations', to='api.promocode')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promo_code_activations', to='api.user')),
+            ],
+            options={
+                'verbose_name': 'Promo Code Activation',
+                'verbose_name_plural': 'Promo Code Activations',
+                'db_table': 'promo_code_activations',
+                'ordering': ['-activated_at'],
+                'unique_together': {('user', 'promo_code')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LoginToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('is_used', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.user')),
+            ],
+            options={
+                'verbose_name': 'Login Token',
+                'verbose_name_plural': 'Login Tokens',
+                'db_table': 'login_tokens',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['token'], name='login_token_token_6da045_idx'), models.Index(fields=['expires_at'], name='login_token_expires_133cb3_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserPseudoName',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('purchase_date', models.DateTimeField(auto_now_add=True)),
+                ('pseudo_name', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_pseudo_names', to='api.pseudonames')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pseudo_names', to='api.user')),
+            ],
+            options={
+                'db_table': 'user_pseudo_names',
+                'unique_together': {('user', 'pseudo_name')},
+            },
+        ),
+    ]
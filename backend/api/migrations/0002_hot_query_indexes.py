@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='askcomment',
+            index=models.Index(fields=['reply_to', 'created_at'], name='askcomment_reply_to_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='askpost',
+            index=models.Index(condition=models.Q(('is_posted', False), ('is_rejected', False)), fields=['posted_at', 'id'], name='askpost_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='askpost',
+            index=models.Index(condition=models.Q(('is_posted', True)), fields=['channel_posted_at'], name='askpost_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='askpost',
+            index=models.Index(fields=['author', 'posted_at'], name='askpost_author_posted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['reply_to', 'created_at'], name='comment_reply_to_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_posted', False), ('is_rejected', False)), fields=['posted_at', 'id'], name='post_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_posted', True)), fields=['channel_posted_at'], name='post_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'posted_at'], name='post_author_posted_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='askcomment',
+            index=models.Index(fields=['created_at', 'id'], name='askcomment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='askpost',
+            index=models.Index(fields=['posted_at', 'id'], name='askpost_posted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['posted_at', 'id'], name='post_posted_at_idx'),
+        ),
+    ]
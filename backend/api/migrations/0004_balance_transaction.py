@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceTransaction',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Изменение баланса (отрицательное — списание)', max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, help_text='Баланс после операции', max_digits=12)),
+                ('kind', models.CharField(choices=[('post_payment', 'Оплата поста'), ('purchase', 'Покупка'), ('promo', 'Промокод'), ('admin_add', 'Начисление администратором'), ('admin_set', 'Установка баланса администратором')], max_length=32)),
+                ('reference', models.CharField(blank=True, default='', help_text='Объект операции, например posts:42', max_length=100)),
+                ('idempotency_key', models.CharField(blank=True, help_text='Повтор операции с тем же ключом не меняет баланс', max_length=100, null=True, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_transactions', to='api.user')),
+            ],
+            options={
+                'verbose_name': 'Balance Transaction',
+                'verbose_name_plural': 'Balance Transactions',
+                'db_table': 'balance_transactions',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='balance_tx_user_idx')],
+            },
+        ),
+    ]
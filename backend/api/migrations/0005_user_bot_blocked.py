@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_balance_transaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='askmephi_bot_blocked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='whisper_bot_blocked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 
 ###########################################################################################
 
@@ -17,6 +18,9 @@ class User(models.Model):
    
     is_admin = models.BooleanField(default=False)
     is_banned = models.BooleanField(default=False)
+    # Пользователь заблокировал бота или удалил аккаунт (выставляется рассылкой, сбрасывается при обращении к боту)
+    whisper_bot_blocked = models.BooleanField(default=False)
+    askmephi_bot_blocked = models.BooleanField(default=False)
 
     
     class Meta:
@@ -51,6 +55,18 @@ class AbstractBasePost(models.Model):
     class Meta:
         abstract = True
         ordering = ['-posted_at']
+        indexes = [
+            # Очередь: is_posted=false & is_rejected=false, сортировка по posted_at
+            models.Index(fields=['posted_at', 'id'], name='%(class)s_queue_idx',
+                         condition=Q(is_posted=False, is_rejected=False)),
+            # Последний опубликованный пост: is_posted=true, сортировка по -channel_posted_at
+            models.Index(fields=['channel_posted_at'], name='%(class)s_published_idx',
+                         condition=Q(is_posted=True)),
+            # Посты автора (/stats, комментарии к постам автора)
+            models.Index(fields=['author', 'posted_at'], name='%(class)s_author_posted_idx'),
+            # Keyset-пагинация по (posted_at, id)
+            models.Index(fields=['posted_at', 'id'], name='%(class)s_posted_at_idx'),
+        ]
 
 """
 =====================================
@@ -86,6 +102,12 @@ class AbstractBaseComment(models.Model):
     class Meta:
         abstract = True
         ordering = ['-created_at']
+        indexes = [
+            # Комментарии к посту: фильтр по reply_to, сортировка по created_at
+            models.Index(fields=['reply_to', 'created_at'], name='%(class)s_reply_to_idx'),
+            # Keyset-пагинация по (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='%(class)s_created_idx'),
+        ]
 
 """
 =====================================
@@ -152,6 +174,10 @@ class Comment(models.Model):
     class Meta:
         db_table = "comments"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['reply_to', 'created_at'], name='comment_reply_to_idx'),
+            models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ]
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
 
@@ -242,4 +268,44 @@ class PromoCodeActivation(models.Model):
             # Устанавливаем reward_amount из промокода, если не задан
             if not self.reward_amount:
                 self.reward_amount = self.promo_code.reward_amount
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        super().save(*args, **kwargs) 
+
+class BalanceTransaction(models.Model):
+    """
+    Журнал операций с балансом (только добавление записей).
+    Баланс пользователя и запись журнала меняются в одной транзакции, см. api/ledger.py.
+    """
+    KIND_POST_PAYMENT = 'post_payment'
+    KIND_PURCHASE = 'purchase'
+    KIND_PROMO = 'promo'
+    KIND_ADMIN_ADD = 'admin_add'
+    KIND_ADMIN_SET = 'admin_set'
+    KIND_CHOICES = [
+        (KIND_POST_PAYMENT, 'Оплата поста'),
+        (KIND_PURCHASE, 'Покупка'),
+        (KIND_PROMO, 'Промокод'),
+        (KIND_ADMIN_ADD, 'Начисление администратором'),
+        (KIND_ADMIN_SET, 'Установка баланса администратором'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_transactions')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, help_text='Изменение баланса (отрицательное — списание)')
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, help_text='Баланс после операции')
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    reference = models.CharField(max_length=100, blank=True, default='', help_text='Объект операции, например posts:42')
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True,
+                                       help_text='Повтор операции с тем же ключом не меняет баланс')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "balance_transactions"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='balance_tx_user_idx'),
+        ]
+        verbose_name = "Balance Transaction"
+        verbose_name_plural = "Balance Transactions"
+
+    def __str__(self):
+        return f"{self.user_id} {self.amount:+} ({self.kind})"
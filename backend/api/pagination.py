@@ -0,0 +1,141 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+MAX_PAGE_SIZE = 1000
+
+
+class StandardPagination(PageNumberPagination):
+    """Постраничная выдача по номеру страницы; page_size задается клиентом, но не больше MAX_PAGE_SIZE"""
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация: курсор хранит (значение поля сортировки, id) последней строки страницы,
+    следующая страница выбирается условием WHERE (field, id) > (value, last_id) по индексу, без OFFSET и COUNT.
+    Полный проход по таблице линейный, а вставки во время обхода не сдвигают страницы.
+
+    Сортировка берется из параметра ordering и должна входить в view.keyset_ordering_fields
+    (по умолчанию view.keyset_default_ordering); id всегда добавляется вторым ключом.
+    Строки с NULL в поле сортировки в такую выдачу не попадают.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = MAX_PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, request, view):
+        ordering = request.query_params.get('ordering') or view.keyset_default_ordering
+        if ordering.lstrip('-') not in view.keyset_ordering_fields:
+            raise ValidationError({'ordering': f"Cursor pagination supports ordering by: {', '.join(view.keyset_ordering_fields)}"})
+        return ordering.lstrip('-'), ordering.startswith('-')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError):
+            raise ValidationError({'cursor': 'Invalid cursor'})
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        field, descending = self.get_ordering(request, view)
+        page_size = self.get_page_size(request)
+        queryset = queryset.filter(**{f'{field}__isnull': False})
+        position = self.decode_cursor(request)
+        if position is not None:
+            value = position.get('value')
+            if field != 'id':
+                value = parse_datetime(value) if isinstance(value, str) else value
+            if value is None or not isinstance(position.get('id'), int):
+                raise ValidationError({'cursor': 'Invalid cursor'})
+            op = 'lt' if descending else 'gt'
+            queryset = queryset.filter(Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': position['id']}))
+        if field == 'id':
+            queryset = queryset.order_by('-id' if descending else 'id')
+        else:
+            queryset = queryset.order_by(f'-{field}' if descending else field, '-id' if descending else 'id')
+        # Одна лишняя строка показывает, есть ли следующая страница
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_position = None
+        if self.has_next:
+            last = rows[-1]
+            value = getattr(last, field)
+            self.next_position = {'value': value.isoformat() if hasattr(value, 'isoformat') else value, 'id': last.id}
+        return rows
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class HybridPagination(BasePagination):
+    """
+    Пагинация по умолчанию для API: с параметром cursor (в т.ч. пустым — первая страница)
+    и у вьюсетов с keyset_ordering_fields — KeysetPagination, иначе StandardPagination.
+    Старые клиенты с page/page_size продолжают работать без изменений.
+    """
+
+    def __init__(self):
+        self.paginator = StandardPagination()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params and getattr(view, 'keyset_ordering_fields', None):
+            self.paginator = KeysetPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.paginator.get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    @property
+    def display_page_controls(self):
+        return self.paginator.display_page_controls
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+
+MOSCOW_TZ = ZoneInfo('Europe/Moscow')
+QUEUE_INTERVAL_MINUTES = 30
+QUIET_HOURS_START = 1   # 01:00 по Москве
+QUIET_HOURS_END = 10    # 10:00 по Москве
+
+
+def next_queue_slot(prev_time, interval_minutes=QUEUE_INTERVAL_MINUTES):
+    """
+    Возвращает следующий слот публикации: prev_time + interval.
+    Если слот попадает в неактивный период (01:00-10:00 по Москве), он переносится на 10:00 того же дня.
+    """
+    next_time = prev_time + timedelta(minutes=interval_minutes)
+    next_time_moscow = next_time.astimezone(MOSCOW_TZ)
+    if QUIET_HOURS_START <= next_time_moscow.hour < QUIET_HOURS_END:
+        next_time_moscow = next_time_moscow.replace(hour=QUIET_HOURS_END, minute=0, second=0, microsecond=0)
+        next_time = next_time_moscow.astimezone(timezone.utc)
+    return next_time
+
+
+def reschedule_queue(model, ordering=('posted_at', 'id'), interval_minutes=QUEUE_INTERVAL_MINUTES):
+    """
+    Пересобирает очередь постов модели без дыр в одной транзакции.
+
+    Первый пост очереди получает слот после channel_posted_at последнего опубликованного поста
+    (или после текущего времени, если опубликованных нет), каждый следующий — слот после предыдущего.
+    Измененные посты сохраняются одним bulk UPDATE.
+
+    Возвращает:
+        tuple: (посты очереди в новом порядке, количество измененных постов)
+    """
+    with transaction.atomic():
+        queued_posts = list(
+            model.objects.select_for_update()
+            .filter(is_posted=False, is_rejected=False)
+            .order_by(*ordering)
+        )
+        last_published_at = (
+            model.objects.filter(is_posted=True, channel_posted_at__isnull=False)
+            .order_by('-channel_posted_at')
+            .values_list('channel_posted_at', flat=True)
+            .first()
+        )
+        prev_time = (last_published_at or datetime.now(timezone.utc)).replace(microsecond=0)
+
+        changed = []
+        for post in queued_posts:
+            prev_time = next_queue_slot(prev_time, interval_minutes)
+            if post.posted_at != prev_time:
+                post.posted_at = prev_time
+                changed.append(post)
+
+        if changed:
+            model.objects.bulk_update(changed, ['posted_at'])
+    return queued_posts, len(changed)
@@ -1,13 +1,48 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import User, Comment, Post, PseudoNames, UserPseudoName, PromoCode, PromoCodeActivation
-from .models import AskPost, AskComment
+from .models import AskPost, AskComment, BalanceTransaction
+
+def select_fields(names, query_params):
+    """
+    Sparse fieldsets: ?fields=id,telegram_id,posted_at оставляет только перечисленные поля,
+    ?exclude=content,author_details убирает перечисленные. Возвращает отфильтрованные names в исходном порядке.
+    """
+    only = query_params.get('fields')
+    exclude = query_params.get('exclude')
+    if only:
+        allowed = {name.strip() for name in only.split(',')}
+        names = [name for name in names if name in allowed]
+    if exclude:
+        excluded = {name.strip() for name in exclude.split(',')}
+        names = [name for name in names if name not in excluded]
+    return names
+
+
+class DynamicFieldsMixin:
+    """
+    Поддержка ?fields= / ?exclude= (см. select_fields). Применяется только к корневому сериализатору
+    ответа на GET-запрос: вложенные сериализаторы и валидация входных данных не затрагиваются.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return fields
+        root = self.root
+        if self is not root and not (isinstance(self.parent, serializers.ListSerializer) and self.parent is root):
+            return fields
+        return {name: fields[name] for name in select_fields(list(fields), request.query_params)}
+
 
 ######################################  USERS BLOCK  ##############################################
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'firstname', 'lastname', 'balance', 'level', 'is_admin', 'is_banned']
+        fields = ['id', 'username', 'firstname', 'lastname', 'balance', 'level', 'is_admin', 'is_banned',
+                  'whisper_bot_blocked', 'askmephi_bot_blocked']
         read_only_fields = ['balance', 'level', 'is_banned']
 
 
@@ -17,7 +52,7 @@ class UserSerializer(serializers.ModelSerializer):
 Basic posts serializer
 ==================================
 """
-class AbstractBasePostSerializer(serializers.ModelSerializer):
+class AbstractBasePostSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     author_details = UserSerializer(source='author', read_only=True)
 
@@ -50,7 +85,7 @@ class PostSerializer(AbstractBasePostSerializer):
 Basic comments serializer
 ==================================
 """
-class AbstractBaseCommentSerializer(serializers.ModelSerializer):
+class AbstractBaseCommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     author_details = UserSerializer(source='author', read_only=True)
 
@@ -75,21 +110,22 @@ class AskCommentSerializer(AbstractBaseCommentSerializer):
 
 ###############################################################################################################
 
-class PseudoNameSerializer(serializers.ModelSerializer):
+class PseudoNameSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = PseudoNames
         fields = ['id', 'pseudo', 'price', 'is_available']
 
-class UserPseudoNameSerializer(serializers.ModelSerializer):
+class UserPseudoNameSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     pseudo_name = serializers.PrimaryKeyRelatedField(queryset=PseudoNames.objects.all())
+    pseudo = serializers.CharField(source='pseudo_name.pseudo', read_only=True)
     
     class Meta:
         model = UserPseudoName
-        fields = ['id', 'user', 'pseudo_name', 'purchase_date']
+        fields = ['id', 'user', 'pseudo_name', 'pseudo', 'purchase_date']
         read_only_fields = ['purchase_date']
 
-class PromoCodeSerializer(serializers.ModelSerializer):
+class PromoCodeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
     
     class Meta:
@@ -98,7 +134,7 @@ class PromoCodeSerializer(serializers.ModelSerializer):
                  'is_active', 'created_at', 'expires_at', 'created_by']
         read_only_fields = ['created_at', 'created_by']
 
-class PromoCodeActivationSerializer(serializers.ModelSerializer):
+class PromoCodeActivationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     promo_code = serializers.PrimaryKeyRelatedField(queryset=PromoCode.objects.all())
     user_details = UserSerializer(source='user', read_only=True)
@@ -115,3 +151,9 @@ class PromoCodeActivationSerializer(serializers.ModelSerializer):
         promo_code = validated_data['promo_code']
         validated_data['reward_amount'] = promo_code.reward_amount
         return super().create(validated_data)
+
+class BalanceTransactionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = BalanceTransaction
+        fields = ['id', 'user', 'amount', 'balance_after', 'kind', 'reference', 'created_at']
+        read_only_fields = fields
@@ -1,3 +1,333 @@
-from django.test import TestCase
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from .models import User, Post, AskPost, Comment, AskComment, PromoCode, PromoCodeActivation, PseudoNames, UserPseudoName, BalanceTransaction
+
+
+class ListQueryCountTests(TestCase):
+    """
+    Регрессионные тесты на N+1: количество запросов списочных эндпоинтов
+    не должно зависеть от количества записей (авторы подгружаются через JOIN).
+    Пагинация дает 2 запроса: COUNT и SELECT страницы.
+    """
+
+    ROWS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(id=1000 + i, username=f'user{i}', firstname='Имя', lastname='Фамилия')
+            for i in range(cls.ROWS)
+        ]
+        now = datetime.now(timezone.utc)
+        for i, user in enumerate(cls.users):
+            Post.objects.create(author=user, content=f'post {i}', posted_at=now + timedelta(minutes=30 * i), telegram_id=100 + i)
+            AskPost.objects.create(author=user, content=f'ask {i}', posted_at=now + timedelta(minutes=30 * i), telegram_id=200 + i)
+            Comment.objects.create(author=user, content=f'comment {i}', reply_to=100, telegram_id=300 + i)
+            AskComment.objects.create(author=user, content=f'ask comment {i}', reply_to=200, telegram_id=400 + i)
+            promo_code = PromoCode.objects.create(code=f'code{i}', reward_amount=10, created_by=user)
+            PromoCodeActivation.objects.create(user=user, promo_code=promo_code, reward_amount=10)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertListQueries(self, url, num):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), self.ROWS)
+        return response
+
+    def test_posts_list(self):
+        response = self.assertListQueries('/api/posts/', 2)
+        self.assertEqual(response.json()['results'][0]['author_details']['username'], 'user4')
+
+    def test_posts_list_filtered(self):
+        self.assertListQueries('/api/posts/?is_posted=false&is_rejected=false&ordering=posted_at&page_size=1000', 2)
+
+    def test_ask_posts_list(self):
+        self.assertListQueries('/api/ask-posts/', 2)
+
+    def test_comments_list(self):
+        self.assertListQueries('/api/comments/?post=100', 2)
+
+    def test_ask_comments_list(self):
+        self.assertListQueries('/api/ask-comments/', 2)
+
+    def test_promo_codes_list(self):
+        self.assertListQueries('/api/promo-codes/', 2)
+
+    def test_promo_code_activations_list(self):
+        response = self.assertListQueries('/api/promo-code-activations/', 2)
+        activation = response.json()['results'][0]
+        self.assertIsNotNone(activation['promo_code_details']['created_by'])
+
+
+class StatsEndpointTests(TestCase):
+    """
+    Агрегирующие эндпоинты считают через COUNT/GROUP BY и не зависят от размера таблиц.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(id=1, username='author')
+        cls.other = User.objects.create(id=2, username='other')
+        now = datetime.now(timezone.utc)
+        Post.objects.create(author=cls.author, content='posted', posted_at=now, is_posted=True, telegram_id=10)
+        Post.objects.create(author=cls.author, content='rejected', posted_at=now, is_rejected=True, telegram_id=11)
+        Post.objects.create(author=cls.author, content='queued', posted_at=now, telegram_id=12)
+        Post.objects.create(author=cls.other, content='queued', posted_at=now, telegram_id=13)
+        for telegram_id, reply_to in ((100, 10), (101, 10), (102, 12), (103, 13)):
+            Comment.objects.create(author=cls.other, content='comment', reply_to=reply_to, telegram_id=telegram_id)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_posts_stats_global(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/stats/')
+        self.assertEqual(response.json(), {'total': 4, 'posted': 1, 'rejected': 1, 'queued': 2})
+
+    def test_posts_stats_by_author(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/posts/stats/?author=1')
+        data = response.json()
+        self.assertEqual((data['total'], data['posted'], data['rejected'], data['queued']), (3, 1, 1, 1))
+        self.assertEqual(data['comments'], 3)
+
+    def test_non_numeric_author_is_rejected(self):
+        self.assertEqual(self.client.get('/api/posts/stats/?author=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/?author=abc').status_code, 400)
+
+    def test_comments_stats_per_post(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/comments/stats/?post=10,12,99')
+        self.assertEqual(response.json(), {'total': 4, 'per_post': {'10': 2, '12': 1, '99': 0}})
+
+    def test_ask_posts_stats(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ask-posts/stats/')
+        self.assertEqual(response.json()['total'], 0)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Keyset-пагинация (?cursor=) проходит таблицу без пропусков и повторов даже при одинаковых posted_at,
+    а page_size в обоих режимах ограничен сверху.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(id=1, username='author')
+        now = datetime.now(timezone.utc)
+        for i in range(7):
+            # Пары постов с одинаковым posted_at проверяют второй ключ сортировки (id)
+            Post.objects.create(author=author, content=f'post {i}', posted_at=now + timedelta(minutes=i // 2), telegram_id=10 + i)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def collect(self, url):
+        ids, pages = [], 0
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            ids += [post['id'] for post in data['results']]
+            url = data['next']
+            pages += 1
+        return ids, pages
+
+    def test_cursor_walks_all_rows_in_order(self):
+        ids, pages = self.collect('/api/posts/?cursor=&page_size=2&ordering=posted_at')
+        expected = list(Post.objects.order_by('posted_at', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_cursor_descending(self):
+        ids, _ = self.collect('/api/posts/?cursor=&page_size=3')
+        self.assertEqual(ids, list(Post.objects.order_by('-posted_at', '-id').values_list('id', flat=True)))
+
+    def test_cursor_rejects_unknown_ordering(self):
+        self.assertEqual(self.client.get('/api/posts/?cursor=&ordering=content').status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/?cursor=abc').status_code, 400)
+
+    def test_page_size_param_is_honoured_and_capped(self):
+        self.assertEqual(len(self.client.get('/api/posts/?page=1&page_size=2').json()['results']), 2)
+        self.assertEqual(len(self.client.get('/api/posts/?page_size=100000').json()['results']), 7)
+        self.assertEqual(len(self.client.get('/api/posts/?cursor=&page_size=100000').json()['results']), 7)
+
+
+class SparseFieldsTests(TestCase):
+    """
+    ?fields= / ?exclude= урезают корневой сериализатор, а action queue отдает очередь через values() одним запросом.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(id=1, username='author')
+        now = datetime.now(timezone.utc)
+        Post.objects.create(author=author, content='second', posted_at=now + timedelta(minutes=30), telegram_id=11)
+        Post.objects.create(author=author, content='first', posted_at=now, telegram_id=10)
+        Post.objects.create(author=author, content='posted', posted_at=now, is_posted=True, telegram_id=12)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_fields(self):
+        post = self.client.get('/api/posts/?fields=id,telegram_id,author_details').json()['results'][0]
+        self.assertEqual(set(post), {'id', 'telegram_id', 'author_details'})
+        # Вложенный сериализатор автора не урезается
+        self.assertIn('username', post['author_details'])
+
+    def test_exclude(self):
+        post = self.client.get('/api/posts/?exclude=content,author_details').json()['results'][0]
+        self.assertNotIn('content', post)
+        self.assertNotIn('author_details', post)
+        self.assertIn('posted_at', post)
+
+    def test_queue(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/posts/queue/').json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([post['telegram_id'] for post in data['results']], [10, 11])
+        self.assertEqual(data['results'][0]['author_username'], 'author')
+        slim = self.client.get('/api/posts/queue/?fields=id,telegram_id,posted_at').json()['results'][0]
+        self.assertEqual(set(slim), {'id', 'telegram_id', 'posted_at'})
+
+
+class LedgerTests(TestCase):
+    """
+    Операции с балансом: повторная оплата поста не начисляет дважды, покупка без средств ничего не меняет,
+    промокод начисляет награду один раз; каждая операция попадает в журнал.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(id=1, username='author', balance=20)
+        cls.post = Post.objects.create(author=cls.user, content='post', posted_at=datetime.now(timezone.utc),
+                                       telegram_id=10, channel_message_id=500)
+        cls.pseudo = PseudoNames.objects.create(pseudo='Тень', price=50)
+        cls.promo_code = PromoCode.objects.create(code='bonus', reward_amount=15, created_by=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_process_payment_is_idempotent(self):
+        first = self.client.post(f'/api/posts/{self.post.id}/process_payment/')
+        self.assertEqual(first.status_code, 200)
+        second = self.client.post(f'/api/posts/{self.post.id}/process_payment/')
+        self.assertEqual(second.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 20 + first.json()['tokens_added'])
+        self.assertEqual(BalanceTransaction.objects.filter(user=self.user, kind=BalanceTransaction.KIND_POST_PAYMENT).count(), 1)
+
+    def test_purchase_with_insufficient_funds(self):
+        response = self.client.post(f'/api/users/{self.user.id}/purchase_pseudo/', {'pseudo_name': self.pseudo.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['code'], 'insufficient_funds')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 20)
+        self.assertFalse(UserPseudoName.objects.filter(user=self.user).exists())
+
+    def test_purchase_debits_once(self):
+        User.objects.filter(id=self.user.id).update(balance=120)
+        response = self.client.post(f'/api/users/{self.user.id}/purchase_pseudo/', {'pseudo_name': self.pseudo.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['new_balance'], '70.00')
+        again = self.client.post(f'/api/users/{self.user.id}/purchase_pseudo/', {'pseudo_name': self.pseudo.id})
+        self.assertEqual(again.json()['code'], 'already_owned')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 70)
+
+    def test_promo_code_credits_once(self):
+        data = {'user': self.user.id, 'promo_code': self.promo_code.id}
+        response = self.client.post('/api/promo-code-activations/', data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['balance'], '35.00')
+        self.assertEqual(self.client.post('/api/promo-code-activations/', data).status_code, 400)
+        self.user.refresh_from_db()
+        self.promo_code.refresh_from_db()
+        self.assertEqual(self.user.balance, 35)
+        self.assertEqual(self.promo_code.current_uses, 1)
+        self.assertEqual(PromoCodeActivation.objects.filter(user=self.user).count(), 1)
+
+
+class PseudoNameTests(TestCase):
+    """Выдача псевдонимов по умолчанию одним запросом и ETag у каталога"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(id=1, username='author')
+        cls.pseudo = PseudoNames.objects.create(pseudo='Тень', price=50)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_ensure_default_pseudos_is_idempotent(self):
+        UserPseudoName.objects.create(user=self.user, pseudo_name=self.pseudo)
+        data = self.client.post(f'/api/users/{self.user.id}/ensure_default_pseudos/').json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([p['pseudo'] for p in data['pseudo_names']], ['Тень', 'Потный щитпостер', 'Секси имошница'])
+        again = self.client.post(f'/api/users/{self.user.id}/ensure_default_pseudos/').json()
+        self.assertEqual(again['created'], 0)
+        self.assertEqual(again['pseudo_names'], data['pseudo_names'])
+        self.assertEqual(self.client.post('/api/users/999/ensure_default_pseudos/').status_code, 404)
+
+    def test_pseudo_catalogue_etag(self):
+        response = self.client.get('/api/pseudo-names/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/pseudo-names/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        PseudoNames.objects.filter(id=self.pseudo.id).update(is_available=False)
+        changed = self.client.get('/api/pseudo-names/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+
+class UserBroadcastFilterTests(TestCase):
+    """Обход пользователей рассылкой: продолжение с id_after и пропуск заблокировавших бота"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for user_id in (1, 2, 3, 4):
+            User.objects.create(id=user_id, username=f'user{user_id}', whisper_bot_blocked=user_id == 3)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_id_after_and_blocked_filter(self):
+        data = self.client.get('/api/users/?cursor=&fields=id&id_after=1&whisper_bot_blocked=false').json()
+        self.assertEqual([user['id'] for user in data['results']], [2, 4])
+        self.assertEqual(self.client.get('/api/users/?id_after=abc').status_code, 400)
+
+    def test_flag_is_writable(self):
+        response = self.client.patch('/api/users/2/', {'whisper_bot_blocked': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(id=2).whisper_bot_blocked)
+
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+SHARED_LOGS_COPIES = [
+    REPO_ROOT / 'backend' / 'thewhisper' / 'logs.py',
+    REPO_ROOT / 'whisper_bot' / 'services' / 'logs.py',
+    REPO_ROOT / 'askmephi_bot' / 'services' / 'logs.py',
+]
+
+
+def shared_logs_block(path):
+    text = path.read_text(encoding='utf-8')
+    start = text.index('# --- Общий код:')
+    return text[start:text.index('# --- Конец общего кода ---', start)]
+
+
+@skipUnless(all(path.exists() for path in SHARED_LOGS_COPIES), 'bot sources are not available (backend image)')
+class SharedLogsCodeTests(SimpleTestCase):
+    """Общая часть модулей логирования (форматтер, выборка DEBUG, обработчик очереди) одинакова во всех сервисах"""
+
+    def test_copies_are_identical(self):
+        backend_block = shared_logs_block(SHARED_LOGS_COPIES[0])
+        for path in SHARED_LOGS_COPIES[1:]:
+            self.assertEqual(shared_logs_block(path), backend_block, f'{path} drifted from backend/thewhisper/logs.py')
@@ -1,12 +1,24 @@
+import hashlib
+import json
+import logging
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import User, Comment, Post, PseudoNames, UserPseudoName, PromoCode, PromoCodeActivation, AskPost, AskComment
-from .serializers import UserSerializer, CommentSerializer, PostSerializer, PseudoNameSerializer, UserPseudoNameSerializer, PromoCodeSerializer, PromoCodeActivationSerializer, AskPostSerializer, AskCommentSerializer
-from decimal import Decimal
-import decimal
+from rest_framework.exceptions import ValidationError
+from .models import User, Comment, Post, PseudoNames, UserPseudoName, PromoCode, PromoCodeActivation, AskPost, AskComment, BalanceTransaction
+from .serializers import select_fields, BalanceTransactionSerializer, UserSerializer, CommentSerializer, PostSerializer, PseudoNameSerializer, UserPseudoNameSerializer, PromoCodeSerializer, PromoCodeActivationSerializer, AskPostSerializer, AskCommentSerializer
 from datetime import datetime, timezone
 from django.conf import settings
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.fields import DateTimeField
+from .scheduling import reschedule_queue, QUEUE_INTERVAL_MINUTES
+from . import ledger
+
+logger = logging.getLogger(__name__)
 
 def get_tokens_by_level(level):
     """
@@ -21,6 +33,260 @@ def get_tokens_by_level(level):
     # Формула: базовые 5 токенов + 5 токенов за каждый уровень
     return 50 + (level - 1) * 50
 
+def reschedule_queue_response(request, model, ordering):
+    """
+    Общая реализация action reschedule_queue для PostViewSet и AskPostViewSet.
+    Принимает необязательный interval_minutes и возвращает новое расписание очереди.
+    """
+    try:
+        interval_minutes = int(request.data.get('interval_minutes', QUEUE_INTERVAL_MINUTES))
+    except (TypeError, ValueError):
+        return Response({'error': 'Invalid interval_minutes'}, status=status.HTTP_400_BAD_REQUEST)
+    if interval_minutes <= 0:
+        return Response({'error': 'interval_minutes must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+    posts, updated_count = reschedule_queue(model, ordering=ordering, interval_minutes=interval_minutes)
+    datetime_field = DateTimeField()
+    return Response({
+        'status': 'success',
+        'updated_count': updated_count,
+        'queued_count': len(posts),
+        'message': f'Updated {updated_count} posts in queue',
+        'schedule': [
+            {'id': post.id, 'telegram_id': post.telegram_id, 'posted_at': datetime_field.to_representation(post.posted_at)}
+            for post in posts
+        ],
+    })
+
+# Поля компактного представления очереди: имя в ответе -> поле для values()
+QUEUE_FIELDS = {
+    'id': 'id',
+    'author': 'author_id',
+    'author_username': 'author__username',
+    'telegram_id': 'telegram_id',
+    'posted_at': 'posted_at',
+    'media_type': 'media_type',
+    'content': 'content',
+}
+
+# Бесплатные псевдонимы, которые получает каждый пользователь (раньше их создавал бот)
+DEFAULT_PSEUDO_NAMES = ['Потный щитпостер', 'Секси имошница', 'Призрак Т-корпуса']
+MIN_OWNED_PSEUDO_NAMES = 3
+
+def owned_pseudo_names(user_id):
+    """Псевдонимы пользователя [{id, pseudo, price}] в порядке покупки — одним запросом"""
+    rows = (UserPseudoName.objects.filter(user_id=user_id)
+            .order_by('purchase_date', 'id')
+            .values_list('pseudo_name_id', 'pseudo_name__pseudo', 'pseudo_name__price'))
+    return [{'id': pseudo_id, 'pseudo': pseudo, 'price': str(price)} for pseudo_id, pseudo, price in rows]
+
+def ensure_default_pseudo_names(user_id):
+    """
+    Если у пользователя меньше MIN_OWNED_PSEUDO_NAMES псевдонимов, привязывает недостающие из DEFAULT_PSEUDO_NAMES
+    (создавая их с нулевой ценой). Выполняется в одной транзакции и безопасно при повторных вызовах.
+    Возвращает количество привязанных псевдонимов.
+    """
+    created = 0
+    with transaction.atomic():
+        owned = UserPseudoName.objects.filter(user_id=user_id).count()
+        for name in DEFAULT_PSEUDO_NAMES:
+            if owned >= MIN_OWNED_PSEUDO_NAMES:
+                break
+            pseudo, _ = PseudoNames.objects.get_or_create(pseudo=name, defaults={'price': 0})
+            _, linked = UserPseudoName.objects.get_or_create(user_id=user_id, pseudo_name=pseudo)
+            if linked:
+                owned += 1
+                created += 1
+    return created
+
+def queue_response(request, model):
+    """
+    Общая реализация action queue для PostViewSet и AskPostViewSet: посты в очереди по порядку публикации.
+    Строки читаются через values() без создания моделей и сериализаторов; поддерживаются ?fields= и ?exclude=.
+    """
+    names = select_fields(list(QUEUE_FIELDS), request.query_params) or ['id']
+    rows = (
+        model.objects.filter(is_posted=False, is_rejected=False)
+        .order_by('posted_at', 'id')
+        .values_list(*(QUEUE_FIELDS[name] for name in names))
+    )
+    datetime_field = DateTimeField()
+    results = []
+    for row in rows:
+        item = dict(zip(names, row))
+        if item.get('posted_at') is not None:
+            item['posted_at'] = datetime_field.to_representation(item['posted_at'])
+        results.append(item)
+    return Response({'count': len(results), 'results': results})
+
+def ledger_error_response(error, status_code=status.HTTP_400_BAD_REQUEST):
+    """Ответ API на отклоненную операцию с балансом: текст ошибки и машиночитаемый код"""
+    if isinstance(error, ledger.UserNotFound):
+        status_code = status.HTTP_404_NOT_FOUND
+    return Response({'error': str(error), 'code': error.code}, status=status_code)
+
+def process_payment_response(model, post_id):
+    """
+    Общая реализация action process_payment для PostViewSet и AskPostViewSet.
+    Строка поста блокируется (select_for_update) до конца транзакции, поэтому повторный или параллельный
+    запрос видит is_paid=True; операция в журнале имеет ключ идемпотентности по посту.
+    """
+    with transaction.atomic():
+        post = get_object_or_404(model.objects.select_for_update(), id=post_id)
+        if post.is_paid:
+            return Response({'error': 'Post already paid'}, status=status.HTTP_400_BAD_REQUEST)
+        if not post.channel_message_id:
+            return Response({'error': 'Post not yet posted to channel'}, status=status.HTTP_400_BAD_REQUEST)
+        if not post.author_id:
+            return Response({'error': 'Post has no author'}, status=status.HTTP_400_BAD_REQUEST)
+        author_level = post.author.level
+        tokens_to_add = get_tokens_by_level(author_level)
+        post.is_paid = True
+        post.paid_at = datetime.now(timezone.utc)
+        post.save(update_fields=['is_paid', 'paid_at'])
+        entry, _ = ledger.apply_transaction(
+            post.author_id, tokens_to_add, BalanceTransaction.KIND_POST_PAYMENT,
+            reference=f'{model._meta.db_table}:{post.id}',
+            idempotency_key=f'{model._meta.db_table}:{post.id}:payment',
+        )
+    return Response({
+        'id': post.id,
+        'author_level': author_level,
+        'tokens_added': tokens_to_add,
+        'author_balance': str(entry.balance_after),
+        'status': 'payment processed'
+    })
+
+def publish_now_response(model, post_id):
+    """
+    Общая реализация action publish_now: пост помечается опубликованным и оплаченным
+    одним UPDATE, а автору начисляются токены через журнал — всё в одной транзакции.
+    """
+    with transaction.atomic():
+        post = get_object_or_404(model.objects.select_for_update(), id=post_id)
+        if post.is_posted:
+            return Response({'error': 'Post already published'}, status=status.HTTP_400_BAD_REQUEST)
+        if not post.author_id:
+            return Response({'error': 'Post has no author'}, status=status.HTTP_400_BAD_REQUEST)
+        if not post.telegram_id:
+            return Response({'error': 'Post has no telegram_id'}, status=status.HTTP_400_BAD_REQUEST)
+        author_level = post.author.level
+        tokens_to_add = get_tokens_by_level(author_level)
+        now = datetime.now(timezone.utc)
+        post.is_posted = True
+        post.channel_posted_at = now
+        post.is_paid = True
+        post.paid_at = now
+        post.save(update_fields=['is_posted', 'channel_posted_at', 'is_paid', 'paid_at'])
+        entry, _ = ledger.apply_transaction(
+            post.author_id, tokens_to_add, BalanceTransaction.KIND_POST_PAYMENT,
+            reference=f'{model._meta.db_table}:{post.id}',
+            idempotency_key=f'{model._meta.db_table}:{post.id}:payment',
+        )
+    return Response({
+        'id': post.id,
+        'telegram_id': post.telegram_id,
+        'author_level': author_level,
+        'tokens_added': tokens_to_add,
+        'author_balance': str(entry.balance_after),
+        'status': 'published and paid'
+    })
+
+def parse_author_param(query_params):
+    """Значение параметра author как int (None, если не передан); ValidationError для нечисловых значений"""
+    author = query_params.get('author', None)
+    if author is None:
+        return None
+    try:
+        return int(author)
+    except ValueError:
+        raise ValidationError({'author': 'Must be an integer'})
+
+def filter_post_queryset(queryset, query_params):
+    """
+    Общая фильтрация списков PostViewSet и AskPostViewSet по query-параметрам:
+    author, telegram_id, is_posted, is_rejected, channel_posted_after (channel_posted_at >= значения) и ordering.
+    """
+    author = parse_author_param(query_params)
+    telegram_id = query_params.get('telegram_id', None)
+    is_posted = query_params.get('is_posted', None)
+    is_rejected = query_params.get('is_rejected', None)
+    channel_posted_after = query_params.get('channel_posted_after', None)
+    ordering = query_params.get('ordering', '-posted_at')
+
+    if author is not None:
+        queryset = queryset.filter(author=author)
+    if telegram_id is not None:
+        queryset = queryset.filter(telegram_id=telegram_id)
+    if is_posted is not None:
+        if is_posted.lower() == 'true':
+            queryset = queryset.filter(is_posted=True)
+        elif is_posted.lower() == 'false':
+            queryset = queryset.filter(is_posted=False)
+    if is_rejected is not None:
+        if is_rejected.lower() == 'true':
+            queryset = queryset.filter(is_rejected=True)
+        elif is_rejected.lower() == 'false':
+            queryset = queryset.filter(is_rejected=False)
+    if channel_posted_after:
+        try:
+            posted_after = parse_datetime(channel_posted_after)
+        except ValueError:
+            posted_after = None
+        if posted_after is None:
+            raise ValidationError({'channel_posted_after': 'Invalid datetime'})
+        queryset = queryset.filter(channel_posted_at__gte=posted_after)
+    if ordering:
+        # Для стабильной постраничной выдачи добавляем id как второй ключ сортировки
+        queryset = queryset.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
+    return queryset
+
+def post_stats_response(request, post_model, comment_model):
+    """
+    Общая реализация action stats для PostViewSet и AskPostViewSet.
+    Считает посты по статусам одним SQL-запросом с COUNT ... FILTER.
+    С параметром author считает только посты автора и добавляет число комментариев к ним.
+    """
+    posts = post_model.objects.all()
+    author = parse_author_param(request.query_params)
+    if author is not None:
+        posts = posts.filter(author=author)
+    result = posts.aggregate(
+        total=Count('id'),
+        posted=Count('id', filter=Q(is_posted=True)),
+        rejected=Count('id', filter=Q(is_rejected=True)),
+        queued=Count('id', filter=Q(is_posted=False, is_rejected=False)),
+    )
+    if author is not None:
+        result['author'] = author
+        result['comments'] = comment_model.objects.filter(
+            reply_to__in=posts.filter(telegram_id__isnull=False).values('telegram_id')
+        ).count()
+    return Response(result)
+
+def comment_stats_response(request, comment_model):
+    """
+    Общая реализация action stats для CommentViewSet и AskCommentViewSet.
+    Возвращает общее число комментариев, а с параметром post=<id>[,<id>...] — число комментариев по каждому посту (GROUP BY reply_to).
+    """
+    result = {'total': comment_model.objects.count()}
+    post_param = request.query_params.get('post', None)
+    if post_param:
+        try:
+            post_ids = [int(post_id) for post_id in post_param.split(',') if post_id.strip()]
+        except ValueError:
+            return Response({'error': 'Invalid post parameter'}, status=status.HTTP_400_BAD_REQUEST)
+        counts = (
+            comment_model.objects.filter(reply_to__in=post_ids)
+            .values('reply_to')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        per_post = {str(post_id): 0 for post_id in post_ids}
+        per_post.update({str(row['reply_to']): row['count'] for row in counts})
+        result['per_post'] = per_post
+    return Response(result)
+
 def check_access_token(request):
     token = request.headers.get('X-ACCESS-TOKEN')
     if not token or token != settings.API_ACCESS_TOKEN:
@@ -31,8 +297,30 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     lookup_field = 'id'
+    # Keyset-пагинация (?cursor=, см. api/pagination.py): допустимые поля ordering и сортировка по умолчанию
+    keyset_ordering_fields = ('id',)
+    keyset_default_ordering = 'id'
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
 
+    def get_queryset(self):
+        """
+        Фильтры для обхода пользователей рассылкой: id_after (продолжение с места остановки),
+        whisper_bot_blocked / askmephi_bot_blocked (true/false).
+        """
+        queryset = User.objects.all()
+        params = self.request.query_params
+        id_after = params.get('id_after')
+        if id_after:
+            try:
+                queryset = queryset.filter(id__gt=int(id_after))
+            except ValueError:
+                raise ValidationError({'id_after': 'Must be an integer'})
+        for field in ('whisper_bot_blocked', 'askmephi_bot_blocked'):
+            value = params.get(field)
+            if value is not None:
+                queryset = queryset.filter(**{field: value.lower() in ('1', 'true', 'yes')})
+        return queryset
+
     def create(self, request, *args, **kwargs):
         """Переопределяем метод create для обработки пользователей с указанным id"""
         user_id = request.data.get('id')
@@ -54,7 +342,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
     def update(self, request, *args, **kwargs):
         """Переопределяем метод update для лучшего логирования"""
-        print(f"[UserViewSet] Updating user with data: {request.data}")
+        logger.debug(f"[UserViewSet] Updating user {kwargs.get('id')}, fields: {sorted(request.data)}")
         return super().update(request, *args, **kwargs)
 
     @action(detail=True, methods=['post'])
@@ -66,7 +354,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def pseudo_names(self, request, id=None):
-        pseudos = UserPseudoName.objects.filter(user_id=id)
+        pseudos = UserPseudoName.objects.filter(user_id=id).select_related('pseudo_name').order_by('purchase_date', 'id')
         page = self.paginate_queryset(pseudos)
         if page is not None:
             serializer = UserPseudoNameSerializer(page, many=True)
@@ -76,31 +364,81 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def addbalance(self, request, id=None):
+        """
+        Начисляет amount на баланс (атомарно, с записью в журнал).
+        Необязательный заголовок Idempotency-Key защищает от повторного начисления при повторе запроса.
+        """
         if not check_access_token(request):
             return Response({'error': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
-        user = self.get_object()
-        amount = request.data.get('amount')
         try:
-            amount = Decimal(str(amount))
-        except (TypeError, ValueError, decimal.InvalidOperation):
+            amount = ledger.to_amount(request.data.get('amount'))
+        except ValueError:
             return Response({'error': 'Invalid amount'}, status=status.HTTP_400_BAD_REQUEST)
-        user.balance += amount
-        user.save()
-        return Response({'id': user.id, 'balance': str(user.balance), 'status': 'balance increased'})
+        idempotency_key = request.headers.get('Idempotency-Key')
+        try:
+            entry, _ = ledger.apply_transaction(
+                id, amount, BalanceTransaction.KIND_ADMIN_ADD,
+                idempotency_key=f'users:{id}:addbalance:{idempotency_key}' if idempotency_key else None,
+            )
+        except ledger.LedgerError as e:
+            return ledger_error_response(e)
+        return Response({'id': int(id), 'balance': str(entry.balance_after), 'status': 'balance increased'})
 
     @action(detail=True, methods=['post'])
     def setbalance(self, request, id=None):
         if not check_access_token(request):
             return Response({'error': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
-        user = self.get_object()
-        amount = request.data.get('amount')
         try:
-            amount = Decimal(str(amount))
-        except (TypeError, ValueError, decimal.InvalidOperation):
+            amount = ledger.to_amount(request.data.get('amount'))
+        except ValueError:
             return Response({'error': 'Invalid amount'}, status=status.HTTP_400_BAD_REQUEST)
-        user.balance = amount
-        user.save()
-        return Response({'id': user.id, 'balance': str(user.balance), 'status': 'balance set'})
+        try:
+            entry = ledger.set_balance(id, amount)
+        except ledger.LedgerError as e:
+            return ledger_error_response(e)
+        return Response({'id': int(id), 'balance': str(entry.balance_after), 'status': 'balance set'})
+
+    @action(detail=True, methods=['post'])
+    def purchase_pseudo(self, request, id=None):
+        """
+        Покупка псевдонима pseudo_name одним запросом: проверка цены и доступности, списание и привязка в одной транзакции.
+        """
+        try:
+            pseudo_id = int(request.data.get('pseudo_name'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid pseudo_name'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            owned, pseudo, entry = ledger.purchase_pseudo_name(id, pseudo_id)
+        except ledger.LedgerError as e:
+            return ledger_error_response(e)
+        return Response({
+            'success': True,
+            'id': owned.id,
+            'pseudo_name': pseudo.pseudo,
+            'pseudo_name_id': pseudo.id,
+            'price': str(pseudo.price),
+            'new_balance': str(entry.balance_after),
+            'pseudo_names': owned_pseudo_names(id),
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def ensure_default_pseudos(self, request, id=None):
+        """
+        Выдает пользователю бесплатные псевдонимы по умолчанию, если своих меньше трех,
+        и возвращает полный список его псевдонимов — перед выбором ника хватает одного запроса.
+        """
+        user = self.get_object()
+        created = ensure_default_pseudo_names(user.id)
+        return Response({'created': created, 'pseudo_names': owned_pseudo_names(user.id)})
+
+    @action(detail=True, methods=['get'])
+    def transactions(self, request, id=None):
+        """Журнал операций с балансом пользователя (новые сверху)"""
+        entries = BalanceTransaction.objects.filter(user_id=id).order_by('-created_at', '-id')
+        page = self.paginate_queryset(entries)
+        if page is not None:
+            return self.get_paginated_response(BalanceTransactionSerializer(page, many=True).data)
+        return Response(BalanceTransactionSerializer(entries, many=True).data)
 
     @action(detail=True, methods=['post'])
     def setlevel(self, request, id=None):
@@ -119,49 +457,50 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response({'id': user.id, 'level': user.level, 'status': 'level set'})
 
 class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by('-posted_at')
+    queryset = Post.objects.select_related('author').order_by('-posted_at')
     serializer_class = PostSerializer
     lookup_field = 'id'
+    keyset_ordering_fields = ('posted_at', 'channel_posted_at', 'id')
+    keyset_default_ordering = '-posted_at'
 
     def get_queryset(self):
         """
-        Добавляем фильтрацию по author, telegram_id, is_posted, is_rejected, а также сортировку
+        Добавляем фильтрацию по author, telegram_id, is_posted, is_rejected, channel_posted_after, а также сортировку
         """
-        queryset = Post.objects.all()
-        author = self.request.query_params.get('author', None)
-        telegram_id = self.request.query_params.get('telegram_id', None)
-        is_posted = self.request.query_params.get('is_posted', None)
-        is_rejected = self.request.query_params.get('is_rejected', None)
-        ordering = self.request.query_params.get('ordering', '-posted_at')
-        
-        if author is not None:
-            queryset = queryset.filter(author=author)
-        if telegram_id is not None:
-            queryset = queryset.filter(telegram_id=telegram_id)
-        if is_posted is not None:
-            if is_posted.lower() == 'true':
-                queryset = queryset.filter(is_posted=True)
-            elif is_posted.lower() == 'false':
-                queryset = queryset.filter(is_posted=False)
-        if is_rejected is not None:
-            if is_rejected.lower() == 'true':
-                queryset = queryset.filter(is_rejected=True)
-            elif is_rejected.lower() == 'false':
-                queryset = queryset.filter(is_rejected=False)
-        if ordering:
-            queryset = queryset.order_by(ordering)
-        return queryset
+        return filter_post_queryset(Post.objects.select_related('author'), self.request.query_params)
 
     def partial_update(self, request, *args, **kwargs):
         """Переопределяем метод partial_update для логирования"""
-        print(f"[PostViewSet] Partial update with data: {request.data}")
+        logger.debug(f"[PostViewSet] Partial update of post {kwargs.get('id')}, fields: {sorted(request.data)}")
         return super().partial_update(request, *args, **kwargs)
 
     def update(self, request, *args, **kwargs):
         """Переопределяем метод update для логирования"""
-        print(f"[PostViewSet] Full update with data: {request.data}")
+        logger.debug(f"[PostViewSet] Full update of post {kwargs.get('id')}, fields: {sorted(request.data)}")
         return super().update(request, *args, **kwargs)
 
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Количество постов: всего, опубликовано, отклонено, в очереди (опционально по author).
+        """
+        return post_stats_response(request, Post, Comment)
+
+    @action(detail=False, methods=['post'])
+    def reschedule_queue(self, request):
+        """
+        Пересобирает очередь (30-минутные слоты, 01:00-10:00 по Москве пропускаются)
+        в одной транзакции одним bulk UPDATE вместо PATCH на каждый пост.
+        """
+        return reschedule_queue_response(request, Post, ordering=('posted_at', 'id'))
+
+    @action(detail=False, methods=['get'])
+    def queue(self, request):
+        """
+        Очередь на публикацию в компактном виде (без author_details и лишних полей), одним запросом.
+        """
+        return queue_response(request, Post)
+
     @action(detail=True, methods=['post'])
     def mark_as_posted(self, request, id=None):
         post = self.get_object()
@@ -183,100 +522,33 @@ class PostViewSet(viewsets.ModelViewSet):
         Обрабатывает оплату поста на основе уровня автора.
         Формула: базовые 5 токенов + 5 токенов за каждый уровень
         """
-        post = self.get_object()
-        
-        # Проверяем, что пост еще не оплачен
-        if post.is_paid:
-            return Response({'error': 'Post already paid'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Проверяем, что пост выложен в канал
-        if not post.channel_message_id:
-            return Response({'error': 'Post not yet posted to channel'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Проверяем, что у поста есть автор
-        if not post.author:
-            return Response({'error': 'Post has no author'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Рассчитываем токены на основе уровня автора
-        tokens_to_add = get_tokens_by_level(post.author.level)
-        
-        # Обновляем пост с timezone-aware datetime
-        post.is_paid = True
-        post.paid_at = datetime.now(timezone.utc)
-        post.save()
-        
-        # Добавляем токены автору поста
-        post.author.balance += Decimal(str(tokens_to_add))
-        post.author.save()
-        
-        return Response({
-            'id': post.id,
-            'author_level': post.author.level,
-            'tokens_added': tokens_to_add,
-            'author_balance': str(post.author.balance),
-            'status': 'payment processed'
-        })
+        return process_payment_response(Post, id)
 
     @action(detail=True, methods=['post'])
     def publish_now(self, request, id=None):
         """
         Немедленно публикует пост в канал и обрабатывает оплату.
         """
-        post = self.get_object()
-        
-        # Проверяем, что пост еще не опубликован
-        if post.is_posted:
-            return Response({'error': 'Post already published'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Проверяем, что у поста есть автор
-        if not post.author:
-            return Response({'error': 'Post has no author'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Проверяем, что у поста есть telegram_id
-        if not post.telegram_id:
-            return Response({'error': 'Post has no telegram_id'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Помечаем пост как опубликованный
-        post.is_posted = True
-        post.channel_posted_at = datetime.now(timezone.utc)
-        post.save()
-        
-        # Обрабатываем оплату сразу
-        tokens_to_add = get_tokens_by_level(post.author.level)
-        post.is_paid = True
-        post.paid_at = datetime.now(timezone.utc)
-        post.save()
-        
-        # Добавляем токены автору поста
-        post.author.balance += Decimal(str(tokens_to_add))
-        post.author.save()
-        
-        return Response({
-            'id': post.id,
-            'telegram_id': post.telegram_id,
-            'author_level': post.author.level,
-            'tokens_added': tokens_to_add,
-            'author_balance': str(post.author.balance),
-            'status': 'published and paid'
-        })
+        return publish_now_response(Post, id)
 
 class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by('-created_at')
+    queryset = Comment.objects.select_related('author').order_by('-created_at')
     serializer_class = CommentSerializer
     lookup_field = 'id'
+    keyset_ordering_fields = ('created_at', 'id')
+    keyset_default_ordering = '-created_at'
 
     def create(self, request, *args, **kwargs):
         """Переопределяем метод create для логирования"""
-        print(f"[CommentViewSet] Creating comment with data: {request.data}")
         result = super().create(request, *args, **kwargs)
-        print(f"[CommentViewSet] Comment created successfully: {result.data}")
+        logger.debug(f"[CommentViewSet] Comment {result.data.get('id')} created")
         return result
 
     def get_queryset(self):
         """
         Добавляем фильтрацию по telegram_id и post (reply_to)
         """
-        queryset = Comment.objects.all().order_by('-created_at')
+        queryset = Comment.objects.select_related('author').order_by('-created_at')
         telegram_id = self.request.query_params.get('telegram_id', None)
         post_id = self.request.query_params.get('post', None)
         if telegram_id is not None:
@@ -285,29 +557,29 @@ class CommentViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(reply_to=post_id)
         return queryset
 
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Общее количество комментариев и количество по постам (post=<id>[,<id>...]).
+        """
+        return comment_stats_response(request, Comment)
+
     @action(detail=False, methods=['get'], url_path='telegram/(?P<telegram_id>[^/.]+)')
     def get_by_telegram_id(self, request, telegram_id=None):
         """
         Получает комментарий по его telegram_id
         """
-        print(f"[CommentViewSet] get_by_telegram_id called with telegram_id: {telegram_id}")
-        
         try:
             telegram_id = int(telegram_id)
-            print(f"[CommentViewSet] Converted telegram_id to int: {telegram_id}")
         except (ValueError, TypeError):
-            print(f"[CommentViewSet] Invalid telegram_id format: {telegram_id}")
             return Response({'error': 'Invalid telegram_id format'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
             comment = Comment.objects.get(telegram_id=telegram_id)
-            print(f"[CommentViewSet] Found comment: {comment.id}, author: {comment.author.id if comment.author else None}")
             serializer = self.get_serializer(comment)
-            result = serializer.data
-            print(f"[CommentViewSet] Serialized data: {result}")
-            return Response(result)
+            return Response(serializer.data)
         except Comment.DoesNotExist:
-            print(f"[CommentViewSet] Comment with telegram_id {telegram_id} not found")
+            logger.debug(f"[CommentViewSet] Comment with telegram_id {telegram_id} not found")
             return Response({'error': 'Comment not found'}, status=status.HTTP_404_NOT_FOUND)
 
 class PseudoNameViewSet(viewsets.ModelViewSet):
@@ -315,6 +587,19 @@ class PseudoNameViewSet(viewsets.ModelViewSet):
     serializer_class = PseudoNameSerializer
     lookup_field = 'id'
 
+    def list(self, request, *args, **kwargs):
+        """
+        Каталог псевдонимов с ETag (хеш содержимого страницы).
+        Клиент, приславший актуальный ETag в If-None-Match, получает 304 без тела.
+        """
+        response = super().list(request, *args, **kwargs)
+        payload = json.dumps(response.data, sort_keys=True, default=str, ensure_ascii=False)
+        etag = quote_etag(hashlib.md5(payload.encode('utf-8')).hexdigest())
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response['ETag'] = etag
+        return response
+
     @action(detail=True, methods=['post'])
     def deactivate(self, request, id=None):
         pseudo = self.get_object()
@@ -328,19 +613,66 @@ class UserPseudoNameViewSet(viewsets.ModelViewSet):
     lookup_field = 'id'
 
 class PromoCodeViewSet(viewsets.ModelViewSet):
-    queryset = PromoCode.objects.all()
+    queryset = PromoCode.objects.select_related('created_by')
     serializer_class = PromoCodeSerializer
     lookup_field = 'id'
 
 class PromoCodeActivationViewSet(viewsets.ModelViewSet):
-    queryset = PromoCodeActivation.objects.all()
+    queryset = PromoCodeActivation.objects.select_related('user', 'promo_code', 'promo_code__created_by')
     serializer_class = PromoCodeActivationSerializer
     lookup_field = 'id'
 
+    def create(self, request, *args, **kwargs):
+        """
+        Активация промокода: проверка лимитов, запись активации, счетчик использований и начисление награды
+        выполняются в одной транзакции. В ответе дополнительно возвращается новый баланс пользователя.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            activation, entry = ledger.activate_promo_code(
+                serializer.validated_data['user'].id, serializer.validated_data['promo_code'].id,
+            )
+        except ledger.LedgerError as e:
+            return ledger_error_response(e)
+        data = dict(self.get_serializer(activation).data)
+        data['balance'] = str(entry.balance_after)
+        return Response(data, status=status.HTTP_201_CREATED)
+
 class AskPostViewSet(viewsets.ModelViewSet):
-    queryset = AskPost.objects.all().order_by('-posted_at')
+    queryset = AskPost.objects.select_related('author').order_by('-posted_at')
     serializer_class = AskPostSerializer
     lookup_field = 'id'
+    keyset_ordering_fields = ('posted_at', 'channel_posted_at', 'id')
+    keyset_default_ordering = '-posted_at'
+
+    def get_queryset(self):
+        """
+        Та же фильтрация, что и у PostViewSet (is_posted, ordering и т.д. раньше игнорировались)
+        """
+        return filter_post_queryset(AskPost.objects.select_related('author'), self.request.query_params)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Количество постов: всего, опубликовано, отклонено, в очереди (опционально по author).
+        """
+        return post_stats_response(request, AskPost, AskComment)
+
+    @action(detail=False, methods=['post'])
+    def reschedule_queue(self, request):
+        """
+        Пересобирает очередь (30-минутные слоты, 01:00-10:00 по Москве пропускаются)
+        в одной транзакции одним bulk UPDATE вместо PATCH на каждый пост.
+        """
+        return reschedule_queue_response(request, AskPost, ordering=('id',))
+
+    @action(detail=False, methods=['get'])
+    def queue(self, request):
+        """
+        Очередь на публикацию в компактном виде (без author_details и лишних полей), одним запросом.
+        """
+        return queue_response(request, AskPost)
 
     @action(detail=True, methods=['post'])
     def mark_as_posted(self, request, id=None):
@@ -359,55 +691,22 @@ class AskPostViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def process_payment(self, request, id=None):
-        post = self.get_object()
-        if post.is_paid:
-            return Response({'error': 'Post already paid'}, status=status.HTTP_400_BAD_REQUEST)
-        if not post.channel_message_id:
-            return Response({'error': 'Post not yet posted to channel'}, status=status.HTTP_400_BAD_REQUEST)
-        if not post.author:
-            return Response({'error': 'Post has no author'}, status=status.HTTP_400_BAD_REQUEST)
-        tokens_to_add = get_tokens_by_level(post.author.level)
-        post.is_paid = True
-        post.paid_at = datetime.now(timezone.utc)
-        post.save()
-        post.author.balance += Decimal(str(tokens_to_add))
-        post.author.save()
-        return Response({
-            'id': post.id,
-            'author_level': post.author.level,
-            'tokens_added': tokens_to_add,
-            'author_balance': str(post.author.balance),
-            'status': 'payment processed'
-        })
+        return process_payment_response(AskPost, id)
 
     @action(detail=True, methods=['post'])
     def publish_now(self, request, id=None):
-        post = self.get_object()
-        if post.is_posted:
-            return Response({'error': 'Post already published'}, status=status.HTTP_400_BAD_REQUEST)
-        if not post.author:
-            return Response({'error': 'Post has no author'}, status=status.HTTP_400_BAD_REQUEST)
-        if not post.telegram_id:
-            return Response({'error': 'Post has no telegram_id'}, status=status.HTTP_400_BAD_REQUEST)
-        post.is_posted = True
-        post.channel_posted_at = datetime.now(timezone.utc)
-        post.save()
-        tokens_to_add = get_tokens_by_level(post.author.level)
-        post.is_paid = True
-        post.paid_at = datetime.now(timezone.utc)
-        post.save()
-        post.author.balance += Decimal(str(tokens_to_add))
-        post.author.save()
-        return Response({
-            'id': post.id,
-            'telegram_id': post.telegram_id,
-            'author_level': post.author.level,
-            'tokens_added': tokens_to_add,
-            'author_balance': str(post.author.balance),
-            'status': 'published and paid'
-        })
+        return publish_now_response(AskPost, id)
 
 class AskCommentViewSet(viewsets.ModelViewSet):
-    queryset = AskComment.objects.all().order_by('-created_at')
+    queryset = AskComment.objects.select_related('author').order_by('-created_at')
     serializer_class = AskCommentSerializer
-    lookup_field = 'id'
\ No newline at end of file
+    lookup_field = 'id'
+    keyset_ordering_fields = ('created_at', 'id')
+    keyset_default_ordering = '-created_at'
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Общее количество комментариев и количество по постам (post=<id>[,<id>...]).
+        """
+        return comment_stats_response(request, AskComment)
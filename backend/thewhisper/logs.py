@@ -0,0 +1,100 @@
+"""
+Логирование backend: JSON-записи, выборка DEBUG и запись в отдельном потоке (QueueListener).
+Подключается через settings.LOGGING.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+
+# --- Общий код: одинаковый в backend/thewhisper/logs.py, whisper_bot/services/logs.py и askmephi_bot/services/logs.py
+# (сервисы собираются в отдельные образы и не импортируют код друг друга); меняется во всех трех файлах сразу ---
+
+# Стандартные атрибуты LogRecord; все остальные пришли через extra= и попадают в JSON как поля
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON: время, уровень, логгер, сообщение, поля из extra= и traceback"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.processName != 'MainProcess':
+            entry['process'] = record.processName
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает все записи INFO и выше и долю rate записей DEBUG"""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладет запись в очередь, подставив аргументы в сообщение (они могут измениться до записи).
+    В отличие от стандартного prepare, traceback не форматируется здесь, а остается потоку слушателя.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# --- Конец общего кода ---
+
+
+def queue_handler(log_format='json', filename='', max_bytes=10 * 1024 * 1024, backup_count=5):
+    """
+    Фабрика для LOGGING ('()': 'thewhisper.logs.queue_handler'): обработчик только кладет запись в очередь,
+    вывод в stderr и в ротируемый файл (если задан filename) выполняет поток QueueListener,
+    поэтому запрос не ждет форматирования и записи на диск.
+    """
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    handlers = [logging.StreamHandler()]
+    if filename:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            filename, maxBytes=int(max_bytes), backupCount=int(backup_count), encoding='utf-8',
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return _QueueHandler(log_queue)
+
+
+def parse_levels(spec):
+    """'django.db.backends=WARNING,api=DEBUG' -> {'django.db.backends': {'level': 'WARNING'}, ...} для LOGGING['loggers']"""
+    loggers = {}
+    for item in spec.split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip():
+            loggers[name.strip()] = {'level': level.strip().upper()}
+    return loggers
@@ -55,7 +55,7 @@ REST_FRAMEWORK = {
         "%Y-%m-%dT%H:%M:%S%z",  
         "%Y-%m-%dT%H:%M:%S",   
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.HybridPagination',
     'PAGE_SIZE': 1000,
 }
 
@@ -151,4 +151,37 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
-API_ACCESS_TOKEN = os.getenv('ACCESS_TOKEN')
\ No newline at end of file
+API_ACCESS_TOKEN = os.getenv('ACCESS_TOKEN')
+# Логирование: JSON в stderr (и в ротируемый файл, если задан LOG_FILE) из отдельного потока.
+# Уровни модулей — LOG_LEVELS="api=DEBUG,django.db.backends=WARNING", доля DEBUG-записей — LOG_DEBUG_SAMPLE_RATE
+from thewhisper.logs import parse_levels  # noqa: E402
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'thewhisper.logs.SamplingFilter',
+            'rate': os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.1'),
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'thewhisper.logs.queue_handler',
+            'log_format': os.getenv('LOG_FORMAT', 'json'),
+            'filename': os.getenv('LOG_FILE', ''),
+            'max_bytes': os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024),
+            'backup_count': os.getenv('LOG_BACKUP_COUNT', 5),
+            'filters': ['sampling'],
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': os.getenv('LOG_LEVEL', 'INFO'),
+    },
+    'loggers': {
+        # Django пишет в свои логгеры через root, без собственных обработчиков
+        'django': {'level': 'INFO', 'handlers': [], 'propagate': True},
+        **parse_levels(os.getenv('LOG_LEVELS', 'django.db.backends=WARNING')),
+    },
+}
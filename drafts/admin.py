@@ -2,7 +2,7 @@ from aiogram import types, F, Dispatcher
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from aiogram.types import ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
-from db.wapi import ban_user, unban_user, add_pseudo_name, add_balance, set_balance, get_all_pseudo_names, deactivate_pseudo_name, set_user_level, get_user_info, get_active_posts_count, get_recent_posts, get_all_users, get_queue_info, recalculate_queue_after_immediate_publication, get_user_pseudo_names_full, get_comments_count, get_comments_for_user_posts, get_post_info
+from db.wapi import ban_user, unban_user, add_pseudo_name, add_balance, set_balance, get_all_pseudo_names, deactivate_pseudo_name, set_user_level, get_user_info, get_active_posts_count, get_recent_posts, get_all_users, get_queue_info, recalculate_queue_after_immediate_publication, get_user_pseudo_names_full, get_comments_count, get_posts_stats, get_post_info
 import re
 from aiogram.methods import EditMessageReplyMarkup
 import aiohttp
@@ -564,8 +564,8 @@ def register_admin_handlers(dp: Dispatcher):
                 frag = p.get('content','')[:60].replace('\n',' ')
                 top_posts_str += f"{i}. {frag}{'...' if len(p.get('content',''))>60 else ''} ({len(p.get('content',''))} симв.)\n"
         # --- Интересные факты о комментариях ---
-        comments = await get_comments_for_user_posts(user_id)
-        comments_count = len(comments)
+        author_stats = await get_posts_stats(author_id=user_id)
+        comments_count = 0 if 'error' in author_stats else int(author_stats.get('comments', 0))
         # Среднее число комментариев на пост
         avg_comments = round(comments_count / total, 2) if total > 0 else 0
         # --- Синтаксический анализ: топ-слова пользователя ---
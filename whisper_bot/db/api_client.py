@@ -0,0 +1,73 @@
+import aiohttp
+import logging
+import os
+from contextlib import asynccontextmanager
+
+
+class ApiClient:
+    """
+    Общий HTTP-клиент для обращений к backend.
+
+    Держит одну aiohttp.ClientSession на процесс с пулом keep-alive соединений,
+    поэтому вызовы из db/wapi.py переиспользуют уже открытые TCP-соединения
+    вместо нового подключения на каждый запрос.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 30, total_timeout: float = 30,
+                 connect_timeout: float = 5, keepalive_timeout: float = 60):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.total_timeout = total_timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.total_timeout, connect=self.connect_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    @property
+    def is_started(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self):
+        """Создает сессию с пулом соединений (вызывается на dp.startup)"""
+        if self.is_started:
+            return
+        self._session = self._create_session()
+        logging.info(f"[ApiClient] Session started: limit={self.limit}, limit_per_host={self.limit_per_host}, "
+                     f"timeout={self.total_timeout}s, connect_timeout={self.connect_timeout}s")
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула (вызывается на dp.shutdown)"""
+        if self.is_started:
+            await self._session.close()
+            logging.info("[ApiClient] Session closed")
+        self._session = None
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Отдает общую сессию для `async with`.
+
+        В отличие от `aiohttp.ClientSession()` сессия на выходе не закрывается.
+        Если клиент еще не запущен (например, вызов до dp.startup), он запускается лениво.
+        """
+        if not self.is_started:
+            await self.start()
+        yield self._session
+
+
+api_client = ApiClient(
+    limit=int(os.getenv('API_POOL_LIMIT', 100)),
+    limit_per_host=int(os.getenv('API_POOL_LIMIT_PER_HOST', 30)),
+    total_timeout=float(os.getenv('API_TIMEOUT', 30)),
+    connect_timeout=float(os.getenv('API_CONNECT_TIMEOUT', 5)),
+    keepalive_timeout=float(os.getenv('API_KEEPALIVE_TIMEOUT', 60)),
+)
@@ -0,0 +1,65 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Простой in-process кэш с ограничением по размеру (LRU) и времени жизни записей (TTL).
+
+    Не потокобезопасен, рассчитан на использование из одного event loop.
+    Считает попадания/промахи, чтобы можно было оценить эффективность кэша.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу или default, если записи нет или она устарела"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            # Устаревшая запись остается до вытеснения: ее можно прочитать через peek для ревалидации (ETag)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Сохраняет значение, вытесняя самые давно использованные записи при переполнении"""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def peek(self, key, default=None):
+        """Возвращает значение без учета TTL и без обновления статистики (в т.ч. устаревшее)"""
+        item = self._data.get(key)
+        return default if item is None else item[1]
+
+    def pop(self, key, default=None):
+        """Удаляет запись (инвалидация)"""
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -2,16 +2,19 @@ from aiogram import types, F, Dispatcher
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from aiogram.types import ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
-from db.wapi import ban_user, unban_user, add_pseudo_name, add_balance, set_balance, get_all_pseudo_names, deactivate_pseudo_name, set_user_level, get_user_info, get_active_posts_count, get_recent_posts, get_all_users, get_queue_info, recalculate_queue_after_immediate_publication, get_user_pseudo_names_full, get_comments_count, get_comments_for_user_posts, get_post_info
+from db.wapi import ban_user, unban_user, add_pseudo_name, add_balance, set_balance, get_all_pseudo_names, deactivate_pseudo_name, set_user_level, get_user_info, get_active_posts_count, get_recent_posts, get_all_users, get_queue_info, recalculate_queue_after_immediate_publication, get_user_pseudo_names_full, get_comments_count, get_posts_stats, get_post_info
 import re
 from aiogram.methods import EditMessageReplyMarkup
-import aiohttp
+from db.api_client import api_client
+from SugQueue import post_scheduler
 import logging
 from datetime import datetime, timezone, timedelta
 import os
 import difflib
 from aiogram.utils.formatting import ExpandableBlockQuote, Bold, Text, Italic, TextLink, Underline, Code, Pre, BlockQuote
 from collections import Counter
+from services.sender import sender, PRIORITY_NOTIFICATION
+from services.broadcast import broadcast
 
 # Импортируем константы из suggest
 POST_INTERVAL_MINUTES = 30
@@ -214,7 +217,8 @@ def register_admin_handlers(dp: Dispatcher):
         # Отправляем уведомление пользователю
         try:
             if message.bot:
-                await message.bot.send_message(
+                await sender.send(
+                    message.bot.send_message, PRIORITY_NOTIFICATION,
                     chat_id=user_id,
                     text=f"<b>Ваш уровень повышен!</b>\n\n"
                          f"Старый уровень: {current_level}\n"
@@ -269,7 +273,8 @@ def register_admin_handlers(dp: Dispatcher):
         # Отправляем уведомление пользователю
         try:
             if message.bot:
-                await message.bot.send_message(
+                await sender.send(
+                    message.bot.send_message, PRIORITY_NOTIFICATION,
                     chat_id=user_id,
                     text=f"<b>Ваш уровень понижен!</b>\n\n"
                          f"Старый уровень: {current_level}\n"
@@ -523,7 +528,6 @@ def register_admin_handlers(dp: Dispatcher):
     @dp.message(Command("stats"))
     async def stats_handler(message: types.Message):
         from datetime import datetime, timezone
-        import aiohttp
         from collections import Counter
         user_id = message.from_user.id
         user_info = await get_user_info(user_id)
@@ -532,9 +536,13 @@ def register_admin_handlers(dp: Dispatcher):
             return
         pseudos = await get_user_pseudo_names_full(user_id)
         pseudos_str = ', '.join([p[1] for p in pseudos]) if pseudos else 'Нет'
+        # Счетчики считаются агрегатом на backend, посты нужны только для анализа текста
+        post_stats = await get_posts_stats(user_id)
+        if 'error' in post_stats:
+            post_stats = {}
         API_BASE = 'http://backend:8000/api/'
         posts = []
-        async with aiohttp.ClientSession() as session:
+        async with api_client.session() as session:
             url = f"{API_BASE}posts/?author={user_id}&page_size=1000"
             async with session.get(url) as resp:
                 if resp.status == 200:
@@ -543,10 +551,10 @@ def register_admin_handlers(dp: Dispatcher):
                         posts = data['results']
                     elif isinstance(data, list):
                         posts = data
-        total = len(posts)
-        posted = sum(1 for p in posts if p.get('is_posted'))
-        rejected = sum(1 for p in posts if p.get('is_rejected'))
-        queued = sum(1 for p in posts if not p.get('is_posted') and not p.get('is_rejected'))
+        total = int(post_stats.get('total', 0))
+        posted = int(post_stats.get('posted', 0))
+        rejected = int(post_stats.get('rejected', 0))
+        queued = int(post_stats.get('queued', 0))
         reg_date = user_info.get('created_at')
         reg_dt = None
         days_with_us = None
@@ -578,8 +586,7 @@ def register_admin_handlers(dp: Dispatcher):
                 frag = p.get('content','')[:60].replace('\n',' ')
                 top_posts_str += f"{i}. {frag}{'...' if len(p.get('content',''))>60 else ''} ({len(p.get('content',''))} симв.)\n"
         # --- Интересные факты о комментариях ---
-        comments = await get_comments_for_user_posts(user_id)
-        comments_count = len(comments)
+        comments_count = int(post_stats.get('comments', 0))
         # Среднее число комментариев на пост
         avg_comments = round(comments_count / total, 2) if total > 0 else 0
         # --- Синтаксический анализ: топ-слова пользователя ---
@@ -679,6 +686,7 @@ def register_admin_handlers(dp: Dispatcher):
         if result.get("error"):
             await message.answer(f"<b>Ошибка пересчета очереди:</b> {result['error']}", parse_mode="HTML")
             return
+        post_scheduler.request_resync()
         await message.answer(f"<b>Очередь пересчитана:</b> {result.get('message', 'Готово')}", parse_mode="HTML")
         queue_info = await get_queue_info()
         text = await format_queue_message(queue_info.get("results", []))
@@ -782,3 +790,37 @@ def register_admin_handlers(dp: Dispatcher):
         for i in range(0, len(msg), 3500):
             await message.answer(msg[i:i+3500])
 
+
+    @dp.message(Command("broadcast"))
+    async def broadcast_handler(message: types.Message):
+        # Рассылка всем пользователям — только из чата администраторов
+        if str(message.chat.id) != str(os.getenv("WHISPER_ADMIN_CHAT_ID")):
+            return
+        if not message.reply_to_message:
+            await message.answer("Использование: ответьте командой /broadcast на сообщение, которое нужно разослать.\n/broadcast_status — прогресс, /broadcast_cancel — остановить.")
+            return
+        state = broadcast.start(message.bot, message.chat.id, message.reply_to_message.message_id, message.chat.id)
+        if state is None:
+            await message.answer("Рассылка уже идет. /broadcast_status — прогресс, /broadcast_cancel — остановить.")
+            return
+        logging.info(f"[broadcast_handler] Broadcast of message {message.reply_to_message.message_id} started by {message.from_user.id}")
+        await message.answer("Рассылка запущена. Отчет будет обновляться в этом чате.")
+
+    @dp.message(Command("broadcast_status"))
+    async def broadcast_status_handler(message: types.Message):
+        if str(message.chat.id) != str(os.getenv("WHISPER_ADMIN_CHAT_ID")):
+            return
+        state = broadcast.load()
+        if not state:
+            await message.answer("Рассылок еще не было.")
+            return
+        await message.answer(broadcast.format_report(state))
+
+    @dp.message(Command("broadcast_cancel"))
+    async def broadcast_cancel_handler(message: types.Message):
+        if str(message.chat.id) != str(os.getenv("WHISPER_ADMIN_CHAT_ID")):
+            return
+        if broadcast.cancel():
+            await message.answer("Рассылка будет остановлена после текущей страницы.")
+        else:
+            await message.answer("Нет активной рассылки.")
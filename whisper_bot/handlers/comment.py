@@ -13,6 +13,7 @@ from db.wapi import leave_anon_comment, get_user_pseudo_names_full, is_user_bann
 import os
 from keyboards.reply import build_nick_choice_keyboard
 from keyboards.reply import cancel_kb
+from services.sender import sender, PRIORITY_ADMIN, PRIORITY_PUBLICATION
 
 
 NICKS_PER_PAGE = 5
@@ -64,9 +65,7 @@ def register_comment_handlers(dp: Dispatcher):
         logging.info(f"[handle_photo] User {message.from_user.id} trying to comment with photo")
 
         # Убеждаемся, что у пользователя есть псевдонимы
-        await ensure_user_has_default_pseudos(message.from_user.id)
-
-        pseudo_names = await get_user_pseudo_names_full(message.from_user.id)
+        pseudo_names = await ensure_user_has_default_pseudos(message.from_user.id)
         logging.info(f"[handle_photo] User {message.from_user.id} has pseudo_names: {pseudo_names}")
         if not pseudo_names:
             logging.warning(f"[handle_photo] User {message.from_user.id} has no pseudo names after ensuring")
@@ -98,7 +97,8 @@ def register_comment_handlers(dp: Dispatcher):
                 raise ValueError("TARGET_CHAT_ID не установлен")
             if not message.animation:
                 raise ValueError("Animation не найдено")
-            msg = await message.bot.send_animation(
+            msg = await sender.send(
+                message.bot.send_animation, PRIORITY_PUBLICATION,
                 chat_id=TARGET_CHAT_ID,
                 animation=message.animation.file_id,
                 reply_to_message_id=target_message_id,
@@ -122,7 +122,8 @@ def register_comment_handlers(dp: Dispatcher):
             )
             if not ADMIN_CHAT_ID:
                 raise ValueError("ADMIN_CHAT_ID не установлен")
-            await message.bot.send_message(
+            await sender.send(
+                message.bot.send_message, PRIORITY_ADMIN,
                 chat_id=ADMIN_CHAT_ID,
                 text=f"От: @{format_username(message.from_user.username)}, {message.from_user.id}, {message.from_user.first_name}, {message.from_user.last_name}\nК посту: t.me/c/{get_channel_id_for_link()}/{target_message_id}\n\n[GIF]",
                 reply_markup=ban_keyboard,
@@ -174,7 +175,8 @@ def register_comment_handlers(dp: Dispatcher):
                 raise ValueError("TARGET_CHAT_ID не установлен")
             if not message.sticker:
                 raise ValueError("Sticker не найден")
-            msg = await message.bot.send_sticker(
+            msg = await sender.send(
+                message.bot.send_sticker, PRIORITY_PUBLICATION,
                 chat_id=TARGET_CHAT_ID,
                 sticker=message.sticker.file_id,
                 reply_to_message_id=target_message_id,
@@ -198,7 +200,8 @@ def register_comment_handlers(dp: Dispatcher):
             )
             if not ADMIN_CHAT_ID:
                 raise ValueError("ADMIN_CHAT_ID не установлен")
-            await message.bot.send_message(
+            await sender.send(
+                message.bot.send_message, PRIORITY_ADMIN,
                 chat_id=ADMIN_CHAT_ID,
                 text=f"От: @{format_username(message.from_user.username)}, {message.from_user.id}, {message.from_user.first_name}, {message.from_user.last_name}\nК посту: t.me/c/{get_channel_id_for_link()}/{target_message_id}\n\n[STICKER]",
                 reply_markup=ban_keyboard,
@@ -267,9 +270,7 @@ def register_comment_handlers(dp: Dispatcher):
             return
         else:
         # Убеждаемся, что у пользователя есть псевдонимы
-            await ensure_user_has_default_pseudos(message.from_user.id)
-
-            pseudo_names = await get_user_pseudo_names_full(message.from_user.id)
+            pseudo_names = await ensure_user_has_default_pseudos(message.from_user.id)
             logging.info(f"[handle_comment_text] User {message.from_user.id} has pseudo_names: {pseudo_names}")
             if not pseudo_names:
                 logging.warning(f"[handle_comment_text] User {message.from_user.id} has no pseudo names after ensuring")
@@ -317,7 +318,8 @@ def register_comment_handlers(dp: Dispatcher):
             comment_text = data.get("comment_text")
             text = f"<b>{pseudo_name[1]} оставил(а) комментарий:</b>\n\n{comment_text}"
             try:
-                msg = await callback.bot.send_message(
+                msg = await sender.send(
+                    callback.bot.send_message, PRIORITY_PUBLICATION,
                     chat_id=TARGET_CHAT_ID,
                     text=text,
                     reply_to_message_id=target_message_id,
@@ -347,7 +349,8 @@ def register_comment_handlers(dp: Dispatcher):
                         [InlineKeyboardButton(text="Забанить", callback_data=f"ban_{callback.from_user.id}")]
                     ]
                 )
-                await callback.bot.send_message(
+                await sender.send(
+                    callback.bot.send_message, PRIORITY_ADMIN,
                     chat_id=ADMIN_CHAT_ID,
                     text=f"От: @{format_username(callback.from_user.username)}, {callback.from_user.id}, {callback.from_user.first_name}, {callback.from_user.last_name}\nК посту: t.me/c/{get_channel_id_for_link()}/{target_message_id}\n\n{comment_text}",
                     reply_markup=ban_keyboard,
@@ -395,7 +398,8 @@ def register_comment_handlers(dp: Dispatcher):
             caption = data.get("caption")
             text = f"<b>{pseudo_name[1]} пришёл и оставил комментарий:</b>\n\n{caption}"
             try:
-                msg = await callback.bot.send_photo(
+                msg = await sender.send(
+                    callback.bot.send_photo, PRIORITY_PUBLICATION,
                     chat_id=TARGET_CHAT_ID,
                     photo=photo,
                     caption=text,
@@ -420,7 +424,8 @@ def register_comment_handlers(dp: Dispatcher):
                         [InlineKeyboardButton(text="Забанить", callback_data=f"ban_{callback.from_user.id}")]
                     ]
                 )
-                await callback.bot.send_message(
+                await sender.send(
+                    callback.bot.send_message, PRIORITY_ADMIN,
                     chat_id=ADMIN_CHAT_ID,
                     text=f"От: @{format_username(callback.from_user.username)}, {callback.from_user.id}, {callback.from_user.first_name}, {callback.from_user.last_name}\nК посту: t.me/c/{get_channel_id_for_link()}/{target_message_id}\n\n{caption}",
                     reply_markup=ban_keyboard,
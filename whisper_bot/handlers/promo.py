@@ -1,6 +1,6 @@
 from aiogram import types, F, Dispatcher
 from aiogram.enums import ParseMode
-from db.wapi import create_promo_code, get_promo_code_by_code, check_user_promo_code_activation, activate_promo_code, add_balance, get_user_info
+from db.wapi import create_promo_code, get_promo_code_by_code, check_user_promo_code_activation, activate_promo_code, get_user_info
 import logging
 import re
 
@@ -167,12 +167,13 @@ def register_promo_handlers(dp: Dispatcher):
         activation_result = await activate_promo_code(message.from_user.id, promo_info['id'])
         logging.info(f"[activate_promo_handler] Activation result: {activation_result}")
         
-        if isinstance(activation_result, dict) and activation_result.get('error'):
-            error_msg = activation_result.get('error', 'Неизвестная ошибка')
+        # Бэкенд возвращает id активации и новый баланс; иначе — ошибку ledger ({error, code}) или валидации сериализатора
+        if 'id' not in activation_result:
+            error_msg = activation_result.get('error') or activation_result.get('non_field_errors') or 'Неизвестная ошибка'
             logging.error(f"[activate_promo_handler] Activation error: {error_msg}")
             
             # Проверяем специфические ошибки
-            if 'unique' in str(error_msg).lower():
+            if activation_result.get('code') == 'already_activated' or 'unique' in str(error_msg).lower():
                 await message.answer(
                     f'<b>❌ Вы уже активировали промокод "{promo_name}"!</b>\n\n'
                     'Каждый промокод можно использовать только один раз.',
@@ -188,21 +189,9 @@ def register_promo_handlers(dp: Dispatcher):
                 await message.answer(f'<b>❌ Ошибка активации промокода:</b> {error_msg}', parse_mode=ParseMode.HTML)
             return
         
-        # Добавляем токены на баланс пользователя
-        reward_amount = promo_info.get('reward_amount', 0)
-        balance_result = await add_balance(message.from_user.id, reward_amount)
-        
-        if isinstance(balance_result, dict) and balance_result.get('error'):
-            await message.answer(
-                f'<b>⚠️ Промокод активирован, но возникла ошибка при начислении токенов!</b>\n\n'
-                f'Обратитесь к администратору.',
-                parse_mode=ParseMode.HTML
-            )
-            return
-        
-        # Получаем обновленную информацию о пользователе
-        user_info = await get_user_info(message.from_user.id)
-        new_balance = user_info.get('balance', 0) if not isinstance(user_info, dict) or not user_info.get('error') else 'неизвестно'
+        # Награда начислена бэкендом в той же транзакции, что и активация
+        reward_amount = activation_result.get('reward_amount', promo_info.get('reward_amount', 0))
+        new_balance = activation_result.get('balance', 'неизвестно')
         
         await message.answer(
             f'<b>✅ Промокод "{promo_name}" успешно активирован!</b>\n\n'
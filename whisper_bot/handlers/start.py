@@ -7,6 +7,7 @@ from aiogram.enums import ParseMode
 
 
 import json
+import logging
 from pathlib import Path
 from db.wapi import try_create_user
 from keyboards.reply import cancel_kb
@@ -34,7 +35,6 @@ def register_start_handlers(dp: Dispatcher):
             )
     
         chance = random.randint(1,10)
-        print(chance)
         if chance > 5:
             await message.answer(
             text="<b>У нас открылся канал с вопросами!</b>\n\n"
@@ -48,7 +48,7 @@ def register_start_handlers(dp: Dispatcher):
         #     firstname = message.from_user.first_name or "",
         #     lastname = message.from_user.last_name or "",
         # )
-        print(param)
+        logging.debug(f"[start_handler] param={param}")
         if (not param.isdigit() and len(param)<=1) :
             await message.answer(
                 text="<b>⚠️ Похоже что-то пошло не так</b> \n\nЛибо у нас баг, либо вы хулиганите. Ай-ай-ай",
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import os
+
+# Сколько апдейтов обрабатывается одновременно (по всем чатам)
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', 50))
+# Порог очереди, при превышении которого пишется предупреждение
+QUEUE_WARNING_DEPTH = int(os.getenv('QUEUE_WARNING_DEPTH', 200))
+
+
+class ConcurrencyMiddleware:
+    """
+    Ограничивает число апдейтов, обрабатываемых одновременно (в пределах процесса), и считает метрики очереди.
+
+    Порядок апдейтов внутри чата обеспечивает events_isolation диспетчера (см. create_events_isolation):
+    его блокировка берется во внешнем FSM middleware до чтения состояния, поэтому двойное нажатие
+    choose_nick_ или market_buy_ видит уже обновленное состояние. Апдейты, ждущие своей очереди в чате,
+    слот общего лимита не занимают.
+    """
+
+    def __init__(self, limit: int = MAX_CONCURRENT_UPDATES, warning_depth: int = QUEUE_WARNING_DEPTH):
+        self.limit = limit
+        self.warning_depth = warning_depth
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.processed = 0
+
+    async def __call__(self, handler, event, data):
+        self.waiting += 1
+        if self.waiting > self.max_waiting:
+            self.max_waiting = self.waiting
+        if self.waiting >= self.warning_depth and self.waiting % self.warning_depth == 0:
+            logging.warning(f"[ConcurrencyMiddleware] Queue depth {self.waiting}, in flight {self.in_flight}/{self.limit}")
+        started = False
+        try:
+            async with self._semaphore:
+                self.waiting -= 1
+                self.in_flight += 1
+                started = True
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.in_flight -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                # Отмена во время ожидания
+                self.waiting -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "processed": self.processed,
+        }
@@ -1,18 +1,22 @@
 import logging
-from db.wapi import try_create_user
+from db.wapi import ensure_user
+
+logger = logging.getLogger(__name__)
+
 
 class EnsureUserMiddleware:
     async def __call__(self, handler, event, data):
         user = getattr(event, "from_user", None)
         if user and not getattr(user, "is_bot", False):
-            print(f"!!! [EnsureUserMiddleware] try_create_user for {user.id} ({user.username})")
-            logging.info(f"[EnsureUserMiddleware] try_create_user for {user.id} ({user.username})")
-            result = await try_create_user(
+            result = await ensure_user(
                 user.id,
                 user.username,
                 user.first_name,
                 user.last_name
             )
-            print(f"!!! [EnsureUserMiddleware] try_create_user result: {result}")
-            logging.info(f"[EnsureUserMiddleware] try_create_user result: {result}")
-        return await handler(event, data) 
\ No newline at end of file
+            if result is not None:
+                if isinstance(result, dict) and result.get('error'):
+                    logger.warning(f"[EnsureUserMiddleware] try_create_user for {user.id} failed: {result['error']}")
+                else:
+                    logger.debug(f"[EnsureUserMiddleware] User {user.id} synced")
+        return await handler(event, data)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+import os
+
+# Локальное событие: подписка на канал восстановлена после обрыва, события за это время могли потеряться
+EVENT_RECONNECT = 'reconnect'
+
+
+class EventBus:
+    """
+    События между процессами-воркерами вебхука через Redis pub/sub.
+
+    Изменение применяется в своем процессе сразу, а publish сообщает о нем остальным воркерам:
+    listen (запускается в каждом воркере) вызывает обработчики, подписанные через subscribe, для событий
+    из других процессов. Без Redis (один процесс) publish ничего не делает.
+
+        events.subscribe('user_blocked', lambda event: known_users.pop(event['user_id']))
+        events.publish('user_blocked', user_id=user_id)
+    """
+
+    RECONNECT_DELAY = 5
+
+    def __init__(self):
+        self._redis = None
+        self._channel = None
+        self._handlers = {}
+        self._tasks = set()
+
+    def use_redis(self, redis_url: str, channel: str):
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(redis_url)
+        self._channel = channel
+
+    def subscribe(self, op: str, handler):
+        """handler(event: dict) вызывается синхронно из цикла listen"""
+        self._handlers.setdefault(op, []).append(handler)
+
+    def publish(self, op: str, **data):
+        if self._redis is None:
+            return
+        task = asyncio.create_task(self._publish({**data, 'op': op, 'pid': os.getpid()}))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _publish(self, event: dict):
+        try:
+            await self._redis.publish(self._channel, json.dumps(event, ensure_ascii=False))
+        except Exception:
+            logging.exception(f"[EventBus] Failed to publish event {event['op']}")
+
+    def _dispatch(self, event: dict):
+        for handler in self._handlers.get(event.get('op'), ()):
+            try:
+                handler(event)
+            except Exception:
+                logging.exception(f"[EventBus] Handler failed for event {event.get('op')}")
+
+    async def listen(self):
+        """Применяет события из других воркеров; после обрыва связи переподписывается"""
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    logging.info(f"[EventBus] Listening on {self._channel}")
+                    async for message in pubsub.listen():
+                        if message.get('type') != 'message':
+                            continue
+                        event = json.loads(message['data'])
+                        if event.get('pid') == os.getpid():
+                            continue  # свое событие уже применено
+                        self._dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("[EventBus] Subscription failed, retrying")
+            self._dispatch({'op': EVENT_RECONNECT})
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+
+
+events = EventBus()
@@ -0,0 +1,259 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+# Классы приоритета: меньше — важнее. Публикации в канал и комментарии в чат обсуждения идут первыми
+PRIORITY_PUBLICATION = 0
+PRIORITY_ADMIN = 1
+PRIORITY_NOTIFICATION = 2
+# Массовые рассылки: отправляются, только когда нет более важных вызовов
+PRIORITY_BULK = 3
+
+# Лимиты Bot API: ~30 сообщений в секунду всего, ~1 в секунду в личный чат, ~20 в минуту в группу или канал.
+# SENDER_GLOBAL_RATE — лимит на бота: у каждого процесса-воркера вебхука своя очередь,
+# поэтому он делится поровну между WEBHOOK_WORKERS процессами
+_SENDER_PROCESSES = int(os.getenv('WEBHOOK_WORKERS', 1)) if os.getenv('BOT_MODE', 'polling') == 'webhook' else 1
+GLOBAL_RATE = float(os.getenv('SENDER_GLOBAL_RATE', 30)) / max(_SENDER_PROCESSES, 1)
+CHAT_RATE = float(os.getenv('SENDER_CHAT_RATE', 1))
+CHAT_BURST = float(os.getenv('SENDER_CHAT_BURST', 3))
+GROUP_RATE = float(os.getenv('SENDER_GROUP_RATE', 20 / 60))
+GROUP_BURST = float(os.getenv('SENDER_GROUP_BURST', 20))
+SENDER_MAX_RETRIES = int(os.getenv('SENDER_MAX_RETRIES', 3))
+
+
+class TokenBucket:
+    """Токены пополняются со скоростью rate в секунду до capacity; одна отправка — один токен"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # до этого момента отправка запрещена (RetryAfter)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд ждать до следующей отправки (0 — можно сейчас)"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class _Job:
+    __slots__ = ('method', 'kwargs', 'chat_id', 'priority', 'future', 'attempt', 'enqueued_at', 'order')
+
+    def __init__(self, method, kwargs, priority, future):
+        self.method = method
+        self.kwargs = kwargs
+        self.chat_id = kwargs.get('chat_id')
+        self.priority = priority
+        self.future = future
+        self.attempt = 0
+        self.enqueued_at = time.monotonic()
+        self.order = 0
+
+
+class Sender:
+    """
+    Очередь исходящих вызовов Bot API с ограничением скорости.
+
+    Каждый вызов проходит через общий token bucket и bucket своего чата; из очереди берется самый
+    приоритетный вызов, чей чат сейчас можно отправить, поэтому загруженный чат не задерживает остальные.
+    Внутри приоритета у каждого чата своя очередь (вызовы одного чата уходят строго по порядку), а чаты
+    лежат в куче по (время, когда чат освободится; порядок постановки его первого вызова): чат, который сейчас
+    отправлять нельзя, откладывается в куче до освобождения и до этого момента не просматривается.
+    При TelegramRetryAfter чат блокируется на retry_after секунд и вызов повторяется, при сетевых
+    и серверных ошибках — повтор с экспоненциальной паузой, не больше max_retries раз.
+    Остальные ошибки (бот заблокирован, неверный чат) сразу возвращаются вызывающему.
+
+        msg = await sender.send(bot.send_message, PRIORITY_NOTIFICATION, chat_id=user_id, text=text)
+    """
+
+    MAX_IDLE_BUCKETS = 10000
+
+    def __init__(self, max_retries: int = SENDER_MAX_RETRIES):
+        self.max_retries = max_retries
+        priorities = (PRIORITY_PUBLICATION, PRIORITY_ADMIN, PRIORITY_NOTIFICATION, PRIORITY_BULK)
+        # priority -> {chat_id: deque вызовов} и priority -> куча (ready_at, order первого вызова, chat_id)
+        self._queues = {priority: {} for priority in priorities}
+        self._heaps = {priority: [] for priority in priorities}
+        # При доле лимита меньше 1 в секунду (много воркеров) емкость меньше токена — отправка встала бы совсем
+        self._global = TokenBucket(GLOBAL_RATE, max(GLOBAL_RATE, 1))
+        self._chats = {}
+        self._wakeup = None
+        self._worker = None
+        self._deliveries = set()
+        self._counter = itertools.count(1)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.flood_waits = 0
+        self.max_queue_delay = 0.0
+
+    async def send(self, method, priority: int = PRIORITY_NOTIFICATION, **kwargs):
+        """Ставит вызов method(**kwargs) в очередь и возвращает его результат (или пробрасывает ошибку)"""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(_Job(method, kwargs, priority, future))
+        return await future
+
+    def _enqueue(self, job: _Job, front: bool = False):
+        # Повтор встает перед вызовами, поставленными раньше него
+        order = next(self._counter)
+        job.order = -order if front else order
+        chats = self._queues[job.priority]
+        queue = chats.get(job.chat_id)
+        if queue is None:
+            queue = chats[job.chat_id] = deque()
+            heapq.heappush(self._heaps[job.priority], (0.0, job.order, job.chat_id))
+        # Если у чата уже есть вызовы, он уже в куче со своим временем готовности
+        if front:
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные id — группы и каналы
+            is_group = isinstance(chat_id, int) and chat_id < 0 or isinstance(chat_id, str) and chat_id.startswith(('-', '@'))
+            bucket = self._chats[chat_id] = TokenBucket(GROUP_RATE, GROUP_BURST) if is_group else TokenBucket(CHAT_RATE, CHAT_BURST)
+        return bucket
+
+    def _next_job(self, now: float):
+        """Самый приоритетный готовый к отправке вызов или время до появления такого"""
+        wait = None
+        for priority, heap in self._heaps.items():
+            chats = self._queues[priority]
+            while heap:
+                ready_at, order, chat_id = heap[0]
+                queue = chats[chat_id]
+                while queue and queue[0].future.cancelled():
+                    queue.popleft()
+                if not queue:
+                    heapq.heappop(heap)
+                    del chats[chat_id]
+                    continue
+                if ready_at > now:
+                    wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                    break
+                chat_wait = self._bucket(chat_id).wait_time(now)
+                if chat_wait > 0:
+                    heapq.heapreplace(heap, (now + chat_wait, order, chat_id))
+                    continue
+                job = queue.popleft()
+                if queue:
+                    # Следующий вызов чата встает после уже ждущих чатов
+                    heapq.heapreplace(heap, (now, queue[0].order, chat_id))
+                else:
+                    heapq.heappop(heap)
+                    del chats[chat_id]
+                return job, 0.0
+        return None, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+            job, wait = self._next_job(now)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._global.take()
+            self._bucket(job.chat_id).take()
+            self.max_queue_delay = max(self.max_queue_delay, now - job.enqueued_at)
+            task = asyncio.create_task(self._deliver(job))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+            if len(self._chats) > self.MAX_IDLE_BUCKETS:
+                self._chats = {chat_id: bucket for chat_id, bucket in self._chats.items() if not bucket.idle(now)}
+
+    async def _deliver(self, job: _Job):
+        try:
+            result = await job.method(**job.kwargs)
+        except TelegramRetryAfter as e:
+            self.flood_waits += 1
+            logging.warning(f"[Sender] Flood wait {e.retry_after}s for chat {job.chat_id}, attempt {job.attempt + 1}")
+            self._bucket(job.chat_id).blocked_until = time.monotonic() + e.retry_after
+            self._retry(job, e, front=True)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logging.warning(f"[Sender] {type(e).__name__} for chat {job.chat_id}: {e}, attempt {job.attempt + 1}")
+            self._bucket(job.chat_id).blocked_until = time.monotonic() + 2 ** job.attempt
+            self._retry(job, e)
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _retry(self, job: _Job, error: Exception, front: bool = False):
+        if job.attempt >= self.max_retries or job.future.done():
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(error)
+            return
+        job.attempt += 1
+        self.retried += 1
+        self._enqueue(job, front=front)
+
+    def queue_depth(self) -> dict:
+        return {priority: sum(map(len, chats.values())) for priority, chats in self._queues.items()}
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue_depth(),
+            "in_flight": len(self._deliveries),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "flood_waits": self.flood_waits,
+            "max_queue_delay": round(self.max_queue_delay, 3),
+        }
+
+    async def close(self):
+        """Останавливает очередь; неотправленные вызовы завершаются отменой"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for chats in self._queues.values():
+            for queue in chats.values():
+                for job in queue:
+                    if not job.future.done():
+                        job.future.cancel()
+            chats.clear()
+        for heap in self._heaps.values():
+            heap.clear()
+
+
+sender = Sender()